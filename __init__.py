@@ -10,19 +10,24 @@ GitHub: https://github.com/ankisrs/dependency_booster
 
 import os
 import json
-from aqt import mw
+import sys
+import threading
+import time
+from aqt import mw, gui_hooks
 from aqt.qt import QAction, QMenu, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton
-from aqt.qt import QSpinBox, QCheckBox, QMessageBox, QTimer
+from aqt.qt import QSpinBox, QCheckBox, QMessageBox, QTimer, QProgressDialog, QPlainTextEdit
+from aqt.operations import QueryOp
 from aqt.utils import tooltip, showInfo
+from anki import hooks
 from anki.hooks import addHook
-from typing import Dict, Any, Set
+from typing import Callable, Dict, Any, List, Optional, Set
 
-from .core.review_log import get_recent_review_logs, find_failed_sentence_cards
-from .core.detection import find_vocabulary_dependencies
-from .core.reschedule import (
-    reschedule_cards_for_tomorrow,
-    show_rescheduling_results
-)
+# Measures the add-on's own startup cost (Anki has already imported aqt),
+# shown in the Settings dialog
+_load_started = time.perf_counter()
+
+# The core and gui modules are imported on first use rather than here, so
+# loading the add-on costs next to nothing on days nothing is boosted.
 
 
 def get_addon_dir() -> str:
@@ -30,23 +35,51 @@ def get_addon_dir() -> str:
     return os.path.dirname(os.path.abspath(__file__))
 
 
+# Configuration read from disk on first use
+_config: Optional[Dict[str, Any]] = None
+
+
 def get_config() -> Dict[str, Any]:
-    """Load the add-on configuration from config.json"""
-    return mw.addonManager.getConfig(__name__) or {}
+    """Get a copy of the add-on configuration, read from disk only once"""
+    global _config
+    if _config is None:
+        _config = mw.addonManager.getConfig(__name__) or {}
+    return dict(_config)
 
 
 def save_config(config: Dict[str, Any]) -> None:
     """Save the configuration to disk"""
+    global _config
     # Ensure processed_revlogs is not stored in the main config
     if "processed_revlogs" in config:
         del config["processed_revlogs"]
     mw.addonManager.writeConfig(__name__, config)
+    _config = dict(config)
+
+
+def on_config_updated(config: Dict[str, Any]) -> None:
+    """Pick up a configuration edited in Anki's add-on config editor"""
+    global _config
+    _config = dict(config)
+
+
+def get_loaded_module(name: str):
+    """
+    Get one of the add-on's modules if it has been imported already.
+    
+    Args:
+        name: Module name relative to the add-on (e.g. "core.index")
+        
+    Returns:
+        The module, or None if nothing has imported it yet
+    """
+    return sys.modules.get(f"{__name__}.{name}")
 
 
-def get_processed_revlogs() -> Set[int]:
+def get_legacy_processed_revlogs() -> Set[int]:
     """
-    Get the set of processed review log IDs from a separate file.
-    This prevents the main config from becoming too large.
+    Get the set of processed review log IDs from the legacy
+    processed_revlogs.json file, used before the review log cursor.
     """
     logs_path = os.path.join(get_addon_dir(), "processed_revlogs.json")
     if os.path.exists(logs_path):
@@ -58,18 +91,132 @@ def get_processed_revlogs() -> Set[int]:
     return set()
 
 
-def save_processed_revlogs(logs: Set[int]) -> None:
-    """Save the processed review log IDs to a separate file"""
-    logs_path = os.path.join(get_addon_dir(), "processed_revlogs.json")
+def get_state_store():
+    """Get the store holding the review log cursor, run reports and other state"""
+    from .core.state import get_store
+    return get_store()
+
+
+def flush_state() -> None:
+    """Write pending state changes to disk"""
     try:
-        with open(logs_path, "w") as f:
-            json.dump(list(logs), f)
+        get_state_store().flush()
     except IOError as e:
-        showInfo(f"Error saving processed review logs: {str(e)}")
+        showInfo(f"Error saving the add-on state: {str(e)}")
 
 
-def clear_processed_revlogs() -> None:
-    """Clear all processed review logs"""
+# Delay before writing state changes that don't need to be saved at once
+STATE_FLUSH_DELAY_MS = 5000
+_flush_scheduled = False
+
+
+def schedule_state_flush() -> None:
+    """Write pending state changes after a short delay, once for all changes made meanwhile"""
+    global _flush_scheduled
+    if _flush_scheduled:
+        return
+    _flush_scheduled = True
+    
+    def flush() -> None:
+        global _flush_scheduled
+        _flush_scheduled = False
+        flush_state()
+    
+    QTimer.singleShot(STATE_FLUSH_DELAY_MS, flush)
+
+
+def get_revlog_cursor(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the review log cursor.
+    
+    The cursor holds the highest processed review log ID and the processed
+    IDs inside the late-sync tolerance window below it, so its size stays
+    constant however long the add-on has been in use. An existing legacy
+    processed_revlogs.json is migrated into a cursor on first use.
+    """
+    from .core.pipeline import get_tolerance_ms
+    from .utils import advance_revlog_cursor
+    
+    state = get_state_store().get_revlog_cursor()
+    if state is not None:
+        return state
+    
+    # Migrate the legacy processed ID set
+    legacy_ids = get_legacy_processed_revlogs()
+    cursor, recent = advance_revlog_cursor(None, set(), legacy_ids, get_tolerance_ms(config))
+    state = {"cursor": cursor, "recent": set(recent)}
+    if legacy_ids:
+        get_state_store().set_revlog_cursor(state)
+        flush_state()
+        clear_legacy_processed_revlogs()
+    return state
+
+
+def mark_revlogs_processed(revlog_ids: List[int]) -> None:
+    """
+    Record reviews processed outside a full boost run (e.g. while reviewing).
+    
+    The IDs are added to the cursor's processed window without moving the
+    cursor, so older reviews that were not processed yet are still picked
+    up by the next full run. Batches processed in quick succession are
+    written together.
+    """
+    if not revlog_ids:
+        return
+    get_state_store().mark_processed(revlog_ids)
+    schedule_state_flush()
+
+
+def record_boost_stats(failed_cards: List[int], card_ids: List[int]) -> None:
+    """
+    Add the reviews since the last update to the boost statistics, then
+    start waiting for the next reviews of a boost's cards.
+    
+    The update only reads new review log rows of cards that are still
+    waiting, so it is quick enough to run on the main thread.
+    """
+    from .core.pipeline import get_tolerance_ms
+    from .core.stats import load_stats, record_boosts, update_stats
+    
+    store = get_state_store()
+    stats = load_stats(store.get_boost_stats())
+    update_stats(mw.col, stats, get_tolerance_ms(get_config()))
+    record_boosts(stats, card_ids, failed_cards)
+    store.set_boost_stats(stats)
+
+
+def record_boosted_cards(card_ids: List[int]) -> None:
+    """
+    Add rescheduled cards to the boost ledger, so they are not boosted
+    again during the cooldown, and drop the expired entries. With struggle
+    scores, the threshold is taken off the scores of the rescheduled cards.
+    """
+    from .core.ledger import record_boosted
+    from .core.pipeline import uses_struggle_scores
+    from .core.struggle import settle_scores
+    
+    config = get_config()
+    store = get_state_store()
+    ledger = store.get_boost_ledger()
+    expired = record_boosted(ledger, card_ids, mw.col.sched.today, config.get("boost_cooldown_days", 0))
+    if card_ids or expired:
+        store.set_boost_ledger(ledger)
+    
+    if card_ids and uses_struggle_scores(config):
+        scores = store.get_struggle_scores()
+        if settle_scores(scores, card_ids, config["struggle_threshold"], config.get("struggle_half_life_days", 14)):
+            store.set_struggle_scores(scores)
+
+
+def record_realtime_boosts(failed_cards: List[int], card_ids: List[int]) -> None:
+    """Record a boost made while reviewing in the boost ledger and statistics"""
+    record_boosted_cards(card_ids)
+    record_boost_stats(failed_cards, card_ids)
+    schedule_state_flush()
+
+
+def clear_legacy_processed_revlogs() -> None:
+    """Remove the legacy processed_revlogs.json file"""
     logs_path = os.path.join(get_addon_dir(), "processed_revlogs.json")
     if os.path.exists(logs_path):
         try:
@@ -78,51 +225,236 @@ def clear_processed_revlogs() -> None:
             showInfo(f"Error clearing processed review logs: {str(e)}")
 
 
+def clear_processed_revlogs() -> None:
+    """Clear all processed review logs"""
+    clear_legacy_processed_revlogs()
+    get_state_store().clear_revlog_cursor()
+    flush_state()
+
+
 # Core Functionality
 ####################
 
-def process_failed_reviews() -> None:
-    """Check for failed sentence cards and boost dependencies"""
-    config = get_config()
+class BoostProgress:
+    """
+    Non-modal progress dialog with a cancel button for a boost run.
     
-    # Get configuration values
-    maturity_threshold = config.get("maturity_threshold", 21)
-    days = config.get("days_to_check", 7)
-    processed_revlogs = get_processed_revlogs()
+    Status updates and cancel checks may come from the background thread
+    running the analysis; all widget access is forwarded to the main thread.
+    """
     
-    # Always use days-based filtering (simpler and more intuitive)
-    logs = get_recent_review_logs(days=days)
+    def __init__(self, parent):
+        self.cancelled = threading.Event()
+        self.dialog = QProgressDialog("Processing dependencies...", "Cancel", 0, 0, parent)
+        self.dialog.setWindowTitle("Dependency Booster")
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+        # Only show the dialog for runs that take a noticeable time
+        self.dialog.setMinimumDuration(500)
+        self.dialog.canceled.connect(self.cancelled.set)
     
-    # Find failed sentence cards
-    failed_cards = find_failed_sentence_cards(logs, processed_revlogs)
+    def is_cancelled(self) -> bool:
+        """Check if the user pressed Cancel (safe from any thread)"""
+        return self.cancelled.is_set()
     
-    # Track which review logs we've processed
-    newly_processed = set()
-    for log in logs:
-        newly_processed.add(log["id"])
+    def update(self, message: str) -> None:
+        """Show a status message (safe from any thread)"""
+        mw.taskman.run_on_main(lambda: self.dialog.setLabelText(message))
     
-    # Update processed reviews
-    all_processed = processed_revlogs.union(newly_processed)
-    save_processed_revlogs(all_processed)
+    def close(self) -> None:
+        """Close the dialog (main thread only)"""
+        if self.dialog is None:
+            return
+        self.dialog.canceled.disconnect(self.cancelled.set)
+        self.dialog.close()
+        self.dialog = None
+
+
+def get_profile_path() -> str:
+    """Get a new path for a cProfile dump of a boost run"""
+    profiles_dir = os.path.join(get_addon_dir(), "profiles")
+    os.makedirs(profiles_dir, exist_ok=True)
+    return os.path.join(profiles_dir, time.strftime("boost-%Y%m%d-%H%M%S.prof"))
+
+
+# Created on the first boost request
+run_coordinator = None
+
+
+def get_run_coordinator():
+    """Get the coordinator of boost runs and real-time batches (see core.coordinator)"""
+    global run_coordinator
     
-    # Update last boost time in config
-    config["last_boost_time"] = int(__import__("time").time())
-    save_config(config)
+    if run_coordinator is None:
+        from .core.coordinator import RunCoordinator
+        run_coordinator = RunCoordinator(run_boost, QTimer.singleShot, on_busy=on_boost_busy)
+    return run_coordinator
+
+
+def process_failed_reviews(
+        on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+        trigger: str = "manual",
+        min_usn: Optional[int] = None,
+        delay_ms: int = 0
+) -> None:
+    """
+    Check for failed sentence cards and boost dependencies.
     
-    # Find vocabulary dependencies for each failed card
-    all_deps = []
-    for card_id in failed_cards:
-        deps = find_vocabulary_dependencies(card_id, maturity_threshold)
-        all_deps.extend(deps)
+    Runs never overlap, within Anki or with other processes sharing the
+    add-on's state: a request made during a run is merged into a single
+    follow-up run (see core.coordinator).
     
-    # Deduplicate to avoid rescheduling cards multiple times
-    unique_deps = list(set(all_deps))
+    Args:
+        on_done: Called on the main thread with the analysis result after a
+            successful run
+        trigger: What started the run ("manual", "auto" or "sync"), for the report
+        min_usn: Review log USN taken before a sync, to also read the reviews
+            the sync brought in (see analyse_failed_reviews)
+        delay_ms: Debounce window before the run starts
+    """
+    if not get_run_coordinator().request(trigger, on_done, min_usn, delay_ms) and trigger == "manual":
+        tooltip("A boost is already running. Another run will follow it.", period=3000)
+
+
+def on_boost_busy(request) -> None:
+    """Report a run given up because another process kept the state locked"""
+    if "manual" in request.triggers or "sync" in request.triggers:
+        showInfo(
+            "Dependencies were not boosted: another Anki window or the "
+            "command-line runner is boosting with the same add-on state."
+        )
+
+
+def run_boost(request, finished: Callable[[], None]) -> None:
+    """
+    Run one boost (started by the run coordinator).
+    
+    The review history is analysed in a background operation while a
+    cancellable progress dialog is shown, and the rescheduling is one
+    short collection operation. The review log cursor is only saved once
+    the rescheduling has succeeded, so a cancelled or failed run leaves
+    its reviews to be processed by the next run.
     
-    # Reschedule dependencies
-    count = reschedule_cards_for_tomorrow(unique_deps)
+    Every run records a report with per-stage timings and counters. If
+    "profile next run" is enabled, the analysis also runs under cProfile.
     
-    # Show results
-    show_rescheduling_results(count)
+    Args:
+        request: The merged requests of the run (RunRequest)
+        finished: Called once the run has ended, however it ended
+    """
+    if not mw or not mw.col:
+        finished()
+        return
+    
+    import cProfile
+    from .core.instrumentation import RunReport
+    from .core.pipeline import BoostCancelled, analyse_failed_reviews
+    from .gui.operations import reschedule_op, show_rescheduling_results
+    
+    config = get_config()
+    state = get_revlog_cursor(config)
+    progress = BoostProgress(mw)
+    report = RunReport(request.trigger)
+    min_usn = request.min_usn
+    ledger = get_state_store().get_boost_ledger()
+    scores = get_state_store().get_struggle_scores()
+    
+    profile = config.get("profile_next_run", False)
+    if profile:
+        config["profile_next_run"] = False
+        save_config(config)
+    
+    def analyse(col) -> Dict[str, Any]:
+        # Worker processes can't be started safely inside Anki, so
+        # analysis_workers only applies to the command-line runner
+        def run() -> Dict[str, Any]:
+            return analyse_failed_reviews(
+                col, config, state,
+                should_cancel=progress.is_cancelled,
+                on_progress=progress.update,
+                report=report,
+                min_usn=min_usn,
+                ledger=ledger,
+                scores=scores
+            )
+        
+        if not profile:
+            return run()
+        
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(run)
+        finally:
+            profiler.dump_stats(get_profile_path())
+    
+    def finish(status: str, error: Optional[Exception] = None) -> None:
+        # Keep the report with the last N runs, and write it together with
+        # any other state changes of the run. The coordinator is told the
+        # run has ended even if writing the state fails.
+        try:
+            report.finish(status, str(error) if error is not None else None)
+            get_state_store().add_run_report(report.to_dict(), config.get("run_report_history", 20))
+            flush_state()
+        finally:
+            finished()
+    
+    def on_rescheduled(result: Dict[str, Any]) -> None:
+        try:
+            store = get_state_store()
+            store.set_revlog_cursor(result["cursor_state"])
+            store.set("last_boost_time", int(time.time()))
+            if "struggle_scores" in result:
+                store.set_struggle_scores(result["struggle_scores"])
+            record_boosted_cards(result["card_ids"])
+            with report.stage("update_stats"):
+                record_boost_stats(result["failed_cards"], result["card_ids"])
+        except Exception as e:
+            finish("failed", e)
+            showInfo(f"Error while recording the dependency boost: {str(e)}")
+            return
+        finish("completed")
+        
+        show_rescheduling_results(len(result["card_ids"]), config.get("boost_spread_days", 1))
+        
+        request.notify(result)
+    
+    def on_analysed(result: Dict[str, Any]) -> None:
+        progress.close()
+        if progress.is_cancelled():
+            finish("cancelled")
+            tooltip("Dependency boost cancelled")
+            return
+        
+        if result["card_ids"]:
+            reschedule_op(
+                result["card_ids"],
+                success=lambda: on_rescheduled(result),
+                failure=on_failed,
+                report=report,
+                spread_days=config.get("boost_spread_days", 1),
+                daily_cap=config.get("boost_daily_cap", 0)
+            )
+        else:
+            on_rescheduled(result)
+    
+    def on_failed(error: Exception) -> None:
+        progress.close()
+        if isinstance(error, BoostCancelled):
+            finish("cancelled")
+            tooltip("Dependency boost cancelled")
+        else:
+            finish("failed", error)
+            showInfo(f"Error while boosting dependencies: {str(error)}")
+    
+    QueryOp(
+        parent=mw,
+        op=analyse,
+        success=on_analysed,
+    ).failure(on_failed).run_in_background()
+
+
+# Review log USN taken before the sync of a pending "Sync & Boost"
+_sync_boost_usn: Optional[int] = None
 
 
 def sync_and_boost() -> None:
@@ -131,32 +463,78 @@ def sync_and_boost() -> None:
     
     This function is designed to help users who review cards on AnkiDroid
     and want to process dependencies on desktop Anki.
+    
+    The sync runs in the background, so the boost starts once it has
+    finished (sync_did_finish hook). The review log USN taken before the
+    sync identifies the reviews it brought in, however old they are. The
+    second sync only runs if cards were rescheduled.
     """
+    global _sync_boost_usn
+    
     # Check if collection is available
     if not mw or not mw.col:
         showInfo("Collection not available. Please try again later.")
         return
-        
+    
+    from .core.pipeline import get_tolerance_ms
+    from .core.review_log import get_review_log_usn, get_unsynced_review_log_ids
+    
+    # If an earlier sync never finished, keep its lower USN so the reviews
+    # it may have brought in are still included
+    if _sync_boost_usn is None:
+        _sync_boost_usn = get_review_log_usn(mw.col)
+        gui_hooks.sync_did_finish.append(on_sync_and_boost_synced)
+    
+    # Local reviews behind the cursor's tolerance window were handled by
+    # earlier runs, but the sync uploads them with the same new USN as the
+    # reviews it brings in. Record them as processed, so only the reviews
+    # that came from the server are read behind the cursor.
+    config = get_config()
+    cursor = get_revlog_cursor(config)["cursor"]
+    if cursor is not None:
+        mark_revlogs_processed(get_unsynced_review_log_ids(
+            mw.col, config.get("days_to_check", 7), cursor - get_tolerance_ms(config)))
+    
     # First sync to get AnkiDroid reviews
     tooltip("Starting sync with AnkiWeb...", period=5000)
     
     try:
-        # Modern Anki versions use mw.onSync() to trigger sync
-        mw.onSync()
-        
-        # Process failed reviews after sync completes
-        tooltip("Sync completed. Processing dependencies...", period=3000)
-        process_failed_reviews()
-        
-        # Sync back to AnkiWeb
-        tooltip("Boosting complete. Syncing changes back to AnkiWeb...", period=5000)
         mw.onSync()
-        
-        showInfo("Sync and boost process complete! Your changes have been synced back to AnkiWeb.")
     except Exception as e:
+        _sync_boost_usn = None
+        gui_hooks.sync_did_finish.remove(on_sync_and_boost_synced)
         showInfo(f"Error during sync and boost: {str(e)}")
 
 
+def on_sync_and_boost_synced() -> None:
+    """Boost the reviews brought in by the first sync of "Sync & Boost" (sync_did_finish hook)"""
+    global _sync_boost_usn
+    
+    gui_hooks.sync_did_finish.remove(on_sync_and_boost_synced)
+    min_usn = _sync_boost_usn
+    _sync_boost_usn = None
+    if not mw.col:
+        return
+    
+    from .core.review_log import get_review_log_usn
+    
+    # The sync failed or had nothing to exchange
+    if get_review_log_usn(mw.col) == min_usn:
+        tooltip("No new reviews arrived with the sync.", period=3000)
+        return
+    
+    def sync_back(result: Dict[str, Any]) -> None:
+        if not result["card_ids"]:
+            tooltip("Sync and boost complete. No cards were rescheduled, so no second sync is needed.", period=5000)
+            return
+        tooltip("Boosting complete. Syncing changes back to AnkiWeb...", period=5000)
+        mw.onSync()
+    
+    # The run starts once the sync's completion handler has returned
+    tooltip("Sync completed. Processing dependencies...", period=3000)
+    process_failed_reviews(on_done=sync_back, trigger="sync", min_usn=min_usn)
+
+
 # UI Integration
 ################
 
@@ -178,15 +556,93 @@ def on_state_change(new_state, old_state, *args):
     
     # If we're leaving the review state
     if old_state == "review" and new_state != "review":
+        # Boost any failures still waiting for the real-time debounce timer;
+        # the coordinator runs the batch before the full run requested below
+        if realtime_booster is not None:
+            realtime_booster.flush()
+        
         config = get_config()
         if config.get("auto_boost_enabled", False):
-            # Add a small delay to ensure all data is properly saved
+            # Add a small delay to ensure all data is properly saved; state
+            # changes in quick succession start a single run
             tooltip("Review complete. Processing dependencies...", period=3000)
-            QTimer.singleShot(1000, process_failed_reviews)
+            process_failed_reviews(
+                trigger="auto",
+                delay_ms=int(config.get("run_debounce_seconds", 1) * 1000)
+            )
     
     prev_state = new_state
 
 
+# Created on the first failed answer while real-time boosting is enabled
+realtime_booster = None
+
+
+def on_answer_card(reviewer, card, ease: int) -> None:
+    """Pass failed answers to the real-time booster (reviewer_did_answer_card hook)"""
+    global realtime_booster
+    
+    if ease != 1 or not get_config().get("realtime_boost_enabled", False):
+        return
+    
+    if realtime_booster is None:
+        from .gui.realtime import RealtimeBooster
+        realtime_booster = RealtimeBooster(
+            get_config, get_run_coordinator().submit_task, mark_revlogs_processed, record_realtime_boosts)
+    realtime_booster.on_answer(reviewer, card, ease)
+
+
+def on_profile_did_open() -> None:
+    """
+    Switch to the state directory of the opened profile and forget a group
+    index loaded for the previous profile.
+    """
+    from .core.state import use_profile_state_dir
+    
+    try:
+        use_profile_state_dir(mw.pm.collectionPath())
+    except OSError as e:
+        showInfo(f"Error opening the add-on state of this profile: {str(e)}")
+    group_index = get_loaded_module("core.index")
+    if group_index is not None:
+        group_index.on_collection_opened()
+
+
+def on_profile_will_close() -> None:
+    """Persist pending state and group index changes made during the session"""
+    if get_loaded_module("core.state") is not None:
+        flush_state()
+    group_index = get_loaded_module("core.index")
+    if group_index is not None:
+        group_index.on_profile_closing()
+
+
+def on_note_added(note) -> None:
+    """Index a note added through the Add Cards dialog"""
+    group_index = get_loaded_module("core.index")
+    if group_index is not None:
+        group_index.on_note_added(note)
+
+
+def on_note_tags_updated(note) -> None:
+    """Re-index a note whose tags were edited in the editor"""
+    group_index = get_loaded_module("core.index")
+    if group_index is not None:
+        group_index.on_note_tags_updated(note)
+
+
+def on_notes_deleted(col, note_ids) -> None:
+    """Drop deleted notes from the group index"""
+    group_index = get_loaded_module("core.index")
+    if group_index is not None:
+        group_index.on_notes_deleted(col, note_ids)
+
+
+def update_menu() -> None:
+    """Show the current auto-boost setting when the menu opens"""
+    auto_boost_action.setChecked(get_config().get("auto_boost_enabled", False))
+
+
 def toggle_auto_boost():
     """Toggle automatic boosting after review sessions"""
     config = get_config()
@@ -209,8 +665,9 @@ class SettingsDialog(QDialog):
         
         # Check if this is the first time opening settings
         self.is_first_use = not self.config.get("settings_viewed", False)
-        self.config["settings_viewed"] = True
-        save_config(self.config)
+        if self.is_first_use:
+            self.config["settings_viewed"] = True
+            save_config(self.config)
         
         self.initUI()
         
@@ -297,6 +754,17 @@ class SettingsDialog(QDialog):
         )
         layout.addWidget(auto_help)
         
+        # Real-time boost setting
+        self.realtime_checkbox = QCheckBox("Boost while reviewing")
+        self.realtime_checkbox.setChecked(self.config.get("realtime_boost_enabled", False))
+        layout.addWidget(self.realtime_checkbox)
+        
+        realtime_help = self.create_help_label(
+            "When enabled, the vocabulary of a failed sentence card is rescheduled "
+            "a few seconds after you fail it, without waiting for the session to end."
+        )
+        layout.addWidget(realtime_help)
+        
         layout.addSpacing(10)
         
         # === SECTION: MAINTENANCE ===
@@ -316,12 +784,68 @@ class SettingsDialog(QDialog):
         layout.addWidget(clear_help)
         
         # Review history stats
-        logs_count = len(get_processed_revlogs())
-        history_label = QLabel(f"Processed reviews: {logs_count}")
+        cursor = get_revlog_cursor(self.config)["cursor"]
+        if cursor is None:
+            history_label = QLabel("Processed reviews: none yet")
+        else:
+            processed_until = time.strftime("%Y-%m-%d %H:%M", time.localtime(cursor / 1000))
+            history_label = QLabel(f"Processed reviews up to: {processed_until}")
         layout.addWidget(history_label)
         
         layout.addSpacing(10)
         
+        # === SECTION: BOOST EFFECTIVENESS ===
+        section_label = QLabel("<b>Boost Effectiveness</b>")
+        layout.addWidget(section_label)
+        
+        # Rendered from the counts kept up to date by each boost run
+        from .core.stats import format_stats
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setMinimumHeight(100)
+        self.stats_view.setPlainText(format_stats(get_state_store().get_boost_stats()))
+        layout.addWidget(self.stats_view)
+        
+        stats_help = self.create_help_label(
+            "How boosted vocabulary cards, and the failed sentences that caused "
+            "the boost, did on their next review. Updated by each boost run."
+        )
+        layout.addWidget(stats_help)
+        
+        layout.addSpacing(10)
+        
+        # === SECTION: DIAGNOSTICS ===
+        section_label = QLabel("<b>Diagnostics</b>")
+        layout.addWidget(section_label)
+        
+        # Recent run reports, newest first
+        from .core.instrumentation import format_report
+        reports = get_state_store().get_run_reports()
+        self.reports_view = QPlainTextEdit()
+        self.reports_view.setReadOnly(True)
+        self.reports_view.setMinimumHeight(120)
+        self.reports_view.setPlainText(
+            "\n\n".join(format_report(report) for report in reversed(reports))
+            or "No boost runs recorded yet."
+        )
+        layout.addWidget(self.reports_view)
+        
+        # Profiling toggle
+        self.profile_checkbox = QCheckBox("Profile next run")
+        self.profile_checkbox.setChecked(self.config.get("profile_next_run", False))
+        layout.addWidget(self.profile_checkbox)
+        
+        profile_help = self.create_help_label(
+            "Saves a cProfile dump of the next boost run to the add-on's "
+            "profiles folder, for reporting performance problems."
+        )
+        layout.addWidget(profile_help)
+        
+        startup_label = QLabel(f"Add-on startup time: {startup_seconds * 1000:.1f} ms")
+        layout.addWidget(startup_label)
+        
+        layout.addSpacing(10)
+        
         # Dialog buttons
         buttons_layout = QHBoxLayout()
         save_button = QPushButton("Save")
@@ -368,6 +892,8 @@ class SettingsDialog(QDialog):
         self.config["maturity_threshold"] = self.maturity_spinner.value()
         self.config["days_to_check"] = self.days_spinner.value() 
         self.config["auto_boost_enabled"] = self.auto_boost_checkbox.isChecked()
+        self.config["realtime_boost_enabled"] = self.realtime_checkbox.isChecked()
+        self.config["profile_next_run"] = self.profile_checkbox.isChecked()
         save_config(self.config)
         
         # Update menu item checked state
@@ -401,8 +927,8 @@ dependency_menu.addAction(sync_action)
 # Add auto-boost toggle to menu
 auto_boost_action = QAction("Enable Auto-Boost After Review", mw)
 auto_boost_action.setCheckable(True)
-auto_boost_action.setChecked(get_config().get("auto_boost_enabled", False))
 auto_boost_action.triggered.connect(toggle_auto_boost)
+dependency_menu.aboutToShow.connect(update_menu)
 dependency_menu.addSeparator()
 dependency_menu.addAction(auto_boost_action)
 
@@ -412,4 +938,19 @@ settings_action.triggered.connect(show_settings)
 dependency_menu.addAction(settings_action)
 
 # Register state change hook instead of card answer hook
-addHook("afterStateChange", on_state_change) 
\ No newline at end of file
+addHook("afterStateChange", on_state_change)
+
+# Boost dependencies during reviews as sentence cards are failed
+gui_hooks.reviewer_did_answer_card.append(on_answer_card)
+
+# Keep the group index in sync with the collection once it has been loaded
+gui_hooks.profile_did_open.append(on_profile_did_open)
+gui_hooks.profile_will_close.append(on_profile_will_close)
+gui_hooks.add_cards_did_add_note.append(on_note_added)
+gui_hooks.editor_did_update_tags.append(on_note_tags_updated)
+hooks.notes_will_be_deleted.append(on_notes_deleted)
+
+# Keep the cached configuration current when it is edited in Anki
+mw.addonManager.setConfigUpdatedAction(__name__, on_config_updated)
+
+startup_seconds = time.perf_counter() - _load_started
@@ -0,0 +1,270 @@
+"""
+Run the offline benchmark suite.
+
+Generates a synthetic collection for each review log size, runs every
+stage of the boost pipeline against it through the collection stand-in and
+writes per-stage timings as JSON, so results can be compared between
+versions of the add-on.
+
+Usage (from the add-on directory):
+
+    python -m benchmarks.run [--sizes 10000 100000 1000000] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from . import standin
+from .startup import measure_startup_in_subprocess
+from .synthetic import DEFAULT_PARAMS, generate_collection
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_DAYS_TO_CHECK = 30
+DEFAULT_MATURITY_THRESHOLD = 21
+
+# Failed sentences the substring LIKE candidate query is run for; it
+# scans every note once per group tag, so it is sampled
+LIKE_SAMPLE_SIZE = 50
+
+
+def time_stage(stages: Dict[str, Any], name: str, func: Callable[[], Any]) -> Any:
+    """
+    Run one pipeline stage and record its wall time.
+
+    Args:
+        stages: Dictionary the stage result is recorded in
+        name: Name of the stage
+        func: Function running the stage
+
+    Returns:
+        The stage function's return value
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+
+    stages[name] = {"seconds": round(elapsed, 6)}
+    if isinstance(result, (list, set, dict)):
+        stages[name]["items"] = len(result)
+    elif isinstance(result, int):
+        stages[name]["items"] = result
+    return result
+
+
+def find_like_candidates(col, card_ids: List[int]) -> List[int]:
+    """
+    Find the vocabulary candidates of failed sentences the way detection
+    did before tags were matched as exact tokens: with substring LIKE
+    patterns, so `group:s1` also matches `group:s10`, `group:s11` and so
+    on. Kept to compare its candidate count with the exact-token lookup.
+
+    Args:
+        col: The collection stand-in
+        card_ids: IDs of the failed sentence cards
+
+    Returns:
+        IDs of the candidate vocabulary cards, before the maturity filter
+    """
+    if not card_ids:
+        return []
+    # Anki stores note tags space-separated with a leading and trailing
+    # space, so the recursive CTE peels one tag off the front per step.
+    ids = ",".join(str(card_id) for card_id in card_ids)
+    return col.db.list(f"""
+    WITH RECURSIVE
+        split(tag, rest) AS (
+            SELECT '', substr(n.tags, 2)
+            FROM cards c
+            JOIN notes n ON c.nid = n.id
+            WHERE c.id IN ({ids})
+            UNION ALL
+            SELECT substr(rest, 1, instr(rest, ' ') - 1),
+                   substr(rest, instr(rest, ' ') + 1)
+            FROM split
+            WHERE rest <> ''
+        ),
+        sentence_groups(tag) AS (
+            SELECT DISTINCT tag
+            FROM split
+            WHERE substr(tag, 1, 7) = 'group:s'
+        )
+    SELECT DISTINCT c.id
+    FROM cards c
+    JOIN notes n ON c.nid = n.id
+    WHERE
+        n.tags LIKE '%type:vocab%'
+        AND EXISTS (
+            SELECT 1
+            FROM sentence_groups g
+            WHERE n.tags LIKE '%' || g.tag || '%'
+        )
+    """)
+
+
+def run_size(revlog_rows: int, workdir: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Benchmark every stage against a collection with the given review log size.
+
+    Args:
+        revlog_rows: Number of review log rows to generate
+        workdir: Directory for the collection and add-on state files
+        args: Parsed command line arguments
+
+    Returns:
+        Dictionary with the collection parameters and per-stage results
+    """
+    path = os.path.join(workdir, f"collection-{revlog_rows}.anki2")
+    generate_start = time.perf_counter()
+    params = generate_collection(
+        path,
+        revlog_rows=revlog_rows,
+        vocab_notes=args.vocab_notes,
+        sentence_notes=args.sentence_notes,
+        groups=args.groups,
+        failure_rate=args.failure_rate,
+    )
+    generate_seconds = time.perf_counter() - generate_start
+    col = standin.StandInCollection(path)
+
+    review_log = standin.load_addon_module("core.review_log")
+    detection = standin.load_addon_module("core.detection")
+    reschedule = standin.load_addon_module("core.reschedule")
+    index = standin.load_addon_module("core.index")
+    automaton = standin.load_addon_module("core.automaton")
+    state = standin.load_addon_module("core.state")
+    pipeline = standin.load_addon_module("core.pipeline")
+    ranking = standin.load_addon_module("core.ranking")
+    instrumentation = standin.load_addon_module("core.instrumentation")
+    snapshot = standin.load_addon_module("core.snapshot")
+
+    # Keep the persisted indexes out of the add-on directory
+    state.set_state_dir(os.path.join(workdir, f"state-{revlog_rows}"))
+
+    days = args.days_to_check
+    threshold = args.maturity_threshold
+    stages: Dict[str, Any] = {}
+
+    logs = time_stage(stages, "get_recent_review_logs",
+                      lambda: review_log.get_recent_review_logs(col, days=days))
+    failed_cards = time_stage(stages, "find_failed_sentence_cards",
+                              lambda: review_log.find_failed_sentence_cards(col, logs, set()))
+    time_stage(stages, "iter_failed_sentence_reviews",
+               lambda: list(review_log.iter_failed_sentence_reviews(col, days=days)))
+    time_stage(stages, "group_index_build", lambda: index.get_group_index(col).card_count())
+    time_stage(stages, "headword_index_build",
+               lambda: automaton.get_headword_index(col, "Word").card_count())
+
+    # Dependencies of all failed sentences as found by each detection method
+    config = {"days_to_check": days, "maturity_threshold": threshold}
+    deps = time_stage(stages, "find_dependencies_tags",
+                      lambda: pipeline.find_dependencies(
+                          col, dict(config, detection_method="tags"), failed_cards, instrumentation.RunReport()))
+    # Candidate vocabulary cards of a sample of the failed sentences,
+    # before the maturity filter: substring matching (as before exact tag
+    # tokens) against the group index
+    sample = failed_cards[:LIKE_SAMPLE_SIZE]
+    time_stage(stages, "candidates_like_tags", lambda: find_like_candidates(col, sample))
+    time_stage(stages, "candidates_exact_tags",
+               lambda: detection.collect_vocabulary_dependencies_batch(col, sample))
+    time_stage(stages, "find_dependencies_fields",
+               lambda: pipeline.find_dependencies(
+                   col, dict(config, detection_method="fields"), failed_cards, instrumentation.RunReport()))
+    # Full analysis phase as run by the add-on, with its own run report
+    report = instrumentation.RunReport("benchmark")
+    time_stage(stages, "analyse_failed_reviews",
+               lambda: pipeline.analyse_failed_reviews(
+                   col, config, {"cursor": None, "recent": set()}, report=report
+               )["card_ids"])
+    report.finish("completed")
+    time_stage(stages, "analyse_failed_reviews_parallel",
+               lambda: snapshot.analyse_failed_reviews_parallel(
+                   col, config, {"cursor": None, "recent": set()}, args.workers
+               )["card_ids"])
+    time_stage(stages, "select_least_retained",
+               lambda: ranking.select_least_retained(col, deps, max(1, len(deps) // 10)))
+
+    def reschedule_dependencies() -> List[int]:
+        eligible = reschedule.get_cards_to_reschedule(col, deps)
+        reschedule.reschedule_cards(col, eligible)
+        return eligible
+
+    eligible = time_stage(stages, "reschedule_cards", reschedule_dependencies)
+
+    # Moves the same cards again, spread over a week
+    def spread_dependencies() -> List[int]:
+        reschedule.reschedule_cards(col, eligible, spread_days=7)
+        return eligible
+
+    time_stage(stages, "reschedule_cards_spread", spread_dependencies)
+    col.close()
+
+    return {
+        "revlog_rows": revlog_rows,
+        "params": params,
+        "days_to_check": days,
+        "maturity_threshold": threshold,
+        "generate_seconds": round(generate_seconds, 3),
+        "stages": stages,
+        "pipeline_report": report.to_dict(),
+    }
+
+
+def get_addon_version() -> str:
+    """Read the add-on version from manifest.json"""
+    with open(os.path.join(standin.ADDON_DIR, "manifest.json"), "r") as f:
+        return json.load(f).get("human_version", "unknown")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Dependency Booster pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Review log sizes to benchmark")
+    parser.add_argument("--vocab-notes", type=int, default=DEFAULT_PARAMS["vocab_notes"])
+    parser.add_argument("--sentence-notes", type=int, default=DEFAULT_PARAMS["sentence_notes"])
+    parser.add_argument("--groups", type=int, default=DEFAULT_PARAMS["groups"])
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_PARAMS["failure_rate"])
+    parser.add_argument("--days-to-check", type=int, default=DEFAULT_DAYS_TO_CHECK)
+    parser.add_argument("--maturity-threshold", type=int, default=DEFAULT_MATURITY_THRESHOLD)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used by the parallel analysis stage")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="Path of the JSON results file")
+    args = parser.parse_args(argv)
+
+    startup = measure_startup_in_subprocess()
+    print(f"add-on startup: {startup['seconds'] * 1000:.2f} ms, "
+          f"{len(startup['addon_modules_imported'])} add-on modules imported")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            result = run_size(size, workdir, args)
+            results.append(result)
+            print(f"revlog rows: {size}")
+            for name, stage in result["stages"].items():
+                items = stage.get("items", "")
+                print(f"  {name:<40} {stage['seconds']:>10.4f}s {items:>8}")
+
+    report = {
+        "addon_version": get_addon_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "startup": startup,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
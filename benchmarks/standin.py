@@ -0,0 +1,171 @@
+"""
+Lightweight stand-in for the Anki collection.
+
+The add-on's core modules don't need Qt, but the benchmarks should not
+need the `anki` library either. This module provides a SQLite-backed
+collection that implements the parts of the collection the add-on uses
+(`db`, `get_card`, `decks`, `models`, `sched`, `mod`, `usn` and undo
+entries), and loads the add-on package without running its GUI setup in
+`__init__.py`.
+"""
+
+import importlib
+import os
+import sqlite3
+import sys
+import time
+import types
+from typing import Any, Dict, List, Optional
+
+from .synthetic import NOTETYPES
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "dependency_booster"
+
+
+class StandInDB:
+    """Subset of Anki's DBProxy on top of a sqlite3 connection"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def execute(self, sql: str, *args) -> List[Any]:
+        return self.conn.execute(sql, args).fetchall()
+
+    def all(self, sql: str, *args) -> List[Any]:
+        return self.conn.execute(sql, args).fetchall()
+
+    def list(self, sql: str, *args) -> List[Any]:
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def first(self, sql: str, *args) -> Optional[Any]:
+        return self.conn.execute(sql, args).fetchone()
+
+    def scalar(self, sql: str, *args) -> Any:
+        row = self.conn.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+
+class StandInNote:
+    """Note with the attributes the add-on reads"""
+
+    def __init__(self, col: "StandInCollection", note_id: int):
+        self.id = note_id
+        tags, fields = col.db.first("SELECT tags, flds FROM notes WHERE id = ?", note_id)
+        self.tags = tags.split()
+        self.fields = fields.split("\x1f")
+
+
+class StandInCard:
+    """Card with the attributes the add-on reads and writes"""
+
+    FIELDS = ("nid", "did", "odid", "queue", "type", "due", "ivl")
+
+    def __init__(self, col: "StandInCollection", card_id: int, row: tuple):
+        self.col = col
+        self.id = card_id
+        for name, value in zip(self.FIELDS, row):
+            setattr(self, name, value)
+
+    def note(self) -> StandInNote:
+        return StandInNote(self.col, self.nid)
+
+    def flush(self) -> None:
+        self.col.db.execute(
+            "UPDATE cards SET did = ?, odid = ?, queue = ?, type = ?, due = ?, ivl = ? WHERE id = ?",
+            self.did, self.odid, self.queue, self.type, self.due, self.ivl, self.id
+        )
+
+
+class StandInDecks:
+    """Deck manager with a single default deck"""
+
+    def current(self) -> Dict[str, Any]:
+        return {"id": 1, "name": "Default"}
+
+
+class StandInModels:
+    """Notetype manager for the synthetic notetypes"""
+
+    def get(self, mid: int) -> Optional[Dict[str, Any]]:
+        names = NOTETYPES.get(mid)
+        if names is None:
+            return None
+        return {"id": mid, "flds": [{"name": name, "ord": ord} for ord, name in enumerate(names)]}
+
+
+class StandInScheduler:
+    """Scheduler exposing `today` and the bulk due date operation"""
+
+    def __init__(self, col: "StandInCollection"):
+        self.col = col
+
+    @property
+    def today(self) -> int:
+        return int((time.time() - self.col.crt) // 86400)
+
+    def set_due_date(self, card_ids: List[int], days: str, config_key=None) -> None:
+        due_in = int(days.rstrip("!"))
+        ivl_clause = ", ivl = ?" if days.endswith("!") else ""
+        args = [self.today + due_in] + ([due_in] if ivl_clause else [])
+        ids = ",".join(str(int(cid)) for cid in card_ids)
+        self.col.db.execute(
+            f"UPDATE cards SET due = ?, queue = 2, type = 2{ivl_clause} WHERE id IN ({ids})",
+            *args
+        )
+
+
+class StandInCollection:
+    """
+    SQLite-backed stand-in for `mw.col`.
+
+    Args:
+        path: Path of a collection created by benchmarks.synthetic
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.db = StandInDB(self.conn)
+        self.decks = StandInDecks()
+        self.models = StandInModels()
+        self.sched = StandInScheduler(self)
+        self.crt = self.db.scalar("SELECT crt FROM col")
+
+    @property
+    def mod(self) -> int:
+        return self.db.scalar("SELECT mod FROM col")
+
+    def usn(self) -> int:
+        return self.db.scalar("SELECT usn FROM col")
+
+    def get_card(self, card_id: int) -> Optional[StandInCard]:
+        row = self.db.first(
+            "SELECT nid, did, odid, queue, type, due, ivl FROM cards WHERE id = ?", card_id
+        )
+        if row is None:
+            return None
+        return StandInCard(self, card_id, row)
+
+    def add_custom_undo_entry(self, name: str) -> int:
+        return 0
+
+    def merge_undo_entries(self, target: int) -> None:
+        return None
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def load_addon_module(name: str) -> types.ModuleType:
+    """
+    Import a module of the add-on (e.g. "core.detection").
+
+    The add-on package is registered without executing its `__init__.py`,
+    which builds the Qt menu.
+    """
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
@@ -0,0 +1,106 @@
+"""
+Measure the cost of loading the add-on at Anki startup.
+
+Runs the add-on's `__init__.py` against stub `aqt` and `anki` modules in
+a fresh interpreter, and reports how long it took and which of the
+add-on's modules it imported. Anki has already imported `aqt` and Qt by
+the time add-ons load, so the stubs leave only the add-on's own cost.
+
+Usage (from the add-on directory):
+
+    python -m benchmarks.startup
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+from typing import Any, Dict
+
+from .standin import ADDON_DIR, PACKAGE_NAME
+
+
+class _Anything:
+    """Accepts any constructor arguments, attribute access and call"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name: str) -> "_Anything":
+        return _Anything()
+
+    def __call__(self, *args, **kwargs) -> "_Anything":
+        return _Anything()
+
+
+def install_gui_stubs() -> None:
+    """Register stub `aqt` and `anki` modules in sys.modules"""
+    def stub_module(name: str) -> types.ModuleType:
+        module = types.ModuleType(name)
+        # Any name imported from the module is a stub class
+        module.__getattr__ = lambda attr: _Anything
+        sys.modules[name] = module
+        return module
+
+    aqt = stub_module("aqt")
+    aqt.mw = _Anything()
+    aqt.gui_hooks = _Anything()
+    for name in ("aqt.qt", "aqt.operations", "aqt.utils"):
+        stub_module(name)
+    anki = stub_module("anki")
+    anki.hooks = _Anything()
+    anki_hooks = stub_module("anki.hooks")
+    anki_hooks.addHook = lambda *args: None
+
+
+def measure_startup() -> Dict[str, Any]:
+    """
+    Load the add-on package in this process and time it.
+
+    Returns:
+        Dictionary with the load time and the add-on modules imported
+    """
+    install_gui_stubs()
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(ADDON_DIR, "__init__.py"),
+        submodule_search_locations=[ADDON_DIR],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+
+    start = time.perf_counter()
+    spec.loader.exec_module(module)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": round(elapsed, 6),
+        "addon_modules_imported": sorted(
+            name for name in sys.modules if name.startswith(PACKAGE_NAME + ".")
+        ),
+    }
+
+
+def measure_startup_in_subprocess() -> Dict[str, Any]:
+    """
+    Measure the startup cost in a fresh interpreter, so modules imported
+    by earlier benchmarks don't hide any cost.
+
+    Returns:
+        Dictionary produced by measure_startup
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup"],
+        cwd=ADDON_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure_startup()))
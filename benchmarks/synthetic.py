@@ -0,0 +1,159 @@
+"""
+Synthetic collection generator for the benchmarks.
+
+Creates an SQLite file with the subset of Anki's schema the add-on reads
+(col, notes, cards, revlog, fields and their indexes), filled with tagged
+vocabulary and sentence notes and a review history.
+"""
+
+import random
+import sqlite3
+import time
+from typing import Any, Dict
+
+
+SCHEMA = """
+CREATE TABLE col (
+    id integer PRIMARY KEY, crt integer NOT NULL, mod integer NOT NULL,
+    scm integer NOT NULL, ver integer NOT NULL, usn integer NOT NULL
+);
+CREATE TABLE notes (
+    id integer PRIMARY KEY, guid text NOT NULL, mid integer NOT NULL,
+    mod integer NOT NULL, usn integer NOT NULL, tags text NOT NULL,
+    flds text NOT NULL, sfld integer NOT NULL, csum integer NOT NULL,
+    flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE cards (
+    id integer PRIMARY KEY, nid integer NOT NULL, did integer NOT NULL,
+    ord integer NOT NULL, mod integer NOT NULL, usn integer NOT NULL,
+    type integer NOT NULL, queue integer NOT NULL, due integer NOT NULL,
+    ivl integer NOT NULL, factor integer NOT NULL, reps integer NOT NULL,
+    lapses integer NOT NULL, left integer NOT NULL, odue integer NOT NULL,
+    odid integer NOT NULL, flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE revlog (
+    id integer PRIMARY KEY, cid integer NOT NULL, usn integer NOT NULL,
+    ease integer NOT NULL, ivl integer NOT NULL, lastIvl integer NOT NULL,
+    factor integer NOT NULL, time integer NOT NULL, type integer NOT NULL
+);
+CREATE TABLE fields (
+    ntid integer NOT NULL, ord integer NOT NULL, name text NOT NULL,
+    config blob NOT NULL, PRIMARY KEY (ntid, ord)
+) without rowid;
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+"""
+
+# Notetypes of the generated notes, with their field names
+VOCAB_MID = 1
+SENTENCE_MID = 2
+NOTETYPES = {
+    VOCAB_MID: ["Word", "Meaning"],
+    SENTENCE_MID: ["Sentence", "Translation"],
+}
+
+DEFAULT_PARAMS: Dict[str, Any] = {
+    "vocab_notes": 20000,
+    "sentence_notes": 20000,
+    "groups": 20000,
+    "groups_per_vocab": 1,
+    "groups_per_sentence": 3,
+    "cards_per_note": 1,
+    "revlog_rows": 100000,
+    "history_days": 365,
+    "failure_rate": 0.1,
+    "sentence_review_share": 0.5,
+    "seed": 1,
+}
+
+
+def _tag_string(tags) -> str:
+    """Format tags the way Anki stores them: space separated and padded"""
+    return " " + " ".join(tags) + " "
+
+
+def generate_collection(path: str, **overrides) -> Dict[str, Any]:
+    """
+    Create a synthetic collection file.
+
+    Args:
+        path: Path of the SQLite file to create (must not exist)
+        **overrides: Values overriding DEFAULT_PARAMS
+
+    Returns:
+        The parameters used, with counts of the generated rows
+    """
+    params = dict(DEFAULT_PARAMS, **overrides)
+    rng = random.Random(params["seed"])
+    now = int(time.time())
+    crt = now - (params["history_days"] + 30) * 86400
+    today = (now - crt) // 86400
+
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO col VALUES (1, ?, ?, ?, 18, 0)", (crt, now * 1000, now * 1000))
+    conn.executemany(
+        "INSERT INTO fields VALUES (?, ?, ?, '')",
+        [(mid, ordinal, name) for mid, names in NOTETYPES.items() for ordinal, name in enumerate(names)]
+    )
+
+    groups = range(1, params["groups"] + 1)
+    notes = []
+    cards = []
+    vocab_cards = []
+    sentence_cards = []
+    next_id = crt * 1000
+
+    def add_note(mid, tags, fields, target):
+        nonlocal next_id
+        next_id += 1
+        note_id = next_id
+        notes.append((note_id, f"g{note_id}", mid, crt, 0, _tag_string(tags), "\x1f".join(fields), fields[0], 0, 0, ""))
+        for ordinal in range(params["cards_per_note"]):
+            next_id += 1
+            ivl = rng.randint(1, 200)
+            due = today + rng.randint(-5, ivl)
+            cards.append((next_id, note_id, 1, ordinal, crt, 0, 2, 2, due, ivl, 2500, 10, 1, 0, 0, 0, 0, "{}"))
+            target.append(next_id)
+
+    # Sentences contain the headwords of their groups' vocabulary, so tag
+    # and field detection find the same dependencies
+    group_words = {}
+    for number in range(params["vocab_notes"]):
+        note_groups = rng.sample(groups, params["groups_per_vocab"])
+        word = f"word{number}"
+        for g in note_groups:
+            group_words.setdefault(g, []).append(word)
+        add_note(VOCAB_MID, ["type:vocab"] + [f"group:s{g}" for g in note_groups],
+                 [word, f"meaning of {word}"], vocab_cards)
+    for _ in range(params["sentence_notes"]):
+        note_groups = rng.sample(groups, params["groups_per_sentence"])
+        words = [word for g in note_groups for word in group_words.get(g, [])]
+        add_note(SENTENCE_MID, ["type:sentence"] + [f"group:s{g}" for g in note_groups],
+                 [f"<b>{' '.join(words)}</b> text", "translation"], sentence_cards)
+
+    conn.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", notes)
+    conn.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", cards)
+
+    # Spread the review history evenly over the history window, ending now.
+    # Review log IDs are millisecond timestamps and must be unique.
+    span_ms = params["history_days"] * 86400 * 1000
+    revlog_ids = sorted(rng.sample(range(now * 1000 - span_ms, now * 1000), params["revlog_rows"]))
+    revlog = []
+    for revlog_id in revlog_ids:
+        if rng.random() < params["sentence_review_share"]:
+            card_id = rng.choice(sentence_cards)
+        else:
+            card_id = rng.choice(vocab_cards)
+        ease = 1 if rng.random() < params["failure_rate"] else 3
+        revlog.append((revlog_id, card_id, 0, ease, 10, 5, 2500, 6000, 1))
+    conn.executemany("INSERT INTO revlog VALUES (?,?,?,?,?,?,?,?,?)", revlog)
+
+    conn.commit()
+    conn.close()
+
+    return dict(params, notes=len(notes), cards=len(cards))
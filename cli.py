@@ -0,0 +1,207 @@
+"""
+Headless boost runner.
+
+Opens Anki collections directly with the `anki` library, without Qt or
+the desktop GUI, and runs the same analysis and rescheduling as the
+"Boost Dependencies" menu action. Suitable for running from cron on a
+server holding several profiles:
+
+    python /path/to/addon/cli.py ~/.local/share/Anki2/*/collection.anki2
+
+A collection can't be opened while Anki has it open, so schedule runs
+for times the desktop app is closed. Each collection gets its own state
+directory (review log cursor, indexes and run reports).
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import types
+from typing import Any, Dict, List
+
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_NAME = "dependency_booster"
+
+
+def load_addon_module(name: str) -> types.ModuleType:
+    """
+    Import a module of the add-on (e.g. "core.pipeline").
+
+    The add-on package is registered without executing its `__init__.py`,
+    which needs the Anki GUI.
+    """
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[PACKAGE_NAME] = package
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+
+def load_config(path: str = None) -> Dict[str, Any]:
+    """
+    Load the add-on configuration like Anki does.
+
+    The defaults from config.json are overridden by the settings saved
+    from Anki (kept in meta.json), then by an optional extra file.
+
+    Args:
+        path: Optional JSON file with settings overriding the others
+
+    Returns:
+        The configuration
+    """
+    with open(os.path.join(ADDON_DIR, "config.json"), "r") as f:
+        config = json.load(f)
+
+    meta_path = os.path.join(ADDON_DIR, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            config.update(json.load(f).get("config") or {})
+
+    if path:
+        with open(path, "r") as f:
+            config.update(json.load(f))
+    return config
+
+
+def boost_collection(path: str, config: Dict[str, Any], state_dir: str, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Run a boost over one collection.
+
+    Args:
+        path: Path of the collection file
+        config: Add-on configuration
+        state_dir: State directory of the collection
+        dry_run: Only report what would be rescheduled
+
+    Returns:
+        The serialised run report
+
+    Raises:
+        RuntimeError: If another process is boosting with the same state directory
+    """
+    state_store = load_addon_module("core.state")
+    state_store.set_state_dir(state_dir)
+
+    # Never run at the same time as Anki or another runner using this state
+    lock = state_store.FileLock(state_store.get_state_path(state_store.LOCK_FILENAME))
+    if not lock.acquire():
+        raise RuntimeError(f"another boost run is using the state in {state_dir}")
+    try:
+        return _boost_collection(path, config, dry_run)
+    finally:
+        lock.release()
+
+
+def _boost_collection(path: str, config: Dict[str, Any], dry_run: bool) -> Dict[str, Any]:
+    """Run a boost over one collection while holding the state directory's lock"""
+    from anki.collection import Collection
+
+    state_store = load_addon_module("core.state")
+    instrumentation = load_addon_module("core.instrumentation")
+    pipeline = load_addon_module("core.pipeline")
+    reschedule = load_addon_module("core.reschedule")
+    boost_stats = load_addon_module("core.stats")
+    boost_ledger = load_addon_module("core.ledger")
+    struggle = load_addon_module("core.struggle")
+
+    store = state_store.get_store()
+    store.reload()
+    state = store.get_revlog_cursor() or {"cursor": None, "recent": set()}
+    ledger = store.get_boost_ledger()
+    scores = store.get_struggle_scores()
+    report = instrumentation.RunReport("cli")
+
+    col = Collection(path)
+    try:
+        workers = config.get("analysis_workers", 0)
+        if workers > 1:
+            snapshot = load_addon_module("core.snapshot")
+            result = snapshot.analyse_failed_reviews_parallel(
+                col, config, state, workers, report=report, ledger=ledger, scores=scores)
+        else:
+            result = pipeline.analyse_failed_reviews(
+                col, config, state, report=report, ledger=ledger, scores=scores)
+        if result["card_ids"] and not dry_run:
+            reschedule.reschedule_cards(
+                col, result["card_ids"], report,
+                config.get("boost_spread_days", 1), config.get("boost_daily_cap", 0)
+            )
+        if not dry_run:
+            boost_ledger.record_boosted(
+                ledger, result["card_ids"], col.sched.today, config.get("boost_cooldown_days", 0))
+            if "struggle_scores" in result:
+                struggle.settle_scores(
+                    result["struggle_scores"], result["card_ids"], config["struggle_threshold"],
+                    config.get("struggle_half_life_days", 14))
+            with report.stage("update_stats"):
+                stats = boost_stats.load_stats(store.get_boost_stats())
+                boost_stats.update_stats(col, stats, pipeline.get_tolerance_ms(config))
+                boost_stats.record_boosts(stats, result["card_ids"], result["failed_cards"])
+    except Exception as e:
+        report.finish("failed", str(e))
+        store.add_run_report(report.to_dict(), config.get("run_report_history", 20))
+        store.flush()
+        raise
+    finally:
+        col.close()
+
+    report.finish("completed")
+    if not dry_run:
+        store.set_revlog_cursor(result["cursor_state"])
+        store.set("last_boost_time", int(time.time()))
+        store.set_boost_stats(stats)
+        store.set_boost_ledger(ledger)
+        if "struggle_scores" in result:
+            store.set_struggle_scores(result["struggle_scores"])
+        store.add_run_report(report.to_dict(), config.get("run_report_history", 20))
+        store.flush()
+
+    summary = report.to_dict()
+    summary["failed_count"] = result["failed_count"]
+    summary["card_count"] = len(result["card_ids"])
+    return summary
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Boost the dependencies of failed sentence cards without Anki's GUI")
+    parser.add_argument("collections", nargs="+", help="Paths of .anki2 collection files")
+    parser.add_argument("--config", help="JSON file with settings overriding the add-on's configuration")
+    parser.add_argument("--state-dir", default=os.path.join(ADDON_DIR, "headless"),
+                        help="Directory for the per-collection state")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report the cards that would be boosted without changing anything")
+    parser.add_argument("--verbose", action="store_true", help="Print the per-stage timings of each run")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    formatter = load_addon_module("core.instrumentation").format_report
+    get_collection_state_dir = load_addon_module("core.state").get_collection_state_dir
+
+    errors = 0
+    for path in args.collections:
+        state_dir = get_collection_state_dir(args.state_dir, path)
+        try:
+            summary = boost_collection(path, config, state_dir, args.dry_run)
+        except Exception as e:
+            errors += 1
+            print(f"{path}: error: {e}", file=sys.stderr)
+            continue
+
+        action = "would boost" if args.dry_run else "boosted"
+        print(
+            f"{path}: {summary['failed_count']} failed sentences, "
+            f"{action} {summary['card_count']} cards ({summary['total_seconds']:.2f}s)"
+        )
+        if args.verbose:
+            print(formatter(summary))
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
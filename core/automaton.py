@@ -0,0 +1,658 @@
+"""
+Module for matching vocabulary headwords in sentence text.
+
+A persistent headword index maps the normalised headword field of every
+vocabulary note to its cards, and compiles all headwords into one
+Aho-Corasick automaton, so a sentence is scanned for every headword in
+time linear in its length.
+"""
+
+import html
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..utils import can_start_worker_processes, ids_to_sql
+from .graph import get_fingerprint
+from .state import atomic_write, get_state_path
+
+
+HEADWORD_INDEX_FILENAME = "headword_index.json"
+HEADWORD_INDEX_VERSION = 1
+
+# Tag marking vocabulary notes (compared case-insensitively, like Anki tags)
+VOCAB_TAG = "type:vocab"
+
+# Below this many headwords a process pool costs more than it saves
+MIN_PARALLEL_HEADWORDS = 5000
+
+_HTML_TAG_RE = re.compile(r"<[^>]*>")
+# Readings in Anki's furigana syntax, e.g. 漢字[かんじ]
+_READING_RE = re.compile(r"\[[^\]]*\]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def get_headword_index_path() -> str:
+    """Get the path of the persisted headword index in the state directory"""
+    return get_state_path(HEADWORD_INDEX_FILENAME)
+
+
+def normalise_text(text: str) -> str:
+    """
+    Normalise field content for matching.
+
+    HTML tags and furigana readings are removed, entities decoded, and
+    the text is NFKC-normalised, case-folded and has its whitespace
+    collapsed, so the same word matches however it was formatted.
+
+    Args:
+        text: Raw field content
+
+    Returns:
+        The normalised text
+    """
+    text = _HTML_TAG_RE.sub(" ", text)
+    text = html.unescape(text)
+    text = _READING_RE.sub("", text)
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def normalise_headwords(values: List[str], workers: int = 0) -> List[str]:
+    """
+    Normalise many headword fields, optionally in a process pool.
+
+    Pools are only used in headless runs (see can_start_worker_processes);
+    inside Anki the headwords are always normalised in this process.
+
+    Args:
+        values: Raw headword field contents
+        workers: Number of worker processes; 0 or 1 normalises in this process
+
+    Returns:
+        The normalised headwords, in the same order
+    """
+    if workers > 1 and len(values) >= MIN_PARALLEL_HEADWORDS and can_start_worker_processes():
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(values) // (workers * 4))
+                return list(pool.map(normalise_text, values, chunksize=chunksize))
+        except Exception as e:
+            # Process pools are not available in every Anki build
+            print(f"Normalising headwords in this process instead of a pool: {e}")
+    return [normalise_text(value) for value in values]
+
+
+def _is_word_char(char: str) -> bool:
+    """Check if a character joins words in scripts written with spaces"""
+    return char.isalnum() and ord(char) < 0x2E80
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over a set of words.
+
+    Words can be added and removed at any time; the failure links are
+    recomputed on the next search after a change.
+    """
+
+    def __init__(self):
+        # Node 0 is the root
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Word ending at each node, and the next node on the failure chain
+        # that ends a word
+        self.output: List[Optional[str]] = [None]
+        self.output_link: List[int] = [0]
+        self.stale = False
+
+    def add(self, word: str) -> None:
+        """
+        Add a word to the automaton.
+
+        Args:
+            word: The (normalised) word
+        """
+        node = 0
+        for char in word:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.output_link.append(0)
+            node = child
+        if self.output[node] != word:
+            self.output[node] = word
+            self.stale = True
+
+    def remove(self, word: str) -> None:
+        """
+        Stop matching a word. Its trie nodes are kept.
+
+        Args:
+            word: The (normalised) word
+        """
+        node = 0
+        for char in word:
+            node = self.goto[node].get(char)
+            if node is None:
+                return
+        if self.output[node] is not None:
+            self.output[node] = None
+            self.stale = True
+
+    def word_count(self) -> int:
+        """Get the number of words matched by the automaton"""
+        return sum(1 for word in self.output if word is not None)
+
+    def _link(self) -> None:
+        """Compute the failure and output links breadth-first"""
+        goto, fail, output, output_link = self.goto, self.fail, self.output, self.output_link
+        queue = []
+        for child in goto[0].values():
+            fail[child] = 0
+            output_link[child] = 0
+            queue.append(child)
+
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                output_link[child] = fail[child] if output[fail[child]] is not None else output_link[fail[child]]
+                queue.append(child)
+
+        self.stale = False
+
+    def search(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Find every occurrence of every word in a text.
+
+        Args:
+            text: The (normalised) text to scan
+
+        Yields:
+            (start position, word) for each occurrence
+        """
+        if self.stale:
+            self._link()
+
+        goto, fail, output, output_link = self.goto, self.fail, self.output, self.output_link
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            match = node if output[node] is not None else output_link[node]
+            while match:
+                word = output[match]
+                yield end - len(word) + 1, word
+                match = output_link[match]
+
+    def find_words(self, text: str) -> Set[str]:
+        """
+        Find the words occurring in a text as whole words.
+
+        Words starting or ending with a letter or digit of a script written
+        with spaces must not be glued to another letter or digit, so "cat"
+        is not found in "category". Words in other scripts (e.g. CJK) match
+        anywhere.
+
+        Args:
+            text: The (normalised) text to scan
+
+        Returns:
+            Set of words found
+        """
+        found = set()
+        for start, word in self.search(text):
+            if word in found:
+                continue
+            end = start + len(word)
+            if start > 0 and _is_word_char(word[0]) and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(word[-1]) and _is_word_char(text[end]):
+                continue
+            found.add(word)
+        return found
+
+    # Persistence
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the automaton as flat per-node lists"""
+        if self.stale:
+            self._link()
+        parents = [0] * len(self.goto)
+        chars = [""] * len(self.goto)
+        for node, children in enumerate(self.goto):
+            for char, child in children.items():
+                parents[child] = node
+                chars[child] = char
+        return {
+            "parents": parents,
+            "chars": chars,
+            "fail": self.fail,
+            "output_link": self.output_link,
+            "output": self.output,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Automaton":
+        """
+        Restore an automaton serialised with to_dict.
+
+        Args:
+            data: Dictionary produced by to_dict
+
+        Returns:
+            The restored automaton
+        """
+        automaton = cls()
+        automaton.goto = [{} for _ in data["parents"]]
+        for node, (parent, char) in enumerate(zip(data["parents"], data["chars"])):
+            if node:
+                automaton.goto[parent][char] = node
+        automaton.fail = data["fail"]
+        automaton.output_link = data["output_link"]
+        automaton.output = data["output"]
+        return automaton
+
+
+class HeadwordIndex:
+    """
+    Index from normalised headwords to vocabulary card ids.
+
+    Like the group index, it keeps the headword and cards of every
+    vocabulary note so single notes can be re-indexed when they change.
+    """
+
+    def __init__(self, vocab_field: str = ""):
+        self.vocab_field = vocab_field
+        self.words: Dict[str, Set[int]] = {}
+        self.notes: Dict[int, Tuple[str, Tuple[int, ...]]] = {}
+        self.automaton = Automaton()
+        # Collection state the index was last synchronised with
+        self.col_mod: Optional[int] = None
+        self.usn: Optional[int] = None
+        self.note_mod = 0
+        self.fingerprint: Optional[List[int]] = None
+        self.dirty = False
+
+    # Lookups
+
+    def find_cards(self, text: str) -> Set[int]:
+        """
+        Get the vocabulary cards of all headwords occurring in a text.
+
+        Args:
+            text: Normalised sentence text
+
+        Returns:
+            Set of vocabulary card IDs
+        """
+        card_ids: Set[int] = set()
+        for word in self.automaton.find_words(text):
+            card_ids.update(self.words.get(word, ()))
+        return card_ids
+
+    def card_count(self) -> int:
+        """Get the number of indexed vocabulary cards"""
+        return sum(len(card_ids) for _, card_ids in self.notes.values())
+
+    # Incremental updates
+
+    def set_note(self, note_id: int, headword: str, card_ids: Iterable[int]) -> None:
+        """
+        Index (or re-index) a vocabulary note.
+
+        Notes with an empty headword are kept (with no headword) so the
+        index can be checked against the collection's note count.
+
+        Args:
+            note_id: ID of the note
+            headword: The normalised headword
+            card_ids: IDs of the note's cards
+        """
+        self.remove_note(note_id)
+
+        cards = tuple(card_ids)
+        self.notes[note_id] = (headword, cards)
+        if headword:
+            if headword not in self.words:
+                self.words[headword] = set()
+                self.automaton.add(headword)
+            self.words[headword].update(cards)
+        self.dirty = True
+
+    def remove_note(self, note_id: int) -> None:
+        """
+        Remove a note from the index if it is present.
+
+        Args:
+            note_id: ID of the note
+        """
+        entry = self.notes.pop(note_id, None)
+        if entry is None:
+            return
+
+        headword, cards = entry
+        members = self.words.get(headword)
+        if members is not None:
+            members.difference_update(cards)
+            if not members:
+                del self.words[headword]
+                self.automaton.remove(headword)
+        self.dirty = True
+
+    # Building and staleness
+
+    def rebuild(self, col, workers: int = 0) -> None:
+        """
+        Rebuild the whole index from the vocabulary notes.
+
+        Args:
+            col: The Anki collection
+            workers: Number of processes normalising the headwords
+        """
+        self.words = {}
+        self.notes = {}
+        self.automaton = Automaton()
+        self._index_rows(col, col.db.all(f"""
+            SELECT n.id, n.mid, n.flds, c.id
+            FROM notes n
+            JOIN cards c ON c.nid = n.id
+            WHERE n.tags LIKE '% {VOCAB_TAG} %'
+        """), workers)
+        self._mark_synchronised(col)
+
+    def refresh(self, col, workers: int = 0) -> None:
+        """
+        Bring the index up to date with the collection.
+
+        Nothing is queried while the collection's mod time and USN are
+        unchanged, and the notes are only scanned if the collection's note
+        and card fingerprint changed too (reviews change neither). Notes
+        modified since the last refresh are then re-indexed, and the index
+        is rebuilt if its number of vocabulary notes or cards no longer
+        matches the collection.
+
+        Args:
+            col: The Anki collection
+            workers: Number of processes normalising the headwords on a rebuild
+        """
+        if self.col_mod is None:
+            self.rebuild(col, workers)
+            return
+
+        if self.col_mod == col.mod and self.usn == col.usn():
+            return
+
+        fingerprint = get_fingerprint(col)
+        if fingerprint == self.fingerprint:
+            # Only reviews moved the collection on. The index is unchanged,
+            # so it is not saved again; after a restart the fingerprint is
+            # compared once more.
+            self.col_mod = col.mod
+            self.usn = col.usn()
+            return
+
+        # Note mod times have a one second resolution, so notes from the
+        # last refresh's second are re-indexed too
+        changed_ids = col.db.list("SELECT id FROM notes WHERE mod >= ?", self.note_mod)
+        if changed_ids:
+            for note_id in changed_ids:
+                self.remove_note(note_id)
+            self._index_rows(col, col.db.all(f"""
+                SELECT n.id, n.mid, n.flds, c.id
+                FROM notes n
+                JOIN cards c ON c.nid = n.id
+                WHERE n.id IN {ids_to_sql(changed_ids)}
+                    AND n.tags LIKE '% {VOCAB_TAG} %'
+            """))
+
+        note_count, card_count = col.db.first(f"""
+            SELECT count(DISTINCT n.id), count(c.id)
+            FROM notes n
+            JOIN cards c ON c.nid = n.id
+            WHERE n.tags LIKE '% {VOCAB_TAG} %'
+        """)
+        if note_count != len(self.notes) or card_count != self.card_count():
+            self.rebuild(col, workers)
+            return
+
+        self._mark_synchronised(col)
+
+    def _index_rows(self, col, rows: Iterable[Tuple[int, int, str, int]], workers: int = 0) -> None:
+        """Index (note id, notetype id, fields, card id) rows grouped by note"""
+        note_cards: Dict[int, List[int]] = {}
+        note_values: Dict[int, str] = {}
+        field_indexes: Dict[int, int] = {}
+        for note_id, mid, flds, card_id in rows:
+            if note_id not in note_values:
+                if mid not in field_indexes:
+                    field_indexes[mid] = get_field_index(col, mid, self.vocab_field)
+                fields = flds.split("\x1f")
+                index = field_indexes[mid]
+                # Notetypes without the field use their first field
+                note_values[note_id] = fields[index] if index is not None and index < len(fields) else fields[0]
+                note_cards[note_id] = []
+            note_cards[note_id].append(card_id)
+
+        note_ids = list(note_values)
+        headwords = normalise_headwords([note_values[note_id] for note_id in note_ids], workers)
+        for note_id, headword in zip(note_ids, headwords):
+            self.set_note(note_id, headword, note_cards[note_id])
+
+    def _mark_synchronised(self, col) -> None:
+        """Record the collection state the index now reflects"""
+        self.col_mod = col.mod
+        self.usn = col.usn()
+        self.fingerprint = get_fingerprint(col)
+        self.note_mod = self.fingerprint[0]
+        self.dirty = True
+
+    # Persistence
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the index to a JSON-compatible dictionary"""
+        return {
+            "version": HEADWORD_INDEX_VERSION,
+            "vocab_field": self.vocab_field,
+            "col_mod": self.col_mod,
+            "usn": self.usn,
+            "note_mod": self.note_mod,
+            "fingerprint": self.fingerprint,
+            "notes": {
+                str(note_id): [headword, list(cards)]
+                for note_id, (headword, cards) in self.notes.items()
+            },
+            "automaton": self.automaton.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HeadwordIndex":
+        """
+        Restore an index serialised with to_dict.
+
+        Args:
+            data: Dictionary produced by to_dict
+
+        Returns:
+            The restored index, or an empty index if the format is unknown
+        """
+        if data.get("version") != HEADWORD_INDEX_VERSION:
+            return cls()
+
+        index = cls(data["vocab_field"])
+        for note_id, (headword, cards) in data["notes"].items():
+            cards = tuple(cards)
+            index.notes[int(note_id)] = (headword, cards)
+            if headword:
+                index.words.setdefault(headword, set()).update(cards)
+        index.automaton = Automaton.from_dict(data["automaton"])
+
+        index.col_mod = data["col_mod"]
+        index.usn = data["usn"]
+        index.note_mod = data["note_mod"]
+        index.fingerprint = data.get("fingerprint")
+        return index
+
+
+def get_field_index(col, mid: int, field_name: str) -> Optional[int]:
+    """
+    Get the position of a field in a notetype, ignoring case.
+
+    Args:
+        col: The Anki collection
+        mid: ID of the notetype
+        field_name: Name of the field
+
+    Returns:
+        The field's position, or None if the notetype has no such field
+    """
+    notetype = col.models.get(mid)
+    if not notetype:
+        return None
+    for field in notetype["flds"]:
+        if field["name"].lower() == field_name.lower():
+            return field["ord"]
+    return None
+
+
+# Module-level index shared by the add-on
+_index: Optional[HeadwordIndex] = None
+_index_path: Optional[str] = None
+_lock = threading.RLock()
+
+
+def load_headword_index() -> HeadwordIndex:
+    """
+    Load the persisted headword index from disk.
+
+    Returns:
+        The loaded index, or an empty index if none could be read
+    """
+    path = get_headword_index_path()
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return HeadwordIndex.from_dict(json.load(f))
+        except (json.JSONDecodeError, IOError, KeyError, TypeError, ValueError):
+            pass
+    return HeadwordIndex()
+
+
+def save_headword_index(index: HeadwordIndex) -> None:
+    """
+    Persist the index to disk if it has changed since it was last saved.
+
+    Args:
+        index: The index to save
+    """
+    if not index.dirty:
+        return
+    try:
+        with atomic_write(get_headword_index_path()) as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False)
+        index.dirty = False
+    except IOError as e:
+        print(f"Error saving headword index: {e}")
+
+
+def get_headword_index(col, vocab_field: str, workers: int = 0) -> Optional[HeadwordIndex]:
+    """
+    Get the up-to-date headword index for a collection.
+
+    The index is loaded from disk on first use, refreshed against the
+    collection, and saved again if the refresh changed it. A different
+    headword field starts a new index.
+
+    Args:
+        col: The Anki collection
+        vocab_field: Name of the vocabulary notes' headword field
+        workers: Number of processes normalising the headwords on a rebuild
+
+    Returns:
+        The headword index, or None if no collection is open
+    """
+    global _index, _index_path
+
+    if not col:
+        return None
+
+    with _lock:
+        if _index is None or _index_path != get_headword_index_path():
+            _index = load_headword_index()
+            _index_path = get_headword_index_path()
+        if _index.vocab_field != vocab_field:
+            _index = HeadwordIndex(vocab_field)
+
+        _index.refresh(col, workers)
+        save_headword_index(_index)
+        return _index
+
+
+def lookup_headword_cards(
+        col,
+        texts: Iterable[str],
+        vocab_field: str,
+        workers: int = 0
+) -> Optional[Set[int]]:
+    """
+    Find the vocabulary cards of all headwords occurring in some texts.
+
+    The scan holds the index lock, as the automaton relinks itself on the
+    first search after a change.
+
+    Args:
+        col: The Anki collection
+        texts: Raw sentence field contents
+        vocab_field: Name of the vocabulary notes' headword field
+        workers: Number of processes normalising the headwords on a rebuild
+
+    Returns:
+        Set of vocabulary card IDs, or None if no collection is open
+    """
+    with _lock:
+        index = get_headword_index(col, vocab_field, workers)
+        if index is None:
+            return None
+        card_ids: Set[int] = set()
+        for text in texts:
+            card_ids.update(index.find_cards(normalise_text(text)))
+        return card_ids
+
+
+def map_headword_cards(
+        col,
+        texts_by_key: Dict[int, str],
+        vocab_field: str,
+        workers: int = 0
+) -> Optional[Dict[int, Set[int]]]:
+    """
+    Find the vocabulary cards of the headwords occurring in each of several texts.
+
+    Args:
+        col: The Anki collection
+        texts_by_key: Raw sentence field content per key (e.g. per sentence card ID)
+        vocab_field: Name of the vocabulary notes' headword field
+        workers: Number of processes normalising the headwords on a rebuild
+
+    Returns:
+        Set of vocabulary card IDs per key, or None if no collection is open
+    """
+    with _lock:
+        index = get_headword_index(col, vocab_field, workers)
+        if index is None:
+            return None
+        return {key: index.find_cards(normalise_text(text)) for key, text in texts_by_key.items()}
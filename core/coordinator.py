@@ -0,0 +1,263 @@
+"""
+Module for coordinating boost runs.
+
+Runs can be requested by several triggers (the menu action, the end of a
+review session, Sync & Boost) that may fire while a run is in progress.
+Only one run happens at a time: requests arriving during a run are
+merged into a single follow-up run, started once the current run has
+finished. Requests may ask to wait for a short debounce window first, so
+a burst of automatic triggers starts one run.
+
+Smaller jobs that also read the review log and write the state (the
+real-time batches) are submitted as tasks. They never overlap with a run
+or with each other, and queued tasks start before the queued run, so the
+run sees the reviews they processed.
+
+Each run also holds the lock file of the state directory, so other Anki
+processes and the command-line runner sharing that directory never run
+at the same time. While another process holds the lock, the run is
+retried a few times before it is given up; queued tasks are then
+dropped, and told so, leaving their work to the next run.
+"""
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .state import LOCK_FILENAME, FileLock, get_state_path, get_store
+
+
+# Delay between attempts to take a lock held by another process
+LOCK_RETRY_MS = 5000
+LOCK_ATTEMPTS = 12
+
+
+class RunRequest:
+    """Requests merged into one run"""
+
+    def __init__(self):
+        self.triggers: List[str] = []
+        self.callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self.min_usn: Optional[int] = None
+
+    def add(
+            self,
+            trigger: str,
+            on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+            min_usn: Optional[int] = None
+    ) -> None:
+        """
+        Merge a request.
+
+        Args:
+            trigger: What requested the run ("manual", "auto" or "sync")
+            on_done: Called with the analysis result after a successful run
+            min_usn: Review log USN taken before a sync; the lowest one is
+                kept, so the run covers the reviews of every merged sync
+        """
+        if trigger not in self.triggers:
+            self.triggers.append(trigger)
+        if on_done is not None:
+            self.callbacks.append(on_done)
+        if min_usn is not None:
+            self.min_usn = min_usn if self.min_usn is None else min(self.min_usn, min_usn)
+
+    @property
+    def trigger(self) -> str:
+        """The merged triggers, for the run report (e.g. "auto+manual")"""
+        return "+".join(self.triggers)
+
+    def notify(self, result: Dict[str, Any]) -> None:
+        """Call the callbacks of all merged requests"""
+        for callback in self.callbacks:
+            callback(result)
+
+
+class RunCoordinator:
+    """
+    Single-flight coordination of boost runs.
+
+    Args:
+        start_run: Starts a run for a request; must call the given
+            function exactly once when the run has finished, however it ended
+        schedule: Calls a function after a delay in milliseconds on the
+            thread requests are made from (e.g. QTimer.singleShot)
+        on_busy: Called with a request given up because another process
+            kept the lock
+    """
+
+    def __init__(
+            self,
+            start_run: Callable[[RunRequest, Callable[[], None]], None],
+            schedule: Callable[[int, Callable[[], None]], None],
+            on_busy: Optional[Callable[[RunRequest], None]] = None
+    ):
+        self.start_run = start_run
+        self.schedule = schedule
+        self.on_busy = on_busy
+        self.running = False
+        self.queued: Optional[RunRequest] = None
+        self.tasks: Deque[Tuple[Callable[[Callable[[], None]], None], Optional[Callable[[], None]]]] = deque()
+        self._lock: Optional[FileLock] = None
+        self._lock_attempts = 0
+        # Incremented whenever the start is rescheduled, so earlier timers
+        # do nothing when they fire
+        self._generation = 0
+        # A timer will start the queued run
+        self._start_due = False
+        # A timer will start the oldest queued task
+        self._task_start_due = False
+
+    def request(
+            self,
+            trigger: str,
+            on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+            min_usn: Optional[int] = None,
+            delay_ms: int = 0
+    ) -> bool:
+        """
+        Request a run.
+
+        Args:
+            trigger: What requested the run ("manual", "auto" or "sync")
+            on_done: Called with the analysis result after a successful run
+            min_usn: Review log USN taken before a sync, if any
+            delay_ms: Debounce window; every request restarts it, and a
+                request without delay starts the run at once
+
+        Returns:
+            False if a run is in progress, so the request will be handled
+            by the follow-up run
+        """
+        if self.queued is None:
+            self.queued = RunRequest()
+        self.queued.add(trigger, on_done, min_usn)
+        if self.running:
+            return False
+        self._schedule_start(delay_ms)
+        return True
+
+    def submit_task(
+            self,
+            start_task: Callable[[Callable[[], None]], None],
+            on_dropped: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Run a task once no run or earlier task is in progress.
+
+        Args:
+            start_task: Starts the task; must call the given function
+                exactly once when the task has finished, however it ended
+            on_dropped: Called instead of start_task if the task is
+                dropped because another process kept the lock
+        """
+        self.tasks.append((start_task, on_dropped))
+        if not self.running:
+            self._schedule_task_start(0)
+
+    def _schedule_start(self, delay_ms: int) -> None:
+        self._generation += 1
+        self._start_due = True
+        generation = self._generation
+        self.schedule(delay_ms, lambda: self._start(generation))
+
+    def _schedule_task_start(self, delay_ms: int) -> None:
+        # Tasks submitted while a start is pending wait for it
+        if self._task_start_due:
+            return
+        self._task_start_due = True
+        self.schedule(delay_ms, self._start_task)
+
+    def _take_lock(self) -> bool:
+        """Take the state directory's lock for a run or task, without waiting"""
+        lock = FileLock(get_state_path(LOCK_FILENAME))
+        if not lock.acquire():
+            return False
+        self._lock_attempts = 0
+        self._lock = lock
+        self.running = True
+        # Another process may have changed the state since it was read
+        get_store().reload()
+        return True
+
+    def _retry_lock(self) -> bool:
+        """Count a failed attempt to take the lock; False once they are used up"""
+        self._lock_attempts += 1
+        if self._lock_attempts < LOCK_ATTEMPTS:
+            return True
+        self._lock_attempts = 0
+        return False
+
+    def _start_task(self) -> None:
+        """Start the oldest queued task"""
+        self._task_start_due = False
+        if self.running or not self.tasks:
+            return
+
+        if not self._take_lock():
+            if self._retry_lock():
+                self._schedule_task_start(LOCK_RETRY_MS)
+                return
+            # Tasks leave their work to the next run when the lock stays taken
+            dropped = list(self.tasks)
+            self.tasks.clear()
+            for _, on_dropped in dropped:
+                if on_dropped is not None:
+                    on_dropped()
+            if self.queued is not None and not self._start_due:
+                self._schedule_start(0)
+            return
+
+        start_task, _ = self.tasks.popleft()
+        try:
+            start_task(self._finished)
+        except Exception:
+            self._finished()
+            raise
+
+    def _start(self, generation: int) -> None:
+        """Start the queued run, unless the start was rescheduled meanwhile"""
+        if generation != self._generation:
+            return
+        self._start_due = False
+        if self.running or self.queued is None:
+            return
+        # Queued tasks go first; the run follows them
+        if self.tasks:
+            if not self._task_start_due:
+                self._start_task()
+            return
+
+        if not self._take_lock():
+            if self._retry_lock():
+                self._schedule_start(LOCK_RETRY_MS)
+                return
+            request = self.queued
+            self.queued = None
+            if self.on_busy:
+                self.on_busy(request)
+            return
+
+        request = self.queued
+        self.queued = None
+        try:
+            self.start_run(request, self._finished)
+        except Exception:
+            self._finished()
+            raise
+
+    def _finished(self) -> None:
+        """
+        Release the lock and start the next task or the follow-up run, if
+        any was requested (a run still in its debounce window starts when
+        its timer fires).
+        """
+        if not self.running:
+            return
+        self.running = False
+        if self._lock is not None:
+            self._lock.release()
+            self._lock = None
+        if self.tasks:
+            self._schedule_task_start(0)
+        elif self.queued is not None and not self._start_due:
+            self._schedule_start(0)
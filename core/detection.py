@@ -2,8 +2,10 @@
 Module for detecting dependencies between sentence and vocabulary cards.
 """
 
-from typing import List, Set
-from aqt import mw
+from typing import Dict, Iterable, List, Set
+
+from ..utils import ids_to_sql
+from .automaton import get_field_index, lookup_headword_cards, map_headword_cards
 
 
 def extract_group_tags(tags: List[str]) -> Set[str]:
@@ -27,76 +29,201 @@ def extract_group_tags(tags: List[str]) -> Set[str]:
     return group_tags
 
 
-def find_vocabulary_dependencies(
-        card_id: int, 
-        maturity_threshold: int = 21
-) -> List[int]:
+def collect_vocabulary_dependencies_batch(col, card_ids: Iterable[int]) -> Set[int]:
     """
-    Find mature vocabulary cards that are dependencies of the given card.
+    Find the vocabulary dependencies of a batch of sentence cards by their
+    group tags, whatever their maturity.
     
     Args:
-        card_id: ID of the sentence card to find dependencies for
-        maturity_threshold: Minimum days since creation to be considered mature
+        col: The Anki collection
+        card_ids: IDs of the sentence cards
         
     Returns:
-        List of card IDs for vocabulary dependencies
+        Set of vocabulary card IDs
     """
-    if not mw or not mw.col:
-        return []
+    if not col:
+        return set()
     
-    # Get the sentence card
-    sentence_card = mw.col.get_card(card_id)
-    if not sentence_card:
-        return []
+    card_ids = set(card_ids)
+    if not card_ids:
+        return set()
     
-    # Get the note
-    sentence_note = sentence_card.note()
-    
-    # Extract group tags
-    group_tags = extract_group_tags(sentence_note.tags)
+    # Collect the group tags of the failed sentences' notes
+    query = f"""
+    SELECT DISTINCT n.tags
+    FROM cards c
+    JOIN notes n ON c.nid = n.id
+    WHERE c.id IN {ids_to_sql(card_ids)}
+    """
+    group_tags: Set[str] = set()
+    for tags in col.db.list(query):
+        group_tags.update(extract_group_tags(tags.split()))
     if not group_tags:
-        return []
+        return set()
     
-    # Build a query to find vocabulary cards with matching group tags
-    group_conditions = []
-    for group in group_tags:
-        tag_name = f"group:s{group}"
-        group_conditions.append(f"n.tags LIKE '%{tag_name}%'")
+    # Imported here because the index module depends on this one
+    from .index import lookup_group_cards
+    return lookup_group_cards(col, group_tags) or set()
+
+
+def collect_vocabulary_dependencies_by_fields(
+        col,
+        card_ids: Iterable[int],
+        sentence_field: str = "Sentence",
+        vocab_field: str = "Word",
+        workers: int = 0
+) -> Set[int]:
+    """
+    Find the vocabulary dependencies of a batch of sentence cards by their
+    text, whatever their maturity.
     
-    group_clause = " OR ".join(group_conditions)
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the sentence cards
+        sentence_field: Name of the sentence notes' text field
+        vocab_field: Name of the vocabulary notes' headword field
+        workers: Number of processes normalising headwords when the
+            automaton is first built
+        
+    Returns:
+        Set of vocabulary card IDs
+    """
+    if not col:
+        return set()
+    
+    card_ids = set(card_ids)
+    if not card_ids:
+        return set()
+    
+    # Cards of the same note share its text
+    texts = set(_read_sentence_texts(col, card_ids, sentence_field).values())
+    return lookup_headword_cards(col, texts, vocab_field, workers) or set()
+
+
+def map_vocabulary_dependencies_batch(col, card_ids: Iterable[int]) -> Dict[int, Set[int]]:
+    """
+    Find the vocabulary dependencies of each sentence card of a batch by
+    its group tags, whatever their maturity.
+    
+    The tags of all the sentences are read with one query and their
+    groups looked up in the group index.
+    
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the sentence cards
+        
+    Returns:
+        Vocabulary card IDs per sentence card
+    """
+    card_ids = set(card_ids)
+    if not col or not card_ids:
+        return {}
     
-    # Query for vocabulary cards with matching group tags
     query = f"""
-    SELECT c.id
+    SELECT c.id, n.tags
     FROM cards c
     JOIN notes n ON c.nid = n.id
-    WHERE 
-        n.tags LIKE '%type:vocab%'
-        AND ({group_clause})
+    WHERE c.id IN {ids_to_sql(card_ids)}
     """
+    groups = {card_id: extract_group_tags(tags.split()) for card_id, tags in col.db.all(query)}
     
-    result = mw.col.db.list(query)
+    # Imported here because the index module depends on this one
+    from .index import map_group_cards
+    return map_group_cards(col, groups) or {}
+
+
+def map_vocabulary_dependencies_by_fields(
+        col,
+        card_ids: Iterable[int],
+        sentence_field: str = "Sentence",
+        vocab_field: str = "Word",
+        workers: int = 0
+) -> Dict[int, Set[int]]:
+    """
+    Find the vocabulary dependencies of each sentence card of a batch by
+    its text, whatever their maturity.
     
-    # Filter for mature cards
-    mature_vocab_cards = []
-    for card_id in result:
-        card = mw.col.get_card(card_id)
-        if card and is_card_mature(card, maturity_threshold):
-            mature_vocab_cards.append(card_id)
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the sentence cards
+        sentence_field: Name of the sentence notes' text field
+        vocab_field: Name of the vocabulary notes' headword field
+        workers: Number of processes normalising headwords when the
+            automaton is first built
+        
+    Returns:
+        Vocabulary card IDs per sentence card
+    """
+    card_ids = set(card_ids)
+    if not col or not card_ids:
+        return {}
+    
+    texts = _read_sentence_texts(col, card_ids, sentence_field)
+    return map_headword_cards(col, texts, vocab_field, workers) or {}
+
+
+def _read_sentence_texts(col, card_ids: Set[int], sentence_field: str) -> Dict[int, str]:
+    """
+    Read the sentence text of each card with one query.
     
-    return mature_vocab_cards
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the sentence cards
+        sentence_field: Name of the sentence notes' text field
+        
+    Returns:
+        Raw text of the sentence field per card ID
+    """
+    query = f"""
+    SELECT c.id, n.mid, n.flds
+    FROM cards c
+    JOIN notes n ON c.nid = n.id
+    WHERE c.id IN {ids_to_sql(card_ids)}
+    """
+    field_indexes = {}
+    texts = {}
+    for card_id, mid, flds in col.db.all(query):
+        if mid not in field_indexes:
+            field_indexes[mid] = get_field_index(col, mid, sentence_field)
+        fields = flds.split("\x1f")
+        field_index = field_indexes[mid]
+        # Notetypes without the field are scanned in full
+        if field_index is not None and field_index < len(fields):
+            texts[card_id] = fields[field_index]
+        else:
+            texts[card_id] = " ".join(fields)
+    return texts
 
 
-def is_card_mature(card, threshold: int) -> bool:
+def filter_mature_cards(
+        col,
+        candidates: Set[int],
+        maturity_threshold: int,
+        report=None
+) -> List[int]:
     """
-    Check if a card is considered mature based on its interval.
+    Keep the mature cards among candidate dependencies.
     
     Args:
-        card: Anki card object
-        threshold: Minimum days to be considered mature
+        col: The Anki collection
+        candidates: IDs of the candidate cards
+        maturity_threshold: Minimum interval (days) to be considered mature
+        report: Optional RunReport counting the candidates evaluated
         
     Returns:
-        True if the card is mature, False otherwise
+        List of mature card IDs
+    """
+    if report is not None:
+        report.add("candidates_evaluated", len(candidates))
+    if not candidates:
+        return []
+    
+    # Filter for mature cards with a single primary key lookup per candidate
+    query = f"""
+    SELECT id
+    FROM cards
+    WHERE id IN {ids_to_sql(candidates)}
+        AND ivl >= ?
     """
-    # Card is mature if its interval is at least the threshold
-    return card.ivl >= threshold 
\ No newline at end of file
+    
+    return col.db.list(query, maturity_threshold)
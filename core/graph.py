@@ -0,0 +1,416 @@
+"""
+Module for multi-hop dependency detection over a compact dependency graph.
+
+Notes are arranged in levels by their `type:` tag, e.g. sentence -> vocab
+-> character -> component. A card depends on the cards of the next level
+that share one of its `group:` tags. The edges between cards are stored
+in CSR form (an offsets array and a flat neighbour array), persisted as
+raw arrays so the graph loads quickly at startup.
+"""
+
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .state import atomic_write, get_state_path
+
+
+GRAPH_FILENAME = "dependency_graph.bin"
+GRAPH_VERSION = 1
+
+DEFAULT_LEVELS = ["sentence", "vocab"]
+
+
+def get_graph_path() -> str:
+    """Get the path of the persisted graph file in the state directory"""
+    return get_state_path(GRAPH_FILENAME)
+
+
+def get_note_level(tags: List[str], levels: List[str]) -> Optional[int]:
+    """
+    Get the dependency level of a note from its `type:` tag.
+
+    Args:
+        tags: The note's tags
+        levels: Level names from the top (e.g. ["sentence", "vocab", "character"])
+
+    Returns:
+        Index of the note's level in `levels`, or None if it has none
+    """
+    type_tags = {tag.lower() for tag in tags if tag.lower().startswith("type:")}
+    for level, name in enumerate(levels):
+        if f"type:{name.lower()}" in type_tags:
+            return level
+    return None
+
+
+def extract_link_groups(tags: List[str]) -> Set[str]:
+    """
+    Extract the values of all `group:` tags (e.g. {'s1', 'w5'}).
+
+    Args:
+        tags: List of tags
+
+    Returns:
+        Set of group values
+    """
+    return {tag[6:] for tag in tags if tag.startswith("group:")}
+
+
+class DependencyGraph:
+    """
+    Card dependency graph in compressed sparse row form.
+
+    `nodes` holds the sorted card IDs; the dependencies of the card at
+    position i are `indices[indptr[i]:indptr[i + 1]]`, as positions in
+    `nodes`.
+    """
+
+    def __init__(
+            self,
+            nodes: array = None,
+            indptr: array = None,
+            indices: array = None,
+            fingerprint: Optional[List[int]] = None,
+            levels: Optional[List[str]] = None
+    ):
+        self.nodes = nodes if nodes is not None else array("q")
+        self.indptr = indptr if indptr is not None else array("q", [0])
+        self.indices = indices if indices is not None else array("l")
+        self.fingerprint = fingerprint
+        self.levels = levels or list(DEFAULT_LEVELS)
+
+    def position(self, card_id: int) -> Optional[int]:
+        """Get the position of a card in `nodes`, or None if it has no edges"""
+        pos = bisect_left(self.nodes, card_id)
+        if pos < len(self.nodes) and self.nodes[pos] == card_id:
+            return pos
+        return None
+
+    def edge_count(self) -> int:
+        """Get the number of dependency edges"""
+        return len(self.indices)
+
+    def collect_dependencies(self, card_ids: Iterable[int], max_depth: int) -> Set[int]:
+        """
+        Collect the dependencies of several cards up to a number of hops.
+
+        A single breadth-first search is run from all the cards at once,
+        so a dependency shared by several cards (or reachable along
+        several paths) is expanded only once per run.
+
+        Args:
+            card_ids: IDs of the cards to start from
+            max_depth: Maximum number of hops to follow
+
+        Returns:
+            IDs of all cards reached, excluding the starting cards
+        """
+        frontier = []
+        visited: Set[int] = set()
+        for card_id in card_ids:
+            pos = self.position(card_id)
+            if pos is not None and pos not in visited:
+                visited.add(pos)
+                frontier.append(pos)
+        sources = set(visited)
+
+        indptr = self.indptr
+        indices = self.indices
+        for _ in range(max_depth):
+            next_frontier = []
+            for pos in frontier:
+                for neighbour in indices[indptr[pos]:indptr[pos + 1]]:
+                    if neighbour not in visited:
+                        visited.add(neighbour)
+                        next_frontier.append(neighbour)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        return {self.nodes[pos] for pos in visited - sources}
+
+    def map_dependencies(self, card_ids: Iterable[int], max_depth: int) -> Dict[int, Set[int]]:
+        """
+        Collect the dependencies of each of several cards up to a number of hops.
+
+        Edges only lead to the next level, so the cards reachable from a
+        card are its neighbours and the cards reachable from them with one
+        hop less. Each card's reachable set is computed once per depth and
+        shared by the whole batch, so overlapping dependency chains are
+        only walked once.
+
+        Args:
+            card_ids: IDs of the cards to start from
+            max_depth: Maximum number of hops to follow
+
+        Returns:
+            IDs of the cards reached from each card
+        """
+        indptr = self.indptr
+        indices = self.indices
+        reachable: Dict[Tuple[int, int], FrozenSet[int]] = {}
+
+        def reach(pos: int, depth: int) -> FrozenSet[int]:
+            found = reachable.get((pos, depth))
+            if found is None:
+                neighbours = indices[indptr[pos]:indptr[pos + 1]]
+                positions = set(neighbours)
+                if depth > 1:
+                    for neighbour in neighbours:
+                        positions.update(reach(neighbour, depth - 1))
+                found = reachable[(pos, depth)] = frozenset(positions)
+            return found
+
+        deps: Dict[int, Set[int]] = {}
+        for card_id in card_ids:
+            pos = self.position(card_id)
+            if pos is None or max_depth < 1:
+                deps[card_id] = set()
+            else:
+                deps[card_id] = {self.nodes[found] for found in reach(pos, max_depth)}
+        return deps
+
+    # Building
+
+    @classmethod
+    def build(cls, col, levels: List[str]) -> "DependencyGraph":
+        """
+        Build the graph from the collection's tags with a single query.
+
+        Args:
+            col: The Anki collection
+            levels: Level names from the top
+
+        Returns:
+            The built graph
+        """
+        rows = col.db.all("""
+            SELECT n.id, n.tags, c.id
+            FROM notes n
+            JOIN cards c ON c.nid = n.id
+            WHERE n.tags LIKE '% type:%' AND n.tags LIKE '% group:%'
+        """)
+
+        # Cards of each level, and per level the cards of every group
+        level_cards: Dict[int, List[Tuple[int, Set[str]]]] = {}
+        group_members: Dict[int, Dict[str, List[int]]] = {}
+        note_info: Dict[int, Tuple[Optional[int], Set[str]]] = {}
+        for note_id, tags, card_id in rows:
+            if note_id not in note_info:
+                tag_list = tags.split()
+                note_info[note_id] = (get_note_level(tag_list, levels), extract_link_groups(tag_list))
+            level, groups = note_info[note_id]
+            if level is None or not groups:
+                continue
+            level_cards.setdefault(level, []).append((card_id, groups))
+            members = group_members.setdefault(level, {})
+            for group in groups:
+                members.setdefault(group, []).append(card_id)
+
+        # Each card depends on the next level's cards sharing a group
+        adjacency: Dict[int, Set[int]] = {}
+        for level, cards in level_cards.items():
+            lower = group_members.get(level + 1)
+            if not lower:
+                continue
+            for card_id, groups in cards:
+                deps = set()
+                for group in groups:
+                    deps.update(lower.get(group, ()))
+                if deps:
+                    adjacency.setdefault(card_id, set()).update(deps)
+
+        node_set = set(adjacency)
+        for deps in adjacency.values():
+            node_set.update(deps)
+        nodes = array("q", sorted(node_set))
+        positions = {card_id: pos for pos, card_id in enumerate(nodes)}
+
+        indptr = array("q", [0])
+        indices = array("l")
+        for card_id in nodes:
+            deps = adjacency.get(card_id)
+            if deps:
+                indices.extend(sorted(positions[dep] for dep in deps))
+            indptr.append(len(indices))
+
+        return cls(nodes, indptr, indices, get_fingerprint(col), list(levels))
+
+    # Persistence
+
+    def save(self, path: str) -> None:
+        """
+        Write the graph as a JSON header line followed by the raw arrays.
+
+        Args:
+            path: Path of the graph file
+        """
+        header = {
+            "version": GRAPH_VERSION,
+            "fingerprint": self.fingerprint,
+            "levels": self.levels,
+            "lengths": [len(self.nodes), len(self.indptr), len(self.indices)],
+            "typecodes": [self.nodes.typecode, self.indptr.typecode, self.indices.typecode],
+            "itemsizes": [self.nodes.itemsize, self.indptr.itemsize, self.indices.itemsize],
+        }
+        with atomic_write(path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            self.nodes.tofile(f)
+            self.indptr.tofile(f)
+            self.indices.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DependencyGraph"]:
+        """
+        Read a graph written by save.
+
+        Args:
+            path: Path of the graph file
+
+        Returns:
+            The loaded graph, or None if the file is missing or unusable
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline().decode("utf-8"))
+                if header.get("version") != GRAPH_VERSION:
+                    return None
+                arrays = []
+                for typecode, itemsize, length in zip(
+                        header["typecodes"], header["itemsizes"], header["lengths"]):
+                    values = array(typecode)
+                    # Files from a platform with other C type sizes are rebuilt
+                    if values.itemsize != itemsize:
+                        return None
+                    values.fromfile(f, length)
+                    arrays.append(values)
+        except (IOError, EOFError, ValueError, KeyError):
+            return None
+
+        return cls(*arrays, fingerprint=header["fingerprint"], levels=header["levels"])
+
+
+def get_fingerprint(col) -> List[int]:
+    """
+    Get a cheap fingerprint of the collection's notes and cards.
+
+    Tag edits update note mod times, and deleted or added notes and cards
+    change the counts, so the graph is rebuilt whenever this changes.
+
+    Args:
+        col: The Anki collection
+
+    Returns:
+        [max note mod, note count, card count]
+    """
+    max_mod, note_count = col.db.first("SELECT max(mod), count() FROM notes")
+    card_count = col.db.scalar("SELECT count() FROM cards")
+    return [max_mod or 0, note_count, card_count]
+
+
+# Module-level graph shared by the add-on
+_graph: Optional[DependencyGraph] = None
+_graph_path: Optional[str] = None
+_graph_col_state: Optional[Tuple[int, int]] = None
+_lock = threading.Lock()
+
+
+def get_dependency_graph(col, levels: List[str]) -> Optional[DependencyGraph]:
+    """
+    Get the up-to-date dependency graph for a collection.
+
+    The graph is loaded from disk on first use and rebuilt (and saved) if
+    the collection's notes or the configured levels changed. While the
+    collection's mod time and USN stay the same nothing is queried.
+
+    Args:
+        col: The Anki collection
+        levels: Level names from the top
+
+    Returns:
+        The dependency graph, or None if no collection is open
+    """
+    global _graph, _graph_path, _graph_col_state
+
+    if not col:
+        return None
+
+    with _lock:
+        if _graph_path != get_graph_path():
+            _graph = None
+            _graph_path = get_graph_path()
+
+        col_state = (col.mod, col.usn())
+        if _graph is not None and _graph_col_state == col_state and _graph.levels == levels:
+            return _graph
+
+        if _graph is None:
+            _graph = DependencyGraph.load(_graph_path)
+
+        if _graph is None or _graph.levels != levels or _graph.fingerprint != get_fingerprint(col):
+            _graph = DependencyGraph.build(col, levels)
+            try:
+                _graph.save(_graph_path)
+            except IOError as e:
+                print(f"Error saving dependency graph: {e}")
+
+        _graph_col_state = col_state
+        return _graph
+
+
+def collect_multi_hop_dependencies(
+        col,
+        card_ids: Iterable[int],
+        levels: List[str],
+        max_depth: int
+) -> Set[int]:
+    """
+    Find the dependencies of a batch of cards across several levels,
+    whatever their maturity, with one search from all the cards.
+
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the cards
+        levels: Level names from the top (e.g. ["sentence", "vocab", "character"])
+        max_depth: Maximum number of hops to follow
+
+    Returns:
+        Set of dependency card IDs
+    """
+    graph = get_dependency_graph(col, levels)
+    if graph is None:
+        return set()
+    return graph.collect_dependencies(card_ids, max_depth)
+
+
+def map_multi_hop_dependencies(
+        col,
+        card_ids: Iterable[int],
+        levels: List[str],
+        max_depth: int
+) -> Dict[int, Set[int]]:
+    """
+    Find the dependencies of each card of a batch across several levels.
+
+    The graph is loaded once, and the reachable sets of the cards along
+    the way are shared by the whole batch, whatever their maturity.
+
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the cards
+        levels: Level names from the top (e.g. ["sentence", "vocab", "character"])
+        max_depth: Maximum number of hops to follow
+
+    Returns:
+        Dependency card IDs per card
+    """
+    graph = get_dependency_graph(col, levels)
+    if graph is None:
+        return {}
+    return graph.map_dependencies(card_ids, max_depth)
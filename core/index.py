@@ -0,0 +1,432 @@
+"""
+Module for maintaining a persistent group -> vocabulary card index.
+
+The index maps each group id (the X in ``group:sX``) to the ids of the
+vocabulary cards that carry that group tag, so dependency lookups are
+dictionary hits instead of a table scan per failed sentence.
+"""
+
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..utils import ids_to_sql
+from .detection import extract_group_tags
+from .graph import get_fingerprint
+from .state import atomic_write, get_state_path
+
+
+INDEX_FILENAME = "group_index.json"
+INDEX_VERSION = 1
+
+# Tag marking vocabulary notes (compared case-insensitively, like Anki tags)
+VOCAB_TAG = "type:vocab"
+
+
+def get_index_path() -> str:
+    """Get the path of the persisted index file in the state directory"""
+    return get_state_path(INDEX_FILENAME)
+
+
+def is_vocab_note(tags: List[str]) -> bool:
+    """
+    Check if a note's tags mark it as a vocabulary note.
+
+    Args:
+        tags: List of tags
+
+    Returns:
+        True if the tags contain the vocabulary tag
+    """
+    return any(tag.lower() == VOCAB_TAG for tag in tags)
+
+
+class GroupIndex:
+    """
+    Inverted index from group ids to vocabulary card ids.
+
+    Alongside the inverted lists, the index keeps the groups and cards of
+    every indexed vocabulary note so single notes can be re-indexed or
+    removed without touching the rest of the index.
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, Set[int]] = {}
+        self.notes: Dict[int, Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+        # Collection state the index was last synchronised with
+        self.col_mod: Optional[int] = None
+        self.usn: Optional[int] = None
+        self.note_mod = 0
+        self.fingerprint: Optional[List[int]] = None
+        self.dirty = False
+
+    # Lookups
+
+    def lookup(self, group_ids: Iterable[str]) -> Set[int]:
+        """
+        Get the vocabulary cards of all given groups.
+
+        Args:
+            group_ids: Group ids (e.g. {'1', '2'})
+
+        Returns:
+            Set of vocabulary card IDs
+        """
+        card_ids: Set[int] = set()
+        for group_id in group_ids:
+            cards = self.groups.get(group_id)
+            if cards:
+                card_ids.update(cards)
+        return card_ids
+
+    def card_count(self) -> int:
+        """Get the number of indexed vocabulary cards"""
+        return sum(len(card_ids) for _, card_ids in self.notes.values())
+
+    # Incremental updates
+
+    def set_note(self, note_id: int, tags: List[str], card_ids: Iterable[int]) -> None:
+        """
+        Index (or re-index) a single note.
+
+        Notes that are not vocabulary notes are removed from the index.
+        Vocabulary notes without group tags are kept (with no groups) so
+        the index can be checked against the collection's note count.
+
+        Args:
+            note_id: ID of the note
+            tags: The note's tags
+            card_ids: IDs of the note's cards
+        """
+        self.remove_note(note_id)
+
+        if not is_vocab_note(tags):
+            return
+
+        group_ids = tuple(sys.intern(g) for g in sorted(extract_group_tags(tags)))
+        cards = tuple(card_ids)
+        self.notes[note_id] = (group_ids, cards)
+        for group_id in group_ids:
+            self.groups.setdefault(group_id, set()).update(cards)
+        self.dirty = True
+
+    def remove_note(self, note_id: int) -> None:
+        """
+        Remove a note from the index if it is present.
+
+        Args:
+            note_id: ID of the note
+        """
+        entry = self.notes.pop(note_id, None)
+        if entry is None:
+            return
+
+        group_ids, cards = entry
+        for group_id in group_ids:
+            members = self.groups.get(group_id)
+            if members is None:
+                continue
+            members.difference_update(cards)
+            if not members:
+                del self.groups[group_id]
+        self.dirty = True
+
+    # Building and staleness
+
+    def rebuild(self, col) -> None:
+        """
+        Rebuild the whole index with a single pass over the vocabulary notes.
+
+        Args:
+            col: The Anki collection
+        """
+        self.groups = {}
+        self.notes = {}
+        self._index_rows(col.db.all(f"""
+            SELECT n.id, n.tags, c.id
+            FROM notes n
+            JOIN cards c ON c.nid = n.id
+            WHERE n.tags LIKE '% {VOCAB_TAG} %'
+        """))
+        self._mark_synchronised(col)
+
+    def refresh(self, col) -> None:
+        """
+        Bring the index up to date with the collection.
+
+        Nothing is queried while the collection's mod time and USN are
+        unchanged. Reviews change those too, so the notes are then only
+        scanned if the collection's note and card fingerprint changed as
+        well. In that case notes modified since the last refresh are
+        re-indexed, and the index is rebuilt from scratch if its number of
+        vocabulary notes or cards no longer matches the collection (e.g.
+        notes deleted by a sync, which leave no mod time behind).
+
+        Args:
+            col: The Anki collection
+        """
+        if self.col_mod is None:
+            self.rebuild(col)
+            return
+
+        if self.col_mod == col.mod and self.usn == col.usn():
+            return
+
+        fingerprint = get_fingerprint(col)
+        if fingerprint == self.fingerprint:
+            # Only reviews moved the collection on. The index is unchanged,
+            # so it is not saved again; after a restart the fingerprint is
+            # compared once more.
+            self.col_mod = col.mod
+            self.usn = col.usn()
+            return
+
+        # Re-index every note touched since the last refresh. Note mod times
+        # have a one second resolution, so notes from that second are
+        # re-indexed too.
+        changed = col.db.all(
+            "SELECT id, tags FROM notes WHERE mod >= ?", self.note_mod
+        )
+        if changed:
+            changed_ids = [note_id for note_id, _ in changed]
+            for note_id in changed_ids:
+                self.remove_note(note_id)
+            self._index_rows(col.db.all(f"""
+                SELECT n.id, n.tags, c.id
+                FROM notes n
+                JOIN cards c ON c.nid = n.id
+                WHERE n.id IN {ids_to_sql(changed_ids)}
+            """))
+
+        note_count, card_count = col.db.first(f"""
+            SELECT count(DISTINCT n.id), count(c.id)
+            FROM notes n
+            JOIN cards c ON c.nid = n.id
+            WHERE n.tags LIKE '% {VOCAB_TAG} %'
+        """)
+        if note_count != len(self.notes) or card_count != self.card_count():
+            self.rebuild(col)
+            return
+
+        self._mark_synchronised(col)
+
+    def _index_rows(self, rows: Iterable[Tuple[int, str, int]]) -> None:
+        """Index (note id, tag string, card id) rows grouped by note"""
+        note_cards: Dict[int, List[int]] = {}
+        note_tags: Dict[int, List[str]] = {}
+        for note_id, tags, card_id in rows:
+            if note_id not in note_tags:
+                note_tags[note_id] = tags.split()
+                note_cards[note_id] = []
+            note_cards[note_id].append(card_id)
+
+        for note_id, tags in note_tags.items():
+            self.set_note(note_id, tags, note_cards[note_id])
+
+    def _mark_synchronised(self, col) -> None:
+        """Record the collection state the index now reflects"""
+        self.col_mod = col.mod
+        self.usn = col.usn()
+        self.fingerprint = get_fingerprint(col)
+        self.note_mod = self.fingerprint[0]
+        self.dirty = True
+
+    # Persistence
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the index to a JSON-compatible dictionary"""
+        return {
+            "version": INDEX_VERSION,
+            "col_mod": self.col_mod,
+            "usn": self.usn,
+            "note_mod": self.note_mod,
+            "fingerprint": self.fingerprint,
+            "notes": {
+                str(note_id): [list(group_ids), list(cards)]
+                for note_id, (group_ids, cards) in self.notes.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroupIndex":
+        """
+        Restore an index serialised with to_dict.
+
+        Args:
+            data: Dictionary produced by to_dict
+
+        Returns:
+            The restored index, or an empty index if the format is unknown
+        """
+        index = cls()
+        if data.get("version") != INDEX_VERSION:
+            return index
+
+        for note_id, (group_ids, cards) in data["notes"].items():
+            group_ids = tuple(sys.intern(g) for g in group_ids)
+            cards = tuple(cards)
+            index.notes[int(note_id)] = (group_ids, cards)
+            for group_id in group_ids:
+                index.groups.setdefault(group_id, set()).update(cards)
+
+        index.col_mod = data["col_mod"]
+        index.usn = data["usn"]
+        index.note_mod = data["note_mod"]
+        index.fingerprint = data.get("fingerprint")
+        return index
+
+
+# Module-level index shared by the add-on. Lookups run in background
+# operations while hooks update the index on the main thread.
+_index: Optional[GroupIndex] = None
+_index_path: Optional[str] = None
+_lock = threading.RLock()
+
+
+def load_index() -> GroupIndex:
+    """
+    Load the persisted index from disk.
+
+    Returns:
+        The loaded index, or an empty index if none could be read
+    """
+    path = get_index_path()
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return GroupIndex.from_dict(json.load(f))
+        except (json.JSONDecodeError, IOError, KeyError, TypeError, ValueError):
+            pass
+    return GroupIndex()
+
+
+def save_index(index: GroupIndex) -> None:
+    """
+    Persist the index to disk if it has changed since it was last saved.
+
+    Args:
+        index: The index to save
+    """
+    if not index.dirty:
+        return
+    try:
+        with atomic_write(get_index_path()) as f:
+            json.dump(index.to_dict(), f)
+        index.dirty = False
+    except IOError as e:
+        print(f"Error saving group index: {e}")
+
+
+def get_group_index(col) -> Optional[GroupIndex]:
+    """
+    Get the up-to-date group index for a collection.
+
+    The index is loaded from disk on first use (or when the state
+    directory changed), refreshed against the collection, and saved again
+    if the refresh changed it.
+
+    Args:
+        col: The Anki collection
+
+    Returns:
+        The group index, or None if no collection is open
+    """
+    global _index, _index_path
+
+    if not col:
+        return None
+
+    with _lock:
+        if _index is None or _index_path != get_index_path():
+            _index = load_index()
+            _index_path = get_index_path()
+
+        _index.refresh(col)
+        save_index(_index)
+        return _index
+
+
+def lookup_group_cards(col, group_ids: Iterable[str]) -> Optional[Set[int]]:
+    """
+    Look up the vocabulary cards of the given groups in the up-to-date index.
+
+    The lookup holds the index lock, so hooks cannot modify the index
+    while a background operation reads it.
+
+    Args:
+        col: The Anki collection
+        group_ids: Group ids (e.g. {'1', '2'})
+
+    Returns:
+        Set of vocabulary card IDs, or None if no collection is open
+    """
+    with _lock:
+        index = get_group_index(col)
+        if index is None:
+            return None
+        return index.lookup(group_ids)
+
+
+def map_group_cards(col, groups_by_key: Dict[int, Iterable[str]]) -> Optional[Dict[int, Set[int]]]:
+    """
+    Look up the vocabulary cards of several sets of groups at once.
+
+    Args:
+        col: The Anki collection
+        groups_by_key: Group ids per key (e.g. per sentence card ID)
+
+    Returns:
+        Set of vocabulary card IDs per key, or None if no collection is open
+    """
+    with _lock:
+        index = get_group_index(col)
+        if index is None:
+            return None
+        return {key: index.lookup(group_ids) for key, group_ids in groups_by_key.items()}
+
+
+# Hooks
+#######
+
+def on_collection_opened() -> None:
+    """
+    Forget the index when a profile's collection is opened. It is loaded
+    and checked for staleness on first use.
+    """
+    global _index
+    with _lock:
+        _index = None
+
+
+def on_note_added(note) -> None:
+    """Index a note added through the Add Cards dialog"""
+    with _lock:
+        if _index is None:
+            return
+        _index.set_note(note.id, note.tags, note.card_ids())
+
+
+def on_note_tags_updated(note) -> None:
+    """Re-index a note whose tags were edited in the editor"""
+    with _lock:
+        if _index is None or not note.id:
+            return
+        _index.set_note(note.id, note.tags, note.card_ids())
+
+
+def on_notes_deleted(col, note_ids) -> None:
+    """Drop deleted notes from the index"""
+    with _lock:
+        if _index is None:
+            return
+        for note_id in note_ids:
+            _index.remove_note(note_id)
+
+
+def on_profile_closing() -> None:
+    """Persist index changes made by hooks during the session"""
+    with _lock:
+        if _index is not None:
+            save_index(_index)
@@ -0,0 +1,192 @@
+"""
+Module for recording per-stage timings and counters of a boost run.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class RunReport:
+    """
+    Timings and counters of a single boost run.
+
+    Stages are timed with the stage() context manager. Database queries
+    and card/note loads made through an InstrumentedCollection are
+    attributed to the stage that is running when they happen.
+    """
+
+    def __init__(self, trigger: str = "manual"):
+        self.trigger = trigger
+        self.started = int(time.time())
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {}
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.warnings: List[str] = []
+        self.total_seconds = 0.0
+        self._current: Optional[Dict[str, Any]] = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a pipeline stage.
+
+        Args:
+            name: Name of the stage
+        """
+        entry = self.stages.setdefault(
+            name, {"seconds": 0.0, "queries": 0, "card_loads": 0, "note_loads": 0}
+        )
+        previous = self._current
+        self._current = entry
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["seconds"] += time.perf_counter() - start
+            self._current = previous
+
+    def count(self, kind: str) -> None:
+        """
+        Count a query or object load against the running stage.
+
+        Args:
+            kind: "queries", "card_loads" or "note_loads"
+        """
+        if self._current is not None:
+            self._current[kind] += 1
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        """
+        Increase a run-wide counter (e.g. "revlog_rows_scanned").
+
+        Args:
+            counter: Name of the counter
+            amount: Amount to add
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def warn(self, message: str) -> None:
+        """
+        Record a warning about the run, such as a setting that was ignored.
+
+        Args:
+            message: The warning; repeated warnings are recorded once
+        """
+        if message not in self.warnings:
+            self.warnings.append(message)
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        """
+        Mark the run as finished.
+
+        Args:
+            status: Outcome of the run ("completed", "cancelled" or "failed")
+            error: Message of the error a failed run ended with
+        """
+        self.status = status
+        self.error = error
+        self.total_seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the report to a JSON-compatible dictionary"""
+        return {
+            "started": self.started,
+            "trigger": self.trigger,
+            "status": self.status,
+            "error": self.error,
+            "warnings": list(self.warnings),
+            "total_seconds": round(self.total_seconds, 4),
+            "stages": {
+                name: dict(entry, seconds=round(entry["seconds"], 4))
+                for name, entry in self.stages.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Format a serialised run report as a few lines of text.
+
+    Args:
+        report: Dictionary produced by RunReport.to_dict
+
+    Returns:
+        Human-readable summary of the run
+    """
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(report["started"]))
+    lines = [f"{started}  {report['trigger']}  {report['status']}  {report['total_seconds']:.3f}s"]
+    if report.get("error"):
+        lines.append(f"  error: {report['error']}")
+    for warning in report.get("warnings", []):
+        lines.append(f"  warning: {warning}")
+    for name, entry in report["stages"].items():
+        lines.append(
+            f"  {name}: {entry['seconds']:.3f}s, {entry['queries']} queries, "
+            f"{entry['card_loads']} card loads, {entry['note_loads']} note loads"
+        )
+    if report["counters"]:
+        counters = ", ".join(f"{name.replace('_', ' ')}: {value}" for name, value in report["counters"].items())
+        lines.append(f"  {counters}")
+    return "\n".join(lines)
+
+
+class _InstrumentedDB:
+    """Wraps a collection's DB proxy and counts the queries made through it"""
+
+    def __init__(self, db, report: RunReport):
+        self._db = db
+        self._report = report
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._db, name)
+        if name in ("all", "list", "first", "scalar", "execute", "executemany"):
+            def counted(*args, **kwargs):
+                self._report.count("queries")
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class _InstrumentedCard:
+    """Wraps a card and counts note loads made through it"""
+
+    def __init__(self, card, report: RunReport):
+        self._card = card
+        self._report = report
+
+    def note(self, *args, **kwargs):
+        self._report.count("note_loads")
+        return self._card.note(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._card, name)
+
+
+class InstrumentedCollection:
+    """
+    Collection wrapper that counts queries and card/note loads.
+
+    Everything not counted is passed through to the wrapped collection,
+    so it can be handed to any function taking a collection.
+    """
+
+    def __init__(self, col, report: RunReport):
+        self._col = col
+        self._report = report
+        self.db = _InstrumentedDB(col.db, report)
+
+    def get_card(self, card_id):
+        self._report.count("card_loads")
+        card = self._col.get_card(card_id)
+        return _InstrumentedCard(card, self._report) if card else card
+
+    def get_note(self, note_id):
+        self._report.count("note_loads")
+        return self._col.get_note(note_id)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._col, name)
@@ -0,0 +1,67 @@
+"""
+Module for the boost ledger.
+
+The ledger records the scheduler day on which each card was last
+boosted ({card ID: day}). Cards boosted within the last
+`boost_cooldown_days` days are dropped from a run's dependencies with a
+dictionary lookup each, before any card is read from the collection, so
+a card shared by many failed sentences, or failed again a few days
+later, is not rescheduled (and synced) over and over. Entries past the
+cooldown are removed whenever boosts are recorded, so the ledger only
+holds the cards boosted within the cooldown.
+"""
+
+from typing import Dict, Iterable, List
+
+
+def filter_cooling_down(
+        ledger: Dict[int, int],
+        card_ids: Iterable[int],
+        today: int,
+        cooldown_days: int
+) -> List[int]:
+    """
+    Drop the cards boosted within the cooldown.
+
+    Args:
+        ledger: The boost ledger
+        card_ids: IDs of candidate cards
+        today: The collection's scheduler day
+        cooldown_days: Days after a boost during which a card is not boosted again
+
+    Returns:
+        IDs of the cards that may be boosted
+    """
+    if cooldown_days <= 0 or not ledger:
+        return list(card_ids)
+    start = today - cooldown_days
+    return [card_id for card_id in card_ids if ledger.get(card_id, start) <= start]
+
+
+def record_boosted(
+        ledger: Dict[int, int],
+        card_ids: Iterable[int],
+        today: int,
+        cooldown_days: int
+) -> int:
+    """
+    Record boosted cards and remove the entries past the cooldown.
+
+    Args:
+        ledger: The boost ledger, updated in place
+        card_ids: IDs of the rescheduled cards
+        today: The collection's scheduler day
+        cooldown_days: Days after a boost during which a card is not boosted again
+
+    Returns:
+        Number of expired entries removed
+    """
+    start = today - cooldown_days
+    expired = [card_id for card_id, day in ledger.items() if day <= start]
+    for card_id in expired:
+        del ledger[card_id]
+
+    if cooldown_days > 0:
+        for card_id in card_ids:
+            ledger[card_id] = today
+    return len(expired)
@@ -0,0 +1,326 @@
+"""
+Module for the read/analysis phase of a dependency boost run.
+
+The analysis only reads from the collection, so it can run in a
+background operation. Its result contains everything the short write
+phase needs, including the advanced review log cursor, which must only
+be saved once the write has succeeded.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..utils import advance_revlog_cursor
+from .instrumentation import InstrumentedCollection, RunReport
+from .review_log import (
+    count_review_logs, get_latest_review_log_id, iter_failed_sentence_reviews, iter_sentence_reviews
+)
+from .detection import filter_mature_cards
+from .providers import collect_dependencies, map_dependencies as map_provider_dependencies
+from .ledger import filter_cooling_down
+from .ranking import select_least_retained
+from .reschedule import get_cards_to_reschedule
+from .struggle import filter_struggling, prune_scores, update_scores
+
+
+# Number of failed reviews between progress updates and cancel checks
+PROGRESS_INTERVAL = 200
+
+
+class BoostCancelled(Exception):
+    """Raised when the user cancels a boost run during analysis"""
+
+
+def get_tolerance_ms(config: Dict[str, Any]) -> int:
+    """Get the out-of-order tolerance window for late-synced reviews in milliseconds"""
+    return int(config.get("late_review_tolerance_hours", 72) * 3600 * 1000)
+
+
+def uses_struggle_scores(config: Dict[str, Any]) -> bool:
+    """Check if boosts are decided by struggle scores (see core.struggle)"""
+    return config.get("struggle_threshold", 0) > 0
+
+
+def resolve_boost_targets(
+        col,
+        config: Dict[str, Any],
+        failed_cards: Iterable[int],
+        report: Optional[RunReport] = None,
+        ledger: Optional[Dict[int, int]] = None,
+        scores: Optional[Dict[int, Tuple[float, int]]] = None
+) -> List[int]:
+    """
+    Find the vocabulary cards to reschedule for a batch of failed sentence cards.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        failed_cards: IDs of the failed sentence cards
+        report: Optional RunReport recording per-stage timings and counters
+        ledger: Optional boost ledger (see core.ledger)
+        scores: Optional struggle scores, already updated with the batch's
+            reviews (see score_dependencies)
+
+    Returns:
+        IDs of the cards that should be rescheduled
+    """
+    if report is None:
+        report = RunReport()
+    deps = find_dependencies(col, config, failed_cards, report, ledger)
+    return select_boost_targets(col, config, deps, report, scores)
+
+
+def find_dependencies(
+        col,
+        config: Dict[str, Any],
+        failed_cards: Iterable[int],
+        report: RunReport,
+        ledger: Optional[Dict[int, int]] = None
+) -> List[int]:
+    """
+    Find the mature dependencies of a batch of failed sentence cards with
+    the configured dependency providers (see core.providers).
+
+    The dependencies of all providers are merged and checked for maturity
+    with one query. The dependencies of a batch are the union of the
+    dependencies of its parts, so batches can be split and their results
+    merged.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        failed_cards: IDs of the failed sentence cards
+        report: RunReport recording per-stage timings and counters
+        ledger: Optional boost ledger; cards boosted within the cooldown
+            are dropped before the maturity query
+
+    Returns:
+        Deduplicated IDs of the dependency cards
+    """
+    maturity_threshold = config.get("maturity_threshold", 21)
+
+    # Find the (deduplicated) dependencies of all failed cards at once
+    with report.stage("find_dependencies"):
+        candidates = collect_dependencies(col, config, failed_cards, report)
+
+    cooldown_days = config.get("boost_cooldown_days", 0)
+    if ledger and cooldown_days > 0:
+        with report.stage("ledger"):
+            candidates = list(candidates)
+            eligible = filter_cooling_down(ledger, candidates, col.sched.today, cooldown_days)
+            report.add("ledger_skipped", len(candidates) - len(eligible))
+            candidates = eligible
+
+    with report.stage("find_dependencies"):
+        deps = filter_mature_cards(col, candidates, maturity_threshold, report)
+        report.add("dependencies_found", len(deps))
+    return deps
+
+
+def map_dependencies(
+        col,
+        config: Dict[str, Any],
+        sentence_cards: Iterable[int],
+        report: RunReport
+) -> Dict[int, Set[int]]:
+    """
+    Find the dependencies of each sentence card of a batch with the
+    configured dependency providers, whatever their maturity.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        sentence_cards: IDs of the sentence cards
+        report: RunReport recording per-stage timings and counters
+
+    Returns:
+        Dependency card IDs per sentence card
+    """
+    with report.stage("map_dependencies"):
+        return map_provider_dependencies(col, config, sentence_cards, report)
+
+
+def score_dependencies(
+        col,
+        config: Dict[str, Any],
+        reviews: List[Tuple[int, int, int]],
+        scores: Dict[int, Tuple[float, int]],
+        report: RunReport
+) -> None:
+    """
+    Update the struggle scores with new sentence reviews.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        reviews: (review log ID, sentence card ID, ease) tuples in review log ID order
+        scores: The struggle scores, updated in place
+        report: RunReport recording per-stage timings and counters
+    """
+    half_life_days = config.get("struggle_half_life_days", 14)
+    deps_by_sentence = map_dependencies(col, config, {card_id for _, card_id, _ in reviews}, report)
+    with report.stage("struggle_scores"):
+        report.add("scores_updated", update_scores(
+            scores, reviews, deps_by_sentence, half_life_days, config.get("struggle_pass_weight", 0.5)))
+        prune_scores(scores, half_life_days)
+
+
+def select_boost_targets(
+        col,
+        config: Dict[str, Any],
+        deps: Iterable[int],
+        report: RunReport,
+        scores: Optional[Dict[int, Tuple[float, int]]] = None
+) -> List[int]:
+    """
+    Choose the dependency cards to reschedule.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        deps: IDs of the dependency cards (see find_dependencies)
+        report: RunReport recording per-stage timings and counters
+        scores: Optional struggle scores; with a struggle threshold set,
+            cards below it are dropped before any card is read
+
+    Returns:
+        IDs of the cards that should be rescheduled
+    """
+    if scores is not None and uses_struggle_scores(config):
+        with report.stage("struggle_filter"):
+            deps = list(deps)
+            struggling = filter_struggling(
+                scores, deps, config["struggle_threshold"], config.get("struggle_half_life_days", 14))
+            report.add("struggle_skipped", len(deps) - len(struggling))
+            deps = struggling
+
+    with report.stage("filter_eligible"):
+        card_ids = get_cards_to_reschedule(col, deps)
+
+    # Optionally only boost the cards most likely to be forgotten
+    max_boosts = config.get("max_boosts_per_run", 0)
+    if config.get("ranking_mode", "none") == "retrievability" and 0 < max_boosts < len(card_ids):
+        with report.stage("rank"):
+            report.add("cards_ranked", len(card_ids))
+            card_ids = select_least_retained(col, card_ids, max_boosts)
+    report.add("cards_to_reschedule", len(card_ids))
+
+    return card_ids
+
+
+def analyse_failed_reviews(
+        col,
+        config: Dict[str, Any],
+        state: Dict[str, Any],
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        report: Optional[RunReport] = None,
+        min_usn: Optional[int] = None,
+        ledger: Optional[Dict[int, int]] = None,
+        scores: Optional[Dict[int, Tuple[float, int]]] = None
+) -> Dict[str, Any]:
+    """
+    Find the vocabulary cards to boost for all new failed sentence reviews.
+
+    After a sync, pass the review log USN taken before it as min_usn: the
+    reviews the sync brought in are then read even if they are further
+    behind the cursor than the late-sync tolerance window.
+
+    With a struggle threshold set, passed sentence reviews are read too,
+    and all new reviews update the struggle scores before the targets are
+    chosen.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        state: Review log cursor state ({"cursor": ..., "recent": ...})
+        should_cancel: Polled regularly; the run is aborted when it returns True
+        on_progress: Called with a short status message as the analysis advances
+        report: Optional RunReport recording per-stage timings and counters
+        min_usn: Review log USN taken before a sync (see get_review_log_usn)
+        ledger: Optional boost ledger (see core.ledger)
+        scores: Optional struggle scores (see core.struggle), updated in place
+
+    Returns:
+        Dictionary with the card IDs to reschedule ("card_ids"), the failed
+        sentence cards ("failed_cards") and their number ("failed_count"),
+        the new cursor state ("cursor_state") and, when struggle scores
+        were used, the updated scores ("struggle_scores")
+
+    Raises:
+        BoostCancelled: If should_cancel returned True
+    """
+    def check_cancel() -> None:
+        if should_cancel and should_cancel():
+            raise BoostCancelled()
+
+    def progress(message: str) -> None:
+        if on_progress:
+            on_progress(message)
+
+    if report is None:
+        report = RunReport()
+    col = InstrumentedCollection(col, report)
+
+    days = config.get("days_to_check", 7)
+    tolerance_ms = get_tolerance_ms(config)
+
+    # Only read reviews past the cursor, minus the window in which
+    # late-synced reviews may still show up. Never look back further
+    # than the configured number of days.
+    after_id = None
+    if state["cursor"] is not None:
+        after_id = state["cursor"] - tolerance_ms
+
+    # Find failed sentence cards, skipping reviews seen in an earlier run.
+    # Struggle scores also take the passed sentence reviews.
+    scoring = scores is not None and uses_struggle_scores(config)
+    progress("Scanning review history...")
+    processed_revlog_ids = []
+    reviews = []
+    failed_cards = set()
+    with report.stage("scan_reviews"):
+        scanned_until = get_latest_review_log_id(col)
+        report.add("revlog_rows_scanned", count_review_logs(col, days=days, after_id=after_id, min_usn=min_usn))
+        if scoring:
+            rows = iter_sentence_reviews(
+                col, days=days, after_id=after_id, skip_ids=state["recent"], min_usn=min_usn)
+        else:
+            rows = ((revlog_id, card_id, 1) for revlog_id, card_id in iter_failed_sentence_reviews(
+                col, days=days, after_id=after_id, skip_ids=state["recent"], min_usn=min_usn))
+        for revlog_id, card_id, ease in rows:
+            processed_revlog_ids.append(revlog_id)
+            if scoring:
+                reviews.append((revlog_id, card_id, ease))
+            if ease == 1:
+                failed_cards.add(card_id)
+            if len(processed_revlog_ids) % PROGRESS_INTERVAL == 0:
+                check_cancel()
+                progress(f"Scanning review history... {len(processed_revlog_ids)} sentence reviews")
+    report.add("sentences_matched", len(failed_cards))
+    check_cancel()
+
+    # Advance the cursor past the reviews we've processed. Only the
+    # sentence reviews read need to be remembered inside the tolerance window.
+    cursor, recent = advance_revlog_cursor(
+        state["cursor"], state["recent"], processed_revlog_ids, tolerance_ms,
+        scanned_until=scanned_until
+    )
+
+    if scoring:
+        progress(f"Scoring vocabulary for {len(reviews)} sentence reviews...")
+        score_dependencies(col, config, reviews, scores, report)
+        check_cancel()
+
+    progress(f"Finding vocabulary for {len(failed_cards)} failed sentences...")
+    card_ids = resolve_boost_targets(col, config, failed_cards, report, ledger, scores if scoring else None)
+    check_cancel()
+
+    result = {
+        "card_ids": card_ids,
+        "failed_cards": sorted(failed_cards),
+        "failed_count": len(failed_cards),
+        "cursor_state": {"cursor": cursor, "recent": recent},
+    }
+    if scoring:
+        result["struggle_scores"] = scores
+    return result
@@ -0,0 +1,320 @@
+"""
+Module for dependency providers.
+
+A provider finds the cards a failed sentence card depends on. Providers
+only ever get whole batches of sentence cards and answer with a mapping
+from each sentence card to its dependencies, so a provider looks up a
+batch with a fixed number of queries instead of one per card. Results
+are not filtered for maturity: the pipeline merges and deduplicates the
+dependencies of all configured providers and checks their maturity with
+a single query.
+
+The built-in providers are registered under the names accepted by the
+`detection_method` setting ("tags", "fields" and "graph"). Other add-ons
+can add their own by subclassing DependencyProvider and passing an
+instance to register_provider; `detection_method` may then name it, or
+list several providers whose dependencies are combined.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .automaton import get_headword_index
+from .detection import (
+    collect_vocabulary_dependencies_batch, collect_vocabulary_dependencies_by_fields,
+    map_vocabulary_dependencies_batch, map_vocabulary_dependencies_by_fields
+)
+from .graph import (
+    DEFAULT_LEVELS, collect_multi_hop_dependencies, get_dependency_graph, map_multi_hop_dependencies
+)
+from .index import get_group_index
+from .instrumentation import RunReport
+
+
+DEFAULT_PROVIDER = "tags"
+
+
+class DependencyProvider(ABC):
+    """
+    Base class of dependency providers.
+
+    Subclasses set a unique name and implement map_dependencies; a
+    subclass without it can't be instantiated, so it can't be registered
+    either. They may
+    override collect_dependencies when the union of a batch's
+    dependencies can be found more cheaply than the full mapping, and
+    prepare when they keep a persisted index.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def map_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Dict[int, Set[int]]:
+        """
+        Find the dependencies of each sentence card of a batch.
+
+        Args:
+            col: The Anki collection (possibly a read-only snapshot)
+            config: Add-on configuration
+            card_ids: IDs of the sentence cards
+
+        Returns:
+            Dependency card IDs per sentence card; cards without
+            dependencies may be left out
+        """
+
+    def collect_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Set[int]:
+        """
+        Find the dependencies of a batch of sentence cards.
+
+        Args:
+            col: The Anki collection (possibly a read-only snapshot)
+            config: Add-on configuration
+            card_ids: IDs of the sentence cards
+
+        Returns:
+            Set of dependency card IDs
+        """
+        deps: Set[int] = set()
+        for card_deps in self.map_dependencies(col, config, card_ids).values():
+            deps.update(card_deps)
+        return deps
+
+    def prepare(self, col, config: Dict[str, Any]) -> None:
+        """
+        Bring any persisted index up to date, so that parallel workers
+        only load it.
+
+        Args:
+            col: The Anki collection (possibly a read-only snapshot)
+            config: Add-on configuration
+        """
+
+
+class TagProvider(DependencyProvider):
+    """Vocabulary sharing a group tag (group:sX) with the sentence"""
+
+    name = "tags"
+
+    def map_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Dict[int, Set[int]]:
+        return map_vocabulary_dependencies_batch(col, card_ids)
+
+    def collect_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Set[int]:
+        return collect_vocabulary_dependencies_batch(col, card_ids)
+
+    def prepare(self, col, config: Dict[str, Any]) -> None:
+        get_group_index(col)
+
+
+class FieldProvider(DependencyProvider):
+    """Vocabulary whose headword occurs in the sentence's text"""
+
+    name = "fields"
+
+    def map_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Dict[int, Set[int]]:
+        return map_vocabulary_dependencies_by_fields(
+            col,
+            card_ids,
+            config.get("sentence_field", "Sentence"),
+            config.get("vocab_field", "Word"),
+            config.get("automaton_workers", 0)
+        )
+
+    def collect_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Set[int]:
+        return collect_vocabulary_dependencies_by_fields(
+            col,
+            card_ids,
+            config.get("sentence_field", "Sentence"),
+            config.get("vocab_field", "Word"),
+            config.get("automaton_workers", 0)
+        )
+
+    def prepare(self, col, config: Dict[str, Any]) -> None:
+        get_headword_index(col, config.get("vocab_field", "Word"), config.get("automaton_workers", 0))
+
+
+class GraphProvider(DependencyProvider):
+    """Cards reached along dependency chains over several levels"""
+
+    name = "graph"
+
+    def map_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Dict[int, Set[int]]:
+        return map_multi_hop_dependencies(
+            col,
+            card_ids,
+            config.get("dependency_levels", DEFAULT_LEVELS),
+            config.get("max_dependency_depth", 3)
+        )
+
+    def collect_dependencies(self, col, config: Dict[str, Any], card_ids: Set[int]) -> Set[int]:
+        return collect_multi_hop_dependencies(
+            col,
+            card_ids,
+            config.get("dependency_levels", DEFAULT_LEVELS),
+            config.get("max_dependency_depth", 3)
+        )
+
+    def prepare(self, col, config: Dict[str, Any]) -> None:
+        get_dependency_graph(col, config.get("dependency_levels", DEFAULT_LEVELS))
+
+
+# Registry
+##########
+
+_providers: Dict[str, DependencyProvider] = {}
+
+
+def register_provider(provider: DependencyProvider) -> None:
+    """
+    Register a provider, replacing any provider of the same name.
+
+    Args:
+        provider: The provider
+
+    Raises:
+        ValueError: If the provider has no name
+    """
+    if not provider.name:
+        raise ValueError("dependency providers need a name")
+    _providers[provider.name] = provider
+
+
+def unregister_provider(name: str) -> None:
+    """
+    Remove a provider if it is registered.
+
+    Args:
+        name: Name of the provider
+    """
+    _providers.pop(name, None)
+
+
+def get_provider(name: str) -> Optional[DependencyProvider]:
+    """
+    Get a registered provider.
+
+    Args:
+        name: Name of the provider
+
+    Returns:
+        The provider, or None if no provider has that name
+    """
+    return _providers.get(name)
+
+
+def get_providers(config: Dict[str, Any], report: Optional[RunReport] = None) -> List[DependencyProvider]:
+    """
+    Get the providers named by the `detection_method` setting.
+
+    Unknown names are skipped; the tags provider is used if no named
+    provider is registered.
+
+    Args:
+        config: Add-on configuration
+        report: Optional RunReport warned about unknown names
+
+    Returns:
+        The configured providers
+    """
+    names = config.get("detection_method", DEFAULT_PROVIDER)
+    if isinstance(names, str):
+        names = [names]
+
+    providers = []
+    for name in names:
+        provider = _providers.get(name)
+        if provider is None:
+            if report is not None:
+                report.warn(f"Unknown detection method: {name}")
+        elif provider not in providers:
+            providers.append(provider)
+    return providers or [_providers[DEFAULT_PROVIDER]]
+
+
+def uses_builtin_providers_only(config: Dict[str, Any]) -> bool:
+    """
+    Check if all configured providers are built in, so that other
+    processes (which only register the built-in providers) use the same ones.
+
+    Args:
+        config: Add-on configuration
+    """
+    return all(type(provider) in BUILTIN_PROVIDERS for provider in get_providers(config))
+
+
+def collect_dependencies(
+        col,
+        config: Dict[str, Any],
+        card_ids: Iterable[int],
+        report: Optional[RunReport] = None
+) -> Set[int]:
+    """
+    Merge the dependencies all configured providers find for a batch.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        card_ids: IDs of the sentence cards
+        report: Optional RunReport counting the dependencies of each provider
+
+    Returns:
+        Deduplicated set of dependency card IDs
+    """
+    card_ids = set(card_ids)
+    deps: Set[int] = set()
+    if not card_ids:
+        return deps
+    for provider in get_providers(config, report):
+        found = provider.collect_dependencies(col, config, card_ids)
+        if report is not None:
+            report.add(f"provider_{provider.name}_dependencies", len(found))
+        deps.update(found)
+    return deps
+
+
+def map_dependencies(
+        col,
+        config: Dict[str, Any],
+        card_ids: Iterable[int],
+        report: Optional[RunReport] = None
+) -> Dict[int, Set[int]]:
+    """
+    Merge the per-sentence dependencies of all configured providers.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        card_ids: IDs of the sentence cards
+        report: Optional RunReport warned about unknown provider names
+
+    Returns:
+        Deduplicated dependency card IDs per sentence card
+    """
+    card_ids = set(card_ids)
+    merged: Dict[int, Set[int]] = {}
+    if not card_ids:
+        return merged
+    for provider in get_providers(config, report):
+        for card_id, deps in provider.map_dependencies(col, config, card_ids).items():
+            if deps:
+                merged.setdefault(card_id, set()).update(deps)
+    return merged
+
+
+def prepare_providers(col, config: Dict[str, Any], report: Optional[RunReport] = None) -> None:
+    """
+    Bring the persisted indexes of all configured providers up to date.
+
+    Args:
+        col: The Anki collection
+        config: Add-on configuration
+        report: Optional RunReport warned about unknown provider names
+    """
+    for provider in get_providers(config, report):
+        provider.prepare(col, config)
+
+
+BUILTIN_PROVIDERS = (TagProvider, FieldProvider, GraphProvider)
+
+for _provider_type in BUILTIN_PROVIDERS:
+    register_provider(_provider_type())
@@ -0,0 +1,154 @@
+"""
+Module for ranking boost candidates by how likely they are forgotten.
+
+The current retrievability of every candidate is estimated with the FSRS
+forgetting curve, using the card's FSRS stability when it has one and
+its interval otherwise (SM-2 schedules a review when retrievability has
+dropped to about 90%, which is what FSRS stability means too). Only the
+least retained cards are boosted. NumPy is used when it is installed,
+with a heapq fallback otherwise.
+"""
+
+import heapq
+import time
+from typing import Iterable, List, Optional
+
+from ..utils import ids_to_sql
+
+
+# FSRS forgetting curve: R = (1 + FACTOR * t / S) ** DECAY
+DECAY = -0.5
+FACTOR = 19 / 81
+
+# Lowest stability used, so cards with no usable memory state rank first
+# instead of dividing by zero
+MIN_STABILITY = 0.1
+
+# Card type of review cards (due is a day number)
+CARD_TYPE_REVIEW = 2
+
+
+def _load_numpy():
+    """Import NumPy if it is installed (only when ranking is used)"""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def estimate_retrievability(elapsed_days: float, stability: float) -> float:
+    """
+    Estimate the probability of recalling a card.
+
+    Args:
+        elapsed_days: Days since the card's last review
+        stability: Days until retrievability drops to 90%
+
+    Returns:
+        Retrievability between 0 and 1
+    """
+    stability = max(stability, MIN_STABILITY)
+    return (1 + FACTOR * max(elapsed_days, 0.0) / stability) ** DECAY
+
+
+def fetch_memory_state(col, card_ids: Iterable[int]) -> List[tuple]:
+    """
+    Read the scheduling and memory state of cards with one query.
+
+    FSRS stability and the last review time are read from the cards'
+    `data` column; -1 marks a missing value.
+
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the cards
+
+    Returns:
+        Rows of (id, type, due, ivl, lapses, stability, last review time)
+    """
+    return col.db.all(f"""
+        SELECT
+            id, type, due, ivl, lapses,
+            IFNULL(CASE WHEN json_valid(data) THEN json_extract(data, '$.s') END, -1),
+            IFNULL(CASE WHEN json_valid(data) THEN json_extract(data, '$.lrt') END, -1)
+        FROM cards
+        WHERE id IN {ids_to_sql(card_ids)}
+    """)
+
+
+def select_least_retained(
+        col,
+        card_ids: Iterable[int],
+        limit: int,
+        now: Optional[float] = None
+) -> List[int]:
+    """
+    Keep the cards with the lowest estimated retrievability.
+
+    Cards with the same retrievability are ordered by lapses, most first.
+
+    Args:
+        col: The Anki collection
+        card_ids: IDs of the candidate cards
+        limit: Maximum number of cards to keep
+        now: Current time in seconds (defaults to the clock)
+
+    Returns:
+        IDs of the kept cards, least retained first
+    """
+    card_ids = list(card_ids)
+    if limit <= 0 or not card_ids:
+        return []
+
+    rows = fetch_memory_state(col, card_ids)
+    if not rows:
+        return []
+
+    now = time.time() if now is None else now
+    today = col.sched.today
+
+    numpy = _load_numpy()
+    if numpy is not None:
+        return _select_numpy(numpy, rows, limit, today, now)
+    return _select_heapq(rows, limit, today, now)
+
+
+def _select_numpy(np, rows: List[tuple], limit: int, today: int, now: float) -> List[int]:
+    """Vectorised selection (IDs stay exact as float64 below 2**53)"""
+    data = np.array(rows, dtype=np.float64)
+    ids = data[:, 0].astype(np.int64)
+    card_type, due, ivl, lapses, stability, last_review = data[:, 1:].T
+
+    # Days since the last review: from the recorded review time if there is
+    # one, otherwise from the interval and due day of review cards
+    elapsed = np.where(card_type == CARD_TYPE_REVIEW, ivl - (due - today), 0.0)
+    elapsed = np.where(last_review > 0, (now - last_review) / 86400, elapsed)
+    elapsed = np.maximum(elapsed, 0.0)
+
+    stability = np.where(stability > 0, stability, ivl)
+    stability = np.maximum(stability, MIN_STABILITY)
+    retrievability = (1 + FACTOR * elapsed / stability) ** DECAY
+
+    if limit < len(ids):
+        # Partial sort: only the kept cards are put in order
+        kept = np.argpartition(retrievability, limit - 1)[:limit]
+    else:
+        kept = np.arange(len(ids))
+    order = np.lexsort((-lapses[kept], retrievability[kept]))
+    return ids[kept[order]].tolist()
+
+
+def _select_heapq(rows: List[tuple], limit: int, today: int, now: float) -> List[int]:
+    """Selection without NumPy"""
+    def sort_key(row: tuple) -> tuple:
+        card_id, card_type, due, ivl, lapses, stability, last_review = row
+        if last_review > 0:
+            elapsed = (now - last_review) / 86400
+        elif card_type == CARD_TYPE_REVIEW:
+            elapsed = ivl - (due - today)
+        else:
+            elapsed = 0.0
+        retrievability = estimate_retrievability(elapsed, stability if stability > 0 else ivl)
+        return retrievability, -lapses
+
+    return [row[0] for row in heapq.nsmallest(limit, rows, key=sort_key)]
@@ -0,0 +1,300 @@
+"""
+Module for replaying the review history under different settings.
+
+The review log is streamed once in ID (time) order. Boost runs are
+simulated at a fixed cadence: each run takes the failed sentence reviews
+since the previous run that are within `days_to_check` of it, looks up
+the vocabulary cards of their groups and boosts those whose interval at
+that point of the history reached `maturity_threshold`. A boosted card
+counts as a hit when its next review is a lapse within the horizon, so
+the boost came before a real lapse; boosted cards are not boosted again
+until that review, as they would already be due.
+
+Every combination of the swept settings is evaluated at each run and
+review of the stream, with NumPy when it is installed (one array row per
+combination) and with per-combination dictionaries otherwise. Only the
+tags detection method is replayed.
+"""
+
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from urllib.request import pathname2url
+
+from .detection import extract_group_tags
+from .index import is_vocab_note
+from .review_log import is_sentence_note
+
+
+DAY_MS = 86400 * 1000
+
+# Review log rows fetched per batch of the stream
+BATCH_SIZE = 50000
+
+
+def _load_numpy():
+    """Import NumPy if it is installed (only when replaying)"""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+class _NumpyEvaluator:
+    """Boost and review bookkeeping of all settings as NumPy arrays"""
+
+    def __init__(self, np, thresholds: List[int], windows: List[int], card_count: int):
+        self.np = np
+        self.thresholds = thresholds
+        self.windows = windows
+        settings = len(thresholds) * len(windows)
+        # Day of the pending boost of every card under every setting, or -1
+        self.boost_day = np.full((settings, card_count), -1, dtype=np.int32)
+        self.boosted = np.zeros(settings, dtype=np.int64)
+        self.resolved = np.zeros(settings, dtype=np.int64)
+        self.hits = np.zeros(settings, dtype=np.int64)
+
+    def boost(self, run_ms: int, cards: List[int], times: List[int], ivls: List[int]) -> List[int]:
+        np = self.np
+        cards = np.asarray(cards, dtype=np.int64)
+        times = np.asarray(times, dtype=np.int64)
+        ivls = np.asarray(ivls, dtype=np.int32)
+        mature = ivls[None, :] >= np.asarray(self.thresholds, dtype=np.int32)[:, None]
+        run_day = run_ms // DAY_MS
+
+        touched = []
+        for w, days in enumerate(self.windows):
+            in_window = times >= run_ms - days * DAY_MS
+            for t in range(len(self.thresholds)):
+                s = t * len(self.windows) + w
+                selected = np.unique(cards[in_window & mature[t]])
+                selected = selected[self.boost_day[s, selected] < 0]
+                if selected.size:
+                    self.boost_day[s, selected] = run_day
+                    self.boosted[s] += selected.size
+                    touched.append(selected)
+        return np.concatenate(touched).tolist() if touched else []
+
+    def resolve(self, card: int, lapse: bool, review_ms: int, horizon_days: int) -> None:
+        days = self.boost_day[:, card]
+        pending = days >= 0
+        self.resolved += pending
+        if lapse:
+            self.hits += pending & (review_ms // DAY_MS - days <= horizon_days)
+        self.boost_day[pending, card] = -1
+
+    def counts(self, s: int) -> tuple:
+        return int(self.boosted[s]), int(self.resolved[s]), int(self.hits[s])
+
+
+class _PythonEvaluator:
+    """Boost and review bookkeeping of all settings as dictionaries"""
+
+    def __init__(self, thresholds: List[int], windows: List[int]):
+        self.thresholds = thresholds
+        self.windows = windows
+        settings = len(thresholds) * len(windows)
+        self.boost_day: List[Dict[int, int]] = [{} for _ in range(settings)]
+        self.boosted = [0] * settings
+        self.resolved = [0] * settings
+        self.hits = [0] * settings
+
+    def boost(self, run_ms: int, cards: List[int], times: List[int], ivls: List[int]) -> List[int]:
+        run_day = run_ms // DAY_MS
+        touched = set()
+        for w, days in enumerate(self.windows):
+            start = run_ms - days * DAY_MS
+            for t, threshold in enumerate(self.thresholds):
+                s = t * len(self.windows) + w
+                pending = self.boost_day[s]
+                selected = {
+                    card for card, time, ivl in zip(cards, times, ivls)
+                    if time >= start and ivl >= threshold and card not in pending
+                }
+                for card in selected:
+                    pending[card] = run_day
+                self.boosted[s] += len(selected)
+                touched.update(selected)
+        return list(touched)
+
+    def resolve(self, card: int, lapse: bool, review_ms: int, horizon_days: int) -> None:
+        review_day = review_ms // DAY_MS
+        for s, pending in enumerate(self.boost_day):
+            day = pending.pop(card, None)
+            if day is None:
+                continue
+            self.resolved[s] += 1
+            if lapse and review_day - day <= horizon_days:
+                self.hits[s] += 1
+
+    def counts(self, s: int) -> tuple:
+        return self.boosted[s], self.resolved[s], self.hits[s]
+
+
+def open_read_only(path: str) -> sqlite3.Connection:
+    """
+    Open a collection file so that it can't be modified.
+
+    Args:
+        path: Path of the collection file
+
+    Returns:
+        A read-only sqlite3 connection
+    """
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def replay_history(
+        conn: sqlite3.Connection,
+        thresholds: Iterable[int],
+        windows: Iterable[int],
+        run_every_days: float = 1.0,
+        horizon_days: int = 30,
+        on_progress: Optional[Callable[[int], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Simulate boost runs over the whole review history for a grid of settings.
+
+    Args:
+        conn: Connection to the collection (see open_read_only)
+        thresholds: maturity_threshold values to evaluate
+        windows: days_to_check values to evaluate
+        run_every_days: Days between simulated boost runs
+        horizon_days: Days after a boost in which a lapse counts as a hit
+        on_progress: Called with the number of review log rows read so far
+
+    Returns:
+        One dictionary per combination of settings, with the number of
+        boosted cards ("boosted"), boosted cards reviewed since
+        ("reviewed"), hits ("hits") and their share of the reviewed cards
+        ("hit_rate"), lapses of cards mature under the threshold
+        ("lapses") and the share of them that were anticipated ("coverage")
+    """
+    thresholds = sorted(set(thresholds))
+    windows = sorted(set(windows))
+    run_ms = int(run_every_days * DAY_MS)
+
+    # Index the cards once: tag groups of sentences, vocabulary per group
+    card_index: Dict[int, int] = {}
+    sentence_groups: Dict[int, List[str]] = {}
+    group_vocab: Dict[str, List[int]] = {}
+    vocab = bytearray()
+    for card_id, tags in conn.execute("SELECT c.id, n.tags FROM cards c JOIN notes n ON c.nid = n.id"):
+        idx = card_index[card_id] = len(card_index)
+        tag_list = tags.split()
+        vocab.append(0)
+        if is_sentence_note(tag_list):
+            sentence_groups[idx] = extract_group_tags(tag_list)
+        elif is_vocab_note(tag_list):
+            vocab[idx] = 1
+            for group in extract_group_tags(tag_list):
+                group_vocab.setdefault(group, []).append(idx)
+
+    dependencies: Dict[int, List[int]] = {}
+
+    def get_dependencies(sentence: int) -> List[int]:
+        deps = dependencies.get(sentence)
+        if deps is None:
+            members = set()
+            for group in sentence_groups[sentence]:
+                members.update(group_vocab.get(group, ()))
+            deps = dependencies[sentence] = sorted(members)
+        return deps
+
+    np = _load_numpy()
+    if np is not None:
+        evaluator = _NumpyEvaluator(np, thresholds, windows, len(card_index))
+    else:
+        evaluator = _PythonEvaluator(thresholds, windows)
+
+    ivl = [0] * len(card_index)
+    pending = bytearray(len(card_index))
+    lapses = [0] * len(thresholds)
+    failures: List[tuple] = []
+    next_run = None
+
+    def run(run_at: int) -> None:
+        cards, times = [], []
+        for revlog_id, sentence in failures:
+            deps = get_dependencies(sentence)
+            cards.extend(deps)
+            times.extend([revlog_id] * len(deps))
+        failures.clear()
+        if cards:
+            for card in evaluator.boost(run_at, cards, times, [ivl[card] for card in cards]):
+                pending[card] = 1
+
+    cursor = conn.execute("SELECT id, cid, ease, ivl FROM revlog ORDER BY id")
+    rows_read = 0
+    while True:
+        batch = cursor.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        for revlog_id, card_id, ease, new_ivl in batch:
+            idx = card_index.get(card_id)
+            if idx is None:
+                continue
+            if next_run is None:
+                next_run = revlog_id + run_ms
+            while revlog_id >= next_run:
+                if failures:
+                    run(next_run)
+                next_run += run_ms
+
+            # Manual rescheduling entries (ease 0) are not reviews
+            if ease > 0:
+                if pending[idx]:
+                    evaluator.resolve(idx, ease == 1, revlog_id, horizon_days)
+                    pending[idx] = 0
+                if ease == 1:
+                    if idx in sentence_groups:
+                        failures.append((revlog_id, idx))
+                    elif vocab[idx]:
+                        for t, threshold in enumerate(thresholds):
+                            if ivl[idx] >= threshold:
+                                lapses[t] += 1
+            # Negative intervals are learning steps in seconds
+            ivl[idx] = max(new_ivl, 0)
+        rows_read += len(batch)
+        if on_progress:
+            on_progress(rows_read)
+
+    results = []
+    for t, threshold in enumerate(thresholds):
+        for w, days in enumerate(windows):
+            boosted, reviewed, hits = evaluator.counts(t * len(windows) + w)
+            results.append({
+                "maturity_threshold": threshold,
+                "days_to_check": days,
+                "boosted": boosted,
+                "reviewed": reviewed,
+                "hits": hits,
+                "hit_rate": hits / reviewed if reviewed else None,
+                "lapses": lapses[t],
+                "coverage": hits / lapses[t] if lapses[t] else None,
+            })
+    return results
+
+
+def _percent(value: Optional[float]) -> str:
+    return f"{value:.1%}" if value is not None else "-"
+
+
+def format_replay(results: Sequence[Dict[str, Any]]) -> str:
+    """
+    Format replay results as a table.
+
+    Args:
+        results: Results of replay_history
+
+    Returns:
+        Multi-line table, one row per combination of settings
+    """
+    lines = [f"{'threshold':>9} {'days':>5} {'boosted':>9} {'reviewed':>9} {'hit rate':>9} {'coverage':>9}"]
+    for result in results:
+        lines.append(
+            f"{result['maturity_threshold']:>9} {result['days_to_check']:>5} {result['boosted']:>9} "
+            f"{result['reviewed']:>9} {_percent(result['hit_rate']):>9} {_percent(result['coverage']):>9}"
+        )
+    return "\n".join(lines)
@@ -2,87 +2,150 @@
 Module for rescheduling dependent vocabulary cards.
 """
 
-from typing import List
-from aqt import mw
-from aqt.utils import tooltip
+import heapq
+from typing import Iterable, List
 
+from ..utils import ids_to_sql
 
-def reschedule_cards_for_tomorrow(card_ids: List[int]) -> int:
+
+def get_cards_to_reschedule(col, card_ids: Iterable[int]) -> List[int]:
     """
-    Reschedule cards to appear in tomorrow's review.
+    Filter cards down to the ones that need rescheduling, in one query.
+    
+    Cards that are already due tomorrow or sooner and cards in filtered
+    (custom study) decks are left alone.
     
     Args:
-        card_ids: List of card IDs to reschedule
+        col: The Anki collection
+        card_ids: IDs of candidate cards
         
     Returns:
-        Number of cards successfully rescheduled
+        IDs of the cards that should be rescheduled
     """
-    if not mw or not mw.col:
-        return 0
+    if not col:
+        return []
     
-    count = 0
+    card_ids = set(card_ids)
+    if not card_ids:
+        return []
+    
+    query = f"""
+    SELECT id
+    FROM cards
+    WHERE
+        id IN {ids_to_sql(card_ids)}
+        AND odid = 0
+        AND NOT (queue IN (2, 3) AND due <= ?)
+    """
+    return col.db.list(query, col.sched.today + 1)
+
+
+def get_due_histogram(col, days: int, exclude_ids: Iterable[int] = ()) -> List[int]:
+    """
+    Count the review cards due on each of the next days, in one query.
     
-    # Get the current deck
-    deck_id = mw.col.decks.current()["id"]
+    Args:
+        col: The Anki collection
+        days: Number of days, starting tomorrow
+        exclude_ids: Cards left out of the counts (e.g. the ones being moved)
+        
+    Returns:
+        Number of cards due on each day, tomorrow first
+    """
+    tomorrow = col.sched.today + 1
+    exclude_ids = list(exclude_ids)
+    exclude = f"AND id NOT IN {ids_to_sql(exclude_ids)}" if exclude_ids else ""
+    query = f"""
+    SELECT due, count()
+    FROM cards
+    WHERE
+        queue IN (2, 3)
+        AND due BETWEEN ? AND ?
+        {exclude}
+    GROUP BY due
+    """
+    loads = [0] * days
+    for due, count in col.db.all(query, tomorrow, tomorrow + days - 1):
+        loads[due - tomorrow] = count
+    return loads
+
+
+def assign_due_days(loads: List[int], count: int, daily_cap: int = 0) -> List[int]:
+    """
+    Spread cards over days with a min-heap of the days' loads.
     
-    for card_id in card_ids:
-        card = mw.col.get_card(card_id)
-        if not card:
-            continue
-            
-        # Skip cards that are already due tomorrow or sooner
-        if card.queue in (2, 3) and card.due <= mw.col.sched.today + 1:
-            # Card is already due today or tomorrow
-            continue
-            
-        # Skip cards in filtered/custom decks
-        if card.odid:
-            continue
-            
-        # Reschedule to tomorrow
-        try:
-            # Save the original deck
-            orig_did = card.did
-            
-            # Move to current deck temporarily if needed
-            if orig_did != deck_id:
-                mw.col.set_deck([card_id], deck_id)
-                
-            # Set due date to tomorrow (1 day from now)
-            card.due = mw.col.sched.today + 1
-            card.ivl = 1
-            card.queue = 2  # review queue
-            card.type = 2   # review type
-            
-            # Save changes
-            card.flush()
-            
-            # Return to original deck if changed
-            if orig_did != deck_id:
-                mw.col.set_deck([card_id], orig_did)
-                
-            count += 1
-            
-        except Exception as e:
-            # Log any errors but continue processing other cards
-            print(f"Error rescheduling card {card_id}: {e}")
+    Without a cap, each card goes to the least loaded day. With a cap,
+    each card goes to the earliest day still below the cap, and only once
+    every day has reached the cap to the least loaded day. Ties go to the
+    earlier day.
     
-    # Update UI if any cards were rescheduled
-    if count > 0:
-        mw.col.reset()
-        mw.reset()
+    Args:
+        loads: Number of cards already due on each day
+        count: Number of cards to assign
+        daily_cap: Cards per day to fill up to before using later days (0 for none)
+        
+    Returns:
+        Index of the assigned day for each card
+    """
+    def key(load: int) -> int:
+        return max(0, load + 1 - daily_cap) if daily_cap > 0 else load
     
-    return count
+    heap = [(key(load), day, load) for day, load in enumerate(loads)]
+    heapq.heapify(heap)
+    assigned = []
+    for _ in range(count):
+        _, day, load = heapq.heappop(heap)
+        assigned.append(day)
+        heapq.heappush(heap, (key(load + 1), day, load + 1))
+    return assigned
 
 
-def show_rescheduling_results(count: int) -> None:
+def reschedule_cards(col, card_ids: List[int], report=None, spread_days: int = 1, daily_cap: int = 0):
     """
-    Display a tooltip with the results of the rescheduling operation.
+    Reschedule already filtered cards for tomorrow, or spread them over
+    the next days.
+    
+    Without spreading, all cards are rescheduled by a single backend
+    operation, which Anki records as one undo step and syncs as one batch
+    of card changes. When spreading, the cards are balanced against the
+    cards already due (see assign_due_days) and moved with one operation
+    per day, merged into a single undo step. Either way every card ends up
+    with an interval of 1 day.
     
     Args:
-        count: Number of cards rescheduled
+        col: The Anki collection
+        card_ids: IDs of the cards to reschedule (see get_cards_to_reschedule)
+        report: Optional RunReport timing the operation as the "reschedule" stage
+        spread_days: Number of days, from tomorrow, the cards are spread over
+        daily_cap: Cards per day to fill up to before using later days (0 for none)
+        
+    Returns:
+        The backend's OpChanges
     """
-    if count == 0:
-        tooltip("No vocabulary dependencies needed rescheduling")
-    else:
-        tooltip(f"Boosted {count} vocabulary cards for tomorrow's review") 
\ No newline at end of file
+    if report is None:
+        return _reschedule_cards(col, card_ids, spread_days, daily_cap)
+    with report.stage("reschedule"):
+        changes = _reschedule_cards(col, card_ids, spread_days, daily_cap)
+    report.add("cards_rescheduled", len(card_ids))
+    return changes
+
+
+def _reschedule_cards(col, card_ids: List[int], spread_days: int, daily_cap: int):
+    # "1!" makes the cards due tomorrow and sets their interval to 1 day,
+    # turning new and learning cards into review cards
+    if spread_days <= 1 or len(card_ids) <= 1:
+        return col.sched.set_due_date(card_ids, "1!")
+    
+    loads = get_due_histogram(col, spread_days, card_ids)
+    by_day = {}
+    for card_id, day in zip(card_ids, assign_due_days(loads, len(card_ids), daily_cap)):
+        by_day.setdefault(day + 1, []).append(card_id)
+    
+    # Reset the intervals as without spreading, then move the cards due
+    # later without "!", which keeps their interval of 1 day
+    undo_entry = col.add_custom_undo_entry("Boost Dependencies")
+    col.sched.set_due_date(card_ids, "1!")
+    for days, ids in sorted(by_day.items()):
+        if days > 1:
+            col.sched.set_due_date(ids, str(days))
+    return col.merge_undo_entries(undo_entry)
@@ -3,26 +3,53 @@ Module for processing Anki review logs to find failed sentence cards.
 """
 
 import time
-from typing import List, Dict, Any, Set
-from aqt import mw
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
 
 
-def get_recent_review_logs(days: int = 7) -> List[Dict[str, Any]]:
+# Tag marking sentence notes
+SENTENCE_TAG = "type:sentence"
+
+
+def is_sentence_note(tags: List[str]) -> bool:
+    """
+    Check if a note's tags mark it as a sentence note.
+    
+    Args:
+        tags: List of tags
+        
+    Returns:
+        True if the tags contain the sentence tag
+    """
+    return any(tag.lower() == SENTENCE_TAG for tag in tags)
+
+
+def get_recent_review_logs(
+        col,
+        days: int = 7,
+        after_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
     """
     Fetch recent review logs from the Anki database, filtered by date.
     
     Args:
+        col: The Anki collection
         days: Number of days to look back
+        after_id: If given, only fetch review logs with a higher ID
+            (still limited to the last `days` days)
         
     Returns:
         List of review log dictionaries
     """
-    if not mw or not mw.col:
+    if not col:
         return []
     
     # Calculate timestamp from days ago
     cutoff_time = int((time.time() - (days * 86400)) * 1000)  # Convert to Anki's millisecond timestamp
     
+    # Review log IDs are timestamps, so the cursor is just a tighter cutoff
+    if after_id is not None:
+        cutoff_time = max(cutoff_time, after_id + 1)
+    
     # Query the Anki database for review logs since the cutoff date
     query = """
     SELECT id, cid, ease, type 
@@ -30,7 +57,7 @@ def get_recent_review_logs(days: int = 7) -> List[Dict[str, Any]]:
     WHERE id >= ?
     ORDER BY id DESC
     """
-    result = mw.col.db.all(query, cutoff_time)
+    result = col.db.all(query, cutoff_time)
     
     logs = []
     for log_id, card_id, ease, review_type in result:
@@ -44,7 +71,275 @@ def get_recent_review_logs(days: int = 7) -> List[Dict[str, Any]]:
     return logs
 
 
+def _window_start(days: int, after_id: Optional[int]) -> int:
+    """Get the lowest review log ID inside the scanned window"""
+    start = int((time.time() - (days * 86400)) * 1000)
+    if after_id is not None:
+        start = max(start, after_id + 1)
+    return start
+
+
+def _window_condition(days: int, after_id: Optional[int], min_usn: Optional[int]) -> Tuple[int, str]:
+    """Get the lowest scanned review log ID and an extra condition on `revlog r`"""
+    if min_usn is None or after_id is None:
+        return _window_start(days, after_id), ""
+    # Reviews behind the cursor are still read if a sync brought them in
+    return _window_start(days, None), f"AND (r.id > {int(after_id)} OR r.usn > {int(min_usn)})"
+
+
+def count_review_logs(
+        col,
+        days: int = 7,
+        after_id: Optional[int] = None,
+        min_usn: Optional[int] = None
+) -> int:
+    """
+    Count the review logs in the window scanned by iter_failed_sentence_reviews.
+    
+    Args:
+        col: The Anki collection
+        days: Number of days to look back
+        after_id: If given, only count review logs with a higher ID
+        min_usn: If given, also count review logs at or below after_id
+            with a higher update sequence number
+        
+    Returns:
+        Number of review log rows in the window
+    """
+    if not col:
+        return 0
+    
+    start, condition = _window_condition(days, after_id, min_usn)
+    return col.db.scalar(f"SELECT count() FROM revlog r WHERE r.id >= ? {condition}", start)
+
+
+def get_latest_review_log_id(col) -> Optional[int]:
+    """
+    Get the ID of the most recent review log entry.
+    
+    Args:
+        col: The Anki collection
+        
+    Returns:
+        The highest review log ID, or None if there are no reviews
+    """
+    if not col:
+        return None
+    
+    return col.db.scalar("SELECT max(id) FROM revlog")
+
+
+def get_review_log_usn(col) -> int:
+    """
+    Get the highest update sequence number of the review log.
+    
+    Reviews that arrive with a sync, and local reviews uploaded by it, get
+    a higher number than every review synced before, so the value taken
+    before a sync identifies the reviews the sync brought in.
+    
+    Args:
+        col: The Anki collection
+        
+    Returns:
+        The highest review log USN, or -1 if no review has been synced
+    """
+    if not col:
+        return -1
+    
+    usn = col.db.scalar("SELECT max(usn) FROM revlog")
+    return -1 if usn is None else usn
+
+
+def get_unsynced_review_log_ids(
+        col,
+        days: int = 7,
+        up_to_id: Optional[int] = None
+) -> List[int]:
+    """
+    Get the IDs of the local reviews that have not been synced yet.
+    
+    A sync gives the local reviews it uploads the same new USN as the
+    reviews it brings in, so the IDs taken before a sync tell the two apart.
+    
+    Args:
+        col: The Anki collection
+        days: Number of days to look back
+        up_to_id: If given, only get review logs with an ID up to this one
+        
+    Returns:
+        IDs of the unsynced review logs
+    """
+    if not col:
+        return []
+    
+    start = _window_start(days, None)
+    if up_to_id is None:
+        return col.db.list("SELECT id FROM revlog WHERE usn = -1 AND id >= ?", start)
+    return col.db.list("SELECT id FROM revlog WHERE usn = -1 AND id >= ? AND id <= ?", start, up_to_id)
+
+
+def split_review_log_window(
+        col,
+        shards: int,
+        days: int = 7,
+        after_id: Optional[int] = None,
+        min_usn: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Split the window scanned by iter_failed_sentence_reviews into ID ranges
+    holding about the same number of review log rows.
+    
+    Args:
+        col: The Anki collection
+        shards: Number of ranges wanted
+        days: Number of days to look back
+        after_id: Same as for iter_failed_sentence_reviews
+        min_usn: Same as for iter_failed_sentence_reviews
+        
+    Returns:
+        List of (first ID, end ID) ranges covering the window, in order
+    """
+    if not col:
+        return []
+    
+    start, condition = _window_condition(days, after_id, min_usn)
+    total = col.db.scalar(f"SELECT count() FROM revlog r WHERE r.id >= ? {condition}", start)
+    latest = get_latest_review_log_id(col)
+    if not total or latest is None:
+        return []
+    
+    # Boundaries at evenly spaced row offsets, found on the ID index
+    bounds = [start]
+    for shard in range(1, min(shards, total)):
+        bound = col.db.scalar(
+            f"SELECT r.id FROM revlog r WHERE r.id >= ? {condition} ORDER BY r.id LIMIT 1 OFFSET ?",
+            start, total * shard // shards
+        )
+        if bound is not None and bound > bounds[-1]:
+            bounds.append(bound)
+    bounds.append(latest + 1)
+    return list(zip(bounds, bounds[1:]))
+
+
+def iter_failed_sentence_reviews(
+        col,
+        days: int = 7,
+        after_id: Optional[int] = None,
+        skip_ids: Optional[Set[int]] = None,
+        page_size: int = 1000,
+        min_usn: Optional[int] = None,
+        id_range: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int]]:
+    """
+    Stream failed sentence card reviews straight from the database.
+    
+    The failure, sentence tag and time window filters all run in SQL on a
+    join of revlog, cards and notes, so no card or note objects are loaded
+    and passed reviews are never materialised. Rows are fetched in pages
+    ordered by review log ID to keep memory use bounded.
+    
+    Args:
+        col: The Anki collection
+        days: Number of days to look back
+        after_id: If given, only yield review logs with a higher ID
+            (still limited to the last `days` days)
+        skip_ids: Review log IDs that have already been processed
+        page_size: Number of rows fetched per query
+        min_usn: If given, also yield review logs at or below after_id
+            with a higher update sequence number, i.e. reviews brought in
+            by a sync however late (see get_review_log_usn)
+        id_range: If given, only yield review logs with first <= ID < end
+            (see split_review_log_window)
+        
+    Yields:
+        (review log ID, card ID) tuples in ascending review log ID order
+    """
+    for revlog_id, card_id, _ in _iter_sentence_reviews(
+            col, "r.ease = 1", days, after_id, skip_ids, page_size, min_usn, id_range):
+        yield revlog_id, card_id
+
+
+def iter_sentence_reviews(
+        col,
+        days: int = 7,
+        after_id: Optional[int] = None,
+        skip_ids: Optional[Set[int]] = None,
+        page_size: int = 1000,
+        min_usn: Optional[int] = None,
+        id_range: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int, int]]:
+    """
+    Stream failed and passed sentence card reviews straight from the database.
+    
+    Same as iter_failed_sentence_reviews, but passed reviews are included.
+    Manual rescheduling entries (ease 0) are not reviews and are left out.
+    
+    Args:
+        col: The Anki collection
+        days: Number of days to look back
+        after_id: Same as for iter_failed_sentence_reviews
+        skip_ids: Review log IDs that have already been processed
+        page_size: Number of rows fetched per query
+        min_usn: Same as for iter_failed_sentence_reviews
+        id_range: Same as for iter_failed_sentence_reviews
+        
+    Yields:
+        (review log ID, card ID, ease) tuples in ascending review log ID order
+    """
+    yield from _iter_sentence_reviews(
+        col, "r.ease > 0", days, after_id, skip_ids, page_size, min_usn, id_range)
+
+
+def _iter_sentence_reviews(
+        col,
+        ease_condition: str,
+        days: int,
+        after_id: Optional[int],
+        skip_ids: Optional[Set[int]],
+        page_size: int,
+        min_usn: Optional[int],
+        id_range: Optional[Tuple[int, int]]
+) -> Iterator[Tuple[int, int, int]]:
+    """Stream the sentence card reviews matching a condition on `revlog r`"""
+    if not col:
+        return
+    
+    # Same window as get_recent_review_logs; keyset pagination continues
+    # from the last ID of each page
+    start, condition = _window_condition(days, after_id, min_usn)
+    if id_range is not None:
+        start = max(start, id_range[0])
+        condition += f" AND r.id < {int(id_range[1])}"
+    last_id = start - 1
+    
+    query = f"""
+    SELECT r.id, r.cid, r.ease
+    FROM revlog r
+    JOIN cards c ON c.id = r.cid
+    JOIN notes n ON n.id = c.nid
+    WHERE
+        r.id > ?
+        AND {ease_condition}
+        AND n.tags LIKE '% type:sentence %'
+        {condition}
+    ORDER BY r.id
+    LIMIT ?
+    """
+    
+    while True:
+        rows = col.db.all(query, last_id, page_size)
+        for revlog_id, card_id, ease in rows:
+            if skip_ids and revlog_id in skip_ids:
+                continue
+            yield revlog_id, card_id, ease
+        
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+
 def find_failed_sentence_cards(
+        col,
         logs: List[Dict[str, Any]],
         processed_ids: Set[int]
 ) -> List[int]:
@@ -52,6 +347,7 @@ def find_failed_sentence_cards(
     Filter review logs for failed sentence cards.
     
     Args:
+        col: The Anki collection
         logs: List of review log entries
         processed_ids: Set of review IDs that have already been processed
         
@@ -71,7 +367,7 @@ def find_failed_sentence_cards(
         
         try:
             # Get the card from the database
-            card = mw.col.get_card(log["card_id"])
+            card = col.get_card(log["card_id"])
             if not card:
                 continue
             
@@ -0,0 +1,379 @@
+"""
+Module for analysing very large collections in parallel.
+
+The collection is copied into a read-only snapshot with `VACUUM INTO`.
+The review log window is split into shards of about the same number of
+rows, and each shard's failed sentences and their dependencies are found
+in a process pool, on its own read-only connection to the snapshot. The
+merged dependencies are filtered and ranked as in a serial run, so only
+the short write phase goes through the live collection.
+
+Process pools are only used in headless runs such as the command-line
+runner (see can_start_worker_processes), and not every build can start
+them; the shards are otherwise analysed one after another in this
+process. The same happens when a provider registered by another add-on
+is configured, as worker processes only know the built-in providers.
+"""
+
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.request import pathname2url
+
+from ..utils import advance_revlog_cursor, can_start_worker_processes
+from .instrumentation import InstrumentedCollection, RunReport
+from .pipeline import (
+    BoostCancelled, find_dependencies, get_tolerance_ms, score_dependencies, select_boost_targets,
+    uses_struggle_scores
+)
+from .providers import prepare_providers, uses_builtin_providers_only
+from .review_log import (
+    count_review_logs, get_latest_review_log_id, iter_failed_sentence_reviews, iter_sentence_reviews,
+    split_review_log_window
+)
+from .state import get_state_dir, get_state_path, set_state_dir
+
+
+SNAPSHOT_FILENAME = "snapshot.anki2"
+
+# Seconds between cancel checks while waiting for the shards
+POLL_INTERVAL = 0.2
+
+
+class SnapshotDB:
+    """Read-only subset of Anki's DBProxy on top of a sqlite3 connection"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def all(self, sql: str, *args) -> List[Any]:
+        return self.conn.execute(sql, args).fetchall()
+
+    def list(self, sql: str, *args) -> List[Any]:
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def first(self, sql: str, *args) -> Optional[Any]:
+        return self.conn.execute(sql, args).fetchone()
+
+    def scalar(self, sql: str, *args) -> Any:
+        row = self.conn.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+
+class SnapshotModels:
+    """Notetype lookups from the snapshot's fields table"""
+
+    def __init__(self, db: SnapshotDB):
+        self.db = db
+
+    def get(self, mid: int) -> Optional[Dict[str, Any]]:
+        try:
+            rows = self.db.all("SELECT name, ord FROM fields WHERE ntid = ? ORDER BY ord", mid)
+        except sqlite3.OperationalError:
+            return None
+        if not rows:
+            return None
+        return {"id": mid, "flds": [{"name": name, "ord": ord} for name, ord in rows]}
+
+
+class SnapshotScheduler:
+    """Scheduler exposing the live collection's `today`"""
+
+    def __init__(self, today: int):
+        self.today = today
+
+
+class SnapshotCollection:
+    """
+    Read-only collection on a snapshot file, with the parts of the
+    collection the analysis uses.
+
+    Args:
+        path: Path of the snapshot
+        today: The live collection's scheduler day
+    """
+
+    def __init__(self, path: str, today: int):
+        # immutable: the snapshot never changes, so SQLite skips all locking
+        self.conn = sqlite3.connect(
+            f"file:{pathname2url(os.path.abspath(path))}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False
+        )
+        self.db = SnapshotDB(self.conn)
+        self.models = SnapshotModels(self.db)
+        self.sched = SnapshotScheduler(today)
+
+    @property
+    def mod(self) -> int:
+        return self.db.scalar("SELECT mod FROM col")
+
+    def usn(self) -> int:
+        return self.db.scalar("SELECT usn FROM col")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def create_snapshot(col, path: str) -> None:
+    """
+    Copy the collection into a compact, consistent snapshot file.
+
+    Args:
+        col: The live collection
+        path: Path of the snapshot (replaced if it exists)
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    col.db.execute("VACUUM INTO ?", path)
+
+
+def prepare_indexes(col, config: Dict[str, Any], report: Optional[RunReport] = None) -> None:
+    """
+    Bring the persisted indexes of the configured dependency providers up
+    to date, so the shards only load them.
+
+    Args:
+        col: The snapshot collection
+        config: Add-on configuration
+        report: Optional RunReport warned about unknown provider names
+    """
+    prepare_providers(col, config, report)
+
+
+def analyse_shard(
+        path: str,
+        today: int,
+        state_dir: str,
+        config: Dict[str, Any],
+        after_id: Optional[int],
+        min_usn: Optional[int],
+        skip_ids: Set[int],
+        id_range: Tuple[int, int],
+        with_passed: bool = False,
+        ledger: Optional[Dict[int, int]] = None
+) -> Dict[str, Any]:
+    """
+    Find the failed sentence reviews of one shard and their dependencies.
+
+    Runs in a worker process, so it only takes and returns plain values.
+
+    Args:
+        path: Path of the snapshot
+        today: The live collection's scheduler day
+        state_dir: Directory of the persisted indexes
+        config: Add-on configuration
+        after_id: Lowest review log ID past the cursor (see iter_failed_sentence_reviews)
+        min_usn: Review log USN taken before a sync, if any
+        skip_ids: Processed review log IDs inside the shard
+        id_range: (first ID, end ID) of the shard
+        with_passed: Also read the passed sentence reviews, for the
+            struggle scores
+        ledger: Optional boost ledger (see find_dependencies)
+
+    Returns:
+        Dictionary with the read review log IDs ("revlog_ids"), the
+        reviews read ("reviews", only with_passed), failed sentence cards
+        ("failed_cards"), dependencies ("deps") and the shard's report
+        counters ("counters")
+    """
+    if get_state_dir() != state_dir:
+        set_state_dir(state_dir)
+    report = RunReport()
+    col = SnapshotCollection(path, today)
+    try:
+        window = dict(
+            days=config.get("days_to_check", 7), after_id=after_id,
+            skip_ids=skip_ids, min_usn=min_usn, id_range=id_range
+        )
+        if with_passed:
+            reviews = list(iter_sentence_reviews(col, **window))
+            revlog_ids = [revlog_id for revlog_id, _, _ in reviews]
+            failed_cards = {card_id for _, card_id, ease in reviews if ease == 1}
+        else:
+            reviews = []
+            revlog_ids = []
+            failed_cards = set()
+            for revlog_id, card_id in iter_failed_sentence_reviews(col, **window):
+                revlog_ids.append(revlog_id)
+                failed_cards.add(card_id)
+        deps = find_dependencies(col, config, failed_cards, report, ledger) if failed_cards else []
+    finally:
+        col.close()
+    return {
+        "revlog_ids": revlog_ids,
+        "reviews": reviews,
+        "failed_cards": sorted(failed_cards),
+        "deps": list(deps),
+        "counters": report.counters,
+    }
+
+
+def _run_shards(
+        shard_args: List[tuple],
+        workers: int,
+        check_cancel: Callable[[], None],
+        progress: Callable[[str], None],
+        use_pool: bool = True
+) -> List[Dict[str, Any]]:
+    """Analyse all shards in a process pool, or in this process if no pool can be used"""
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    results = []
+    pool = None
+    if use_pool and can_start_worker_processes():
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers)
+        except Exception as e:
+            print(f"Analysing shards in this process instead of a pool: {e}")
+
+    if pool is not None:
+        try:
+            pending = {pool.submit(analyse_shard, *args) for args in shard_args}
+            while pending:
+                done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+                progress(f"Analysing review history... {len(results)}/{len(shard_args)} shards")
+                check_cancel()
+            return results
+        except BoostCancelled:
+            raise
+        except Exception as e:
+            # e.g. a broken pool when worker processes can't start
+            print(f"Analysing shards in this process instead of a pool: {e}")
+            results = []
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    for args in shard_args:
+        results.append(analyse_shard(*args))
+        progress(f"Analysing review history... {len(results)}/{len(shard_args)} shards")
+        check_cancel()
+    return results
+
+
+def analyse_failed_reviews_parallel(
+        col,
+        config: Dict[str, Any],
+        state: Dict[str, Any],
+        workers: int,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        report: Optional[RunReport] = None,
+        min_usn: Optional[int] = None,
+        ledger: Optional[Dict[int, int]] = None,
+        scores: Optional[Dict[int, Tuple[float, int]]] = None
+) -> Dict[str, Any]:
+    """
+    Same analysis as analyse_failed_reviews, on a snapshot in parallel.
+
+    Args:
+        col: The live collection (only used to create the snapshot)
+        config: Add-on configuration
+        state: Review log cursor state ({"cursor": ..., "recent": ...})
+        workers: Number of worker processes
+        should_cancel: Polled regularly; the run is aborted when it returns True
+        on_progress: Called with a short status message as the analysis advances
+        report: Optional RunReport recording per-stage timings and counters
+        min_usn: Review log USN taken before a sync (see get_review_log_usn)
+        ledger: Optional boost ledger (see core.ledger)
+        scores: Optional struggle scores (see core.struggle), updated in place
+
+    Returns:
+        Same dictionary as analyse_failed_reviews
+
+    Raises:
+        BoostCancelled: If should_cancel returned True
+    """
+    def check_cancel() -> None:
+        if should_cancel and should_cancel():
+            raise BoostCancelled()
+
+    def progress(message: str) -> None:
+        if on_progress:
+            on_progress(message)
+
+    if report is None:
+        report = RunReport()
+
+    days = config.get("days_to_check", 7)
+    tolerance_ms = get_tolerance_ms(config)
+    after_id = None
+    if state["cursor"] is not None:
+        after_id = state["cursor"] - tolerance_ms
+    scoring = scores is not None and uses_struggle_scores(config)
+
+    progress("Creating a snapshot of the collection...")
+    path = get_state_path(SNAPSHOT_FILENAME)
+    today = col.sched.today
+    with report.stage("snapshot"):
+        create_snapshot(col, path)
+    check_cancel()
+
+    snapshot = SnapshotCollection(path, today)
+    try:
+        instrumented = InstrumentedCollection(snapshot, report)
+        with report.stage("prepare_indexes"):
+            prepare_indexes(snapshot, config, report)
+        check_cancel()
+
+        with report.stage("scan_reviews"):
+            scanned_until = get_latest_review_log_id(instrumented)
+            report.add("revlog_rows_scanned", count_review_logs(
+                instrumented, days=days, after_id=after_id, min_usn=min_usn))
+            shards = split_review_log_window(instrumented, workers, days, after_id, min_usn)
+
+        shard_args = [
+            (path, today, get_state_dir(), config, after_id, min_usn,
+             {i for i in state["recent"] if first <= i < end}, (first, end), scoring, ledger)
+            for first, end in shards
+        ]
+        report.add("shards", len(shard_args))
+        with report.stage("analyse_shards"):
+            results = _run_shards(shard_args, workers, check_cancel, progress, uses_builtin_providers_only(config))
+
+        # Merge the shards
+        processed_revlog_ids = []
+        reviews = []
+        failed_cards = set()
+        deps = set()
+        for result in results:
+            processed_revlog_ids.extend(result["revlog_ids"])
+            reviews.extend(result["reviews"])
+            failed_cards.update(result["failed_cards"])
+            deps.update(result["deps"])
+            for counter, amount in result["counters"].items():
+                report.add(counter, amount)
+        report.add("sentences_matched", len(failed_cards))
+        # Shards overlap in the dependencies they find
+        report.counters["dependencies_found"] = len(deps)
+
+        cursor, recent = advance_revlog_cursor(
+            state["cursor"], state["recent"], processed_revlog_ids, tolerance_ms,
+            scanned_until=scanned_until
+        )
+
+        if scoring:
+            progress(f"Scoring vocabulary for {len(reviews)} sentence reviews...")
+            reviews.sort()
+            score_dependencies(instrumented, config, reviews, scores, report)
+            check_cancel()
+
+        card_ids = select_boost_targets(instrumented, config, deps, report, scores if scoring else None)
+        check_cancel()
+    finally:
+        snapshot.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    result = {
+        "card_ids": card_ids,
+        "failed_cards": sorted(failed_cards),
+        "failed_count": len(failed_cards),
+        "cursor_state": {"cursor": cursor, "recent": recent},
+    }
+    if scoring:
+        result["struggle_scores"] = scores
+    return result
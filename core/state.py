@@ -0,0 +1,754 @@
+"""
+Module for the add-on's persistent state.
+
+All state (review log cursor, run reports, boost statistics, the boost
+ledger, struggle scores and small values such as the last boost time) is
+held by one StateStore, which reads each file once, keeps changes in
+memory and writes them together when flushed. Files are written to a
+temporary file and renamed over the old one, so a crash never leaves a
+half-written file behind.
+
+Each collection has its own state directory (see
+get_collection_state_dir), so the cursor, ledger and indexes of
+different profiles never mix: inside Anki it is switched whenever a
+profile is opened, and the command-line runner sets it per collection it
+boosts. Boost runs hold a lock file in the state directory (see
+FileLock), and reload the store once they have it, so processes sharing
+a state directory never overwrite each other's changes.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Anki keeps this folder when the add-on is updated
+USER_FILES_DIR = os.path.join(ADDON_DIR, "user_files")
+
+CURSOR_FILENAME = "revlog_cursor.bin"
+LEGACY_CURSOR_FILENAME = "revlog_cursor.json"
+RUN_REPORTS_FILENAME = "run_reports.json"
+STATS_FILENAME = "boost_stats.json"
+LEDGER_FILENAME = "boost_ledger.bin"
+STRUGGLE_FILENAME = "struggle_scores.bin"
+LOCK_FILENAME = "run.lock"
+VALUES_FILENAME = "state.json"
+
+# Files of the store that earlier versions kept in the add-on directory,
+# shared by all profiles
+SHARED_STATE_FILENAMES = (
+    CURSOR_FILENAME, LEGACY_CURSOR_FILENAME, RUN_REPORTS_FILENAME, STATS_FILENAME,
+    LEDGER_FILENAME, STRUGGLE_FILENAME, VALUES_FILENAME,
+)
+
+# Header of the binary cursor file, followed by the format version
+CURSOR_MAGIC = b"DBRC"
+CURSOR_VERSION = 1
+
+# Header of the binary boost ledger file, followed by the format version
+LEDGER_MAGIC = b"DBBL"
+LEDGER_VERSION = 1
+
+# Header of the binary struggle score file, followed by the format version
+STRUGGLE_MAGIC = b"DBSS"
+STRUGGLE_VERSION = 1
+
+_state_dir = ADDON_DIR
+
+
+def get_state_dir() -> str:
+    """Get the directory the state files are kept in"""
+    return _state_dir
+
+
+def set_state_dir(path: str) -> None:
+    """
+    Keep the state files in another directory, creating it if needed.
+
+    Args:
+        path: The new state directory
+    """
+    global _state_dir
+    os.makedirs(path, exist_ok=True)
+    _state_dir = path
+
+
+def get_collection_state_dir(base_dir: str, collection_path: str) -> str:
+    """
+    Get the state directory of a collection.
+
+    Directories are named after the profile folder, plus a hash of the
+    collection's full path so profiles of different users never share one.
+
+    Args:
+        base_dir: Directory holding the state of all collections
+        collection_path: Path of the collection file
+
+    Returns:
+        Path of the collection's state directory
+    """
+    collection_path = os.path.abspath(collection_path)
+    profile = os.path.basename(os.path.dirname(collection_path))
+    digest = hashlib.sha1(collection_path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(base_dir, f"{profile}-{digest}")
+
+
+def use_profile_state_dir(collection_path: str) -> None:
+    """
+    Keep the state files in the state directory of an Anki profile's collection.
+
+    The first time a profile's directory is created, the state files
+    earlier versions shared between all profiles are moved into it, so
+    the profile used so far keeps its cursor; other profiles start with
+    fresh state.
+
+    Args:
+        collection_path: Path of the profile's collection file
+    """
+    state_dir = get_collection_state_dir(USER_FILES_DIR, collection_path)
+    if not os.path.exists(state_dir):
+        os.makedirs(state_dir)
+        for filename in SHARED_STATE_FILENAMES:
+            shared_path = os.path.join(ADDON_DIR, filename)
+            if os.path.exists(shared_path):
+                try:
+                    os.replace(shared_path, os.path.join(state_dir, filename))
+                except OSError as e:
+                    print(f"Error moving {filename} to the profile's state: {e}")
+    set_state_dir(state_dir)
+
+
+def get_state_path(filename: str) -> str:
+    """
+    Get the path of a state file.
+
+    Args:
+        filename: Name of the state file
+
+    Returns:
+        Path of the file in the current state directory
+    """
+    return os.path.join(_state_dir, filename)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Iterator[IO]:
+    """
+    Open a file for writing so that it is replaced in one step.
+
+    The content is written to a temporary file next to it, which is
+    renamed over the original once it is complete.
+
+    Args:
+        path: Path of the file to write
+        mode: "w" for text or "wb" for binary content
+    """
+    tmp_path = f"{path}.tmp"
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, shared with other processes.
+
+    Uses flock() on POSIX systems and msvcrt.locking() on Windows. The
+    operating system releases the lock if the process dies, so a crash
+    never leaves a stale lock behind.
+
+    Args:
+        path: Path of the lock file (created if needed)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[IO] = None
+
+    def acquire(self) -> bool:
+        """
+        Take the lock without waiting.
+
+        Returns:
+            True if the lock was taken, False if another process (or
+            another FileLock of this process) holds it
+        """
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self) -> None:
+        """Release the lock if it is held"""
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+# Compact ID encoding
+#####################
+
+def _write_varint(out: bytearray, value: int) -> None:
+    """Append a non-negative integer as an LEB128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read an LEB128 varint, returning (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_ids(ids: Iterable[int]) -> bytes:
+    """
+    Encode IDs as varint deltas between the sorted values.
+
+    Review log IDs within the tolerance window are close together, so
+    most deltas fit in two or three bytes instead of 13 JSON characters.
+
+    Args:
+        ids: Non-negative integer IDs
+
+    Returns:
+        The encoded IDs
+    """
+    out = bytearray()
+    values = sorted(set(ids))
+    _write_varint(out, len(values))
+    previous = 0
+    for value in values:
+        _write_varint(out, value - previous)
+        previous = value
+    return bytes(out)
+
+
+def decode_ids(data: bytes, pos: int = 0) -> List[int]:
+    """
+    Decode IDs encoded by encode_ids.
+
+    Args:
+        data: The encoded bytes
+        pos: Position of the encoded IDs in data
+
+    Returns:
+        Sorted list of IDs
+    """
+    return _read_ids(data, pos)[0]
+
+
+def _read_ids(data: bytes, pos: int) -> Tuple[List[int], int]:
+    """Read IDs encoded by encode_ids, returning (IDs, next position)"""
+    count, pos = _read_varint(data, pos)
+    ids = []
+    value = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        value += delta
+        ids.append(value)
+    return ids, pos
+
+
+def encode_revlog_cursor(state: Dict[str, Any]) -> bytes:
+    """
+    Encode a cursor state ({"cursor": ..., "recent": ...}) for the cursor file.
+
+    Args:
+        state: The cursor state
+
+    Returns:
+        The file content
+    """
+    out = bytearray(CURSOR_MAGIC)
+    out.append(CURSOR_VERSION)
+    # 0 means no cursor yet
+    cursor = state["cursor"]
+    _write_varint(out, 0 if cursor is None else cursor + 1)
+    return bytes(out) + encode_ids(state["recent"])
+
+
+def decode_revlog_cursor(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Decode the content of a cursor file.
+
+    Args:
+        data: The file content
+
+    Returns:
+        The cursor state, or None if the content is not a known format
+    """
+    header = len(CURSOR_MAGIC) + 1
+    if data[:len(CURSOR_MAGIC)] != CURSOR_MAGIC or len(data) <= header or data[header - 1] != CURSOR_VERSION:
+        return None
+    try:
+        cursor, pos = _read_varint(data, header)
+        recent = decode_ids(data, pos)
+    except IndexError:
+        return None
+    return {"cursor": cursor - 1 if cursor else None, "recent": set(recent)}
+
+
+def encode_boost_ledger(ledger: Dict[int, int]) -> bytes:
+    """
+    Encode a boost ledger ({card ID: day of the boost}) for the ledger file.
+
+    The card IDs are encoded by encode_ids, followed by each card's day
+    in the same order.
+
+    Args:
+        ledger: The boost ledger
+
+    Returns:
+        The file content
+    """
+    out = bytearray(LEDGER_MAGIC)
+    out.append(LEDGER_VERSION)
+    out += encode_ids(ledger)
+    for card_id in sorted(ledger):
+        _write_varint(out, ledger[card_id])
+    return bytes(out)
+
+
+def decode_boost_ledger(data: bytes) -> Dict[int, int]:
+    """
+    Decode the content of a ledger file.
+
+    Args:
+        data: The file content
+
+    Returns:
+        The boost ledger, empty if the content is not a known format
+    """
+    header = len(LEDGER_MAGIC) + 1
+    if data[:len(LEDGER_MAGIC)] != LEDGER_MAGIC or len(data) <= header or data[header - 1] != LEDGER_VERSION:
+        return {}
+    try:
+        card_ids, pos = _read_ids(data, header)
+        ledger = {}
+        for card_id in card_ids:
+            ledger[card_id], pos = _read_varint(data, pos)
+    except IndexError:
+        return {}
+    return ledger
+
+
+def encode_struggle_scores(scores: Dict[int, Tuple[float, int]]) -> bytes:
+    """
+    Encode struggle scores ({card ID: (score, update time)}) for the score file.
+
+    The card IDs are encoded by encode_ids, followed by each card's score
+    as a 32-bit float and its update time (seconds) as a varint.
+
+    Args:
+        scores: The struggle scores
+
+    Returns:
+        The file content
+    """
+    out = bytearray(STRUGGLE_MAGIC)
+    out.append(STRUGGLE_VERSION)
+    out += encode_ids(scores)
+    for card_id in sorted(scores):
+        score, updated = scores[card_id]
+        out += struct.pack("<f", score)
+        _write_varint(out, updated)
+    return bytes(out)
+
+
+def decode_struggle_scores(data: bytes) -> Dict[int, Tuple[float, int]]:
+    """
+    Decode the content of a struggle score file.
+
+    Args:
+        data: The file content
+
+    Returns:
+        The struggle scores, empty if the content is not a known format
+    """
+    header = len(STRUGGLE_MAGIC) + 1
+    if data[:len(STRUGGLE_MAGIC)] != STRUGGLE_MAGIC or len(data) <= header or data[header - 1] != STRUGGLE_VERSION:
+        return {}
+    try:
+        card_ids, pos = _read_ids(data, header)
+        scores = {}
+        for card_id in card_ids:
+            score, = struct.unpack_from("<f", data, pos)
+            updated, pos = _read_varint(data, pos + 4)
+            scores[card_id] = (score, updated)
+    except (IndexError, struct.error):
+        return {}
+    return scores
+
+
+# State store
+#############
+
+class StateStore:
+    """
+    In-memory copy of the state files of one state directory.
+
+    Each file is read on first access. Changes only mark the file dirty;
+    flush() writes all dirty files, so several changes in a row cost one
+    write per file.
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        self._lock = threading.RLock()
+        self._cursor: Optional[Dict[str, Any]] = None
+        self._cursor_loaded = False
+        self._reports: Optional[List[Dict[str, Any]]] = None
+        self._stats: Optional[Dict[str, Any]] = None
+        self._ledger: Optional[Dict[int, int]] = None
+        self._scores: Optional[Dict[int, Tuple[float, int]]] = None
+        self._values: Optional[Dict[str, Any]] = None
+        self._dirty = set()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.state_dir, filename)
+
+    # Review log cursor
+
+    def get_revlog_cursor(self) -> Optional[Dict[str, Any]]:
+        """
+        Get a copy of the review log cursor.
+
+        Returns:
+            The cursor state ({"cursor": ..., "recent": ...}), or None if
+            no cursor has been saved yet
+        """
+        with self._lock:
+            if not self._cursor_loaded:
+                self._cursor = self._load_revlog_cursor()
+                self._cursor_loaded = True
+            if self._cursor is None:
+                return None
+            return {"cursor": self._cursor["cursor"], "recent": set(self._cursor["recent"])}
+
+    def set_revlog_cursor(self, state: Dict[str, Any]) -> None:
+        """
+        Replace the review log cursor.
+
+        Args:
+            state: The cursor state ({"cursor": ..., "recent": ...})
+        """
+        with self._lock:
+            self._cursor = {"cursor": state["cursor"], "recent": set(state["recent"])}
+            self._cursor_loaded = True
+            self._dirty.add(CURSOR_FILENAME)
+
+    def mark_processed(self, revlog_ids: Iterable[int]) -> None:
+        """
+        Add review log IDs to the cursor's processed window without moving
+        the cursor.
+
+        Args:
+            revlog_ids: IDs of the processed reviews
+        """
+        with self._lock:
+            state = self.get_revlog_cursor() or {"cursor": None, "recent": set()}
+            state["recent"].update(revlog_ids)
+            self.set_revlog_cursor(state)
+
+    def clear_revlog_cursor(self) -> None:
+        """Forget the review log cursor, so all reviews are processed again"""
+        with self._lock:
+            self._cursor = None
+            self._cursor_loaded = True
+            self._dirty.add(CURSOR_FILENAME)
+
+    def _load_revlog_cursor(self) -> Optional[Dict[str, Any]]:
+        """Read the cursor file, or the JSON file used by earlier versions"""
+        path = self._path(CURSOR_FILENAME)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return decode_revlog_cursor(f.read())
+            except IOError:
+                return None
+
+        legacy_path = self._path(LEGACY_CURSOR_FILENAME)
+        if os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, "r") as f:
+                    state = json.load(f)
+                # Rewritten in the binary format on the next flush
+                self._dirty.add(CURSOR_FILENAME)
+                return {"cursor": state.get("cursor"), "recent": set(state.get("recent", []))}
+            except (json.JSONDecodeError, IOError, TypeError, AttributeError):
+                return None
+        return None
+
+    # Run reports
+
+    def get_run_reports(self) -> List[Dict[str, Any]]:
+        """Get the reports of the most recent boost runs, oldest first"""
+        with self._lock:
+            if self._reports is None:
+                self._reports = self._load_json(RUN_REPORTS_FILENAME, list)
+            return list(self._reports)
+
+    def add_run_report(self, report: Dict[str, Any], max_reports: int = 20) -> None:
+        """
+        Append a serialised run report, keeping the last N runs.
+
+        Args:
+            report: Dictionary produced by RunReport.to_dict
+            max_reports: Number of reports to keep
+        """
+        with self._lock:
+            self._reports = (self.get_run_reports() + [report])[-max_reports:]
+            self._dirty.add(RUN_REPORTS_FILENAME)
+
+    # Boost statistics
+
+    def get_boost_stats(self) -> Dict[str, Any]:
+        """Get a copy of the boost statistics (see core.stats), empty if none were saved"""
+        with self._lock:
+            if self._stats is None:
+                self._stats = self._load_json(STATS_FILENAME, dict)
+            return copy.deepcopy(self._stats)
+
+    def set_boost_stats(self, stats: Dict[str, Any]) -> None:
+        """
+        Replace the boost statistics.
+
+        Args:
+            stats: JSON-compatible statistics
+        """
+        with self._lock:
+            self._stats = stats
+            self._dirty.add(STATS_FILENAME)
+
+    # Boost ledger
+
+    def get_boost_ledger(self) -> Dict[int, int]:
+        """Get a copy of the boost ledger (see core.ledger), empty if none was saved"""
+        with self._lock:
+            if self._ledger is None:
+                self._ledger = {}
+                path = self._path(LEDGER_FILENAME)
+                if os.path.exists(path):
+                    try:
+                        with open(path, "rb") as f:
+                            self._ledger = decode_boost_ledger(f.read())
+                    except IOError:
+                        pass
+            return dict(self._ledger)
+
+    def set_boost_ledger(self, ledger: Dict[int, int]) -> None:
+        """
+        Replace the boost ledger.
+
+        Args:
+            ledger: Day of the last boost of each card ({card ID: day})
+        """
+        with self._lock:
+            self._ledger = dict(ledger)
+            self._dirty.add(LEDGER_FILENAME)
+
+    # Struggle scores
+
+    def get_struggle_scores(self) -> Dict[int, Tuple[float, int]]:
+        """Get a copy of the struggle scores (see core.struggle), empty if none were saved"""
+        with self._lock:
+            if self._scores is None:
+                self._scores = {}
+                path = self._path(STRUGGLE_FILENAME)
+                if os.path.exists(path):
+                    try:
+                        with open(path, "rb") as f:
+                            self._scores = decode_struggle_scores(f.read())
+                    except IOError:
+                        pass
+            return dict(self._scores)
+
+    def set_struggle_scores(self, scores: Dict[int, Tuple[float, int]]) -> None:
+        """
+        Replace the struggle scores.
+
+        Args:
+            scores: Score and update time of each card ({card ID: (score, seconds)})
+        """
+        with self._lock:
+            self._scores = dict(scores)
+            self._dirty.add(STRUGGLE_FILENAME)
+
+    # Other values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a stored value (e.g. "last_boost_time").
+
+        Args:
+            key: Name of the value
+            default: Returned if the value was never set
+        """
+        with self._lock:
+            if self._values is None:
+                self._values = self._load_json(VALUES_FILENAME, dict)
+            return self._values.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a JSON-compatible value.
+
+        Args:
+            key: Name of the value
+            value: The value
+        """
+        with self._lock:
+            if self.get(key) == value and key in self._values:
+                return
+            self._values[key] = value
+            self._dirty.add(VALUES_FILENAME)
+
+    def _load_json(self, filename: str, kind: type) -> Any:
+        """Read a JSON state file, or an empty value of the given type"""
+        path = self._path(filename)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, kind):
+                    return data
+            except (json.JSONDecodeError, IOError):
+                pass
+        return kind()
+
+    # Persistence
+
+    def reload(self) -> None:
+        """
+        Forget the cached copies of files without unsaved changes, so they
+        are read again with any changes made by other processes.
+        """
+        with self._lock:
+            if CURSOR_FILENAME not in self._dirty:
+                self._cursor = None
+                self._cursor_loaded = False
+            if RUN_REPORTS_FILENAME not in self._dirty:
+                self._reports = None
+            if VALUES_FILENAME not in self._dirty:
+                self._values = None
+            if STATS_FILENAME not in self._dirty:
+                self._stats = None
+            if LEDGER_FILENAME not in self._dirty:
+                self._ledger = None
+            if STRUGGLE_FILENAME not in self._dirty:
+                self._scores = None
+
+    def is_dirty(self) -> bool:
+        """Check if there are changes that have not been written yet"""
+        return bool(self._dirty)
+
+    def flush(self) -> None:
+        """
+        Write all changed state files.
+
+        Raises:
+            IOError: If a file could not be written. Files not written stay
+                dirty, so the next flush retries them.
+        """
+        with self._lock:
+            os.makedirs(self.state_dir, exist_ok=True)
+            for filename in sorted(self._dirty):
+                if filename == CURSOR_FILENAME:
+                    self._write_revlog_cursor()
+                elif filename == RUN_REPORTS_FILENAME:
+                    with atomic_write(self._path(filename)) as f:
+                        json.dump(self._reports, f)
+                elif filename == VALUES_FILENAME:
+                    with atomic_write(self._path(filename)) as f:
+                        json.dump(self._values, f)
+                elif filename == STATS_FILENAME:
+                    with atomic_write(self._path(filename)) as f:
+                        json.dump(self._stats, f)
+                elif filename == LEDGER_FILENAME:
+                    with atomic_write(self._path(filename), "wb") as f:
+                        f.write(encode_boost_ledger(self._ledger))
+                elif filename == STRUGGLE_FILENAME:
+                    with atomic_write(self._path(filename), "wb") as f:
+                        f.write(encode_struggle_scores(self._scores))
+                self._dirty.discard(filename)
+
+    def _write_revlog_cursor(self) -> None:
+        """Write (or remove) the cursor file, dropping the legacy JSON file"""
+        path = self._path(CURSOR_FILENAME)
+        if self._cursor is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            with atomic_write(path, "wb") as f:
+                f.write(encode_revlog_cursor(self._cursor))
+
+        legacy_path = self._path(LEGACY_CURSOR_FILENAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+
+_store: Optional[StateStore] = None
+
+
+def get_store() -> StateStore:
+    """
+    Get the state store of the current state directory.
+
+    A store with unsaved changes is flushed before switching to another
+    state directory.
+
+    Returns:
+        The state store
+    """
+    global _store
+    if _store is None or _store.state_dir != _state_dir:
+        if _store is not None and _store.is_dirty():
+            _store.flush()
+        _store = StateStore(_state_dir)
+    return _store
@@ -0,0 +1,215 @@
+"""
+Module for measuring whether boosting helps.
+
+Every boosted vocabulary card, and every failed sentence card that caused
+a boost, waits for its next review. The outcome of that review (passed or
+failed) is added to counts per card, per group and overall. An update
+only reads the review log rows added since the previous update, for the
+cards still waiting, so the counts are never recomputed from the whole
+history and the statistics view renders straight from them.
+
+The statistics are a JSON-compatible dictionary kept by the state store:
+
+    {
+        "version": 1,
+        "cursor": highest review log ID read, or None,
+        "pending": {card ID: [boost time (ms), "vocab" or "sentence"]},
+        "totals": counts,
+        "groups": {group: counts},
+        "cards": {card ID: counts},
+    }
+"""
+
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from ..utils import ids_to_sql
+from .detection import extract_group_tags
+
+
+STATS_VERSION = 1
+
+# Boosts whose cards are not reviewed within this many days stop waiting
+PENDING_EXPIRY_DAYS = 60
+
+COUNT_KEYS = ("boosts", "vocab_reviews", "vocab_passed", "sentence_reviews", "sentence_passed", "expired")
+
+
+def _new_counts() -> Dict[str, int]:
+    return {key: 0 for key in COUNT_KEYS}
+
+
+def load_stats(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Get statistics in the current format, starting over if the data is
+    missing or from another version.
+
+    Args:
+        data: Statistics read from the state store
+
+    Returns:
+        The statistics
+    """
+    if not data or data.get("version") != STATS_VERSION:
+        return {
+            "version": STATS_VERSION,
+            "cursor": None,
+            "pending": {},
+            "totals": _new_counts(),
+            "groups": {},
+            "cards": {},
+        }
+    return data
+
+
+def _add(counts: Dict[str, Dict[str, int]], key: str, field: str, amount: int = 1) -> None:
+    entry = counts.get(key)
+    if entry is None:
+        entry = counts[key] = _new_counts()
+    entry[field] += amount
+
+
+def record_boosts(
+        stats: Dict[str, Any],
+        card_ids: Iterable[int],
+        sentence_ids: Iterable[int],
+        boosted_at: Optional[int] = None
+) -> None:
+    """
+    Start waiting for the next reviews of a boost run's cards.
+
+    Args:
+        stats: The statistics, updated in place
+        card_ids: IDs of the rescheduled vocabulary cards
+        sentence_ids: IDs of the failed sentence cards that caused the boost
+        boosted_at: Time of the boost in milliseconds (defaults to now)
+    """
+    if boosted_at is None:
+        boosted_at = int(time.time() * 1000)
+    pending = stats["pending"]
+
+    card_ids = list(card_ids)
+    for card_id in card_ids:
+        pending[str(card_id)] = [boosted_at, "vocab"]
+        _add(stats["cards"], str(card_id), "boosts")
+    stats["totals"]["boosts"] += len(card_ids)
+
+    if card_ids:
+        for card_id in sentence_ids:
+            pending[str(card_id)] = [boosted_at, "sentence"]
+
+
+def update_stats(col, stats: Dict[str, Any], tolerance_ms: int = 0, now: Optional[float] = None) -> int:
+    """
+    Add the next reviews of waiting cards to the counts.
+
+    Only review log rows past the cursor (minus the late-sync tolerance
+    window) are read, through the card ID index. Manual rescheduling
+    entries (ease 0), such as the boost itself, are not reviews.
+
+    Args:
+        col: The Anki collection
+        stats: The statistics, updated in place
+        tolerance_ms: Width of the window below the cursor in which
+            late-synced reviews may still show up
+        now: Current time in seconds (defaults to the clock)
+
+    Returns:
+        Number of waiting cards whose next review was counted
+    """
+    now = time.time() if now is None else now
+    pending = stats["pending"]
+    latest = col.db.scalar("SELECT max(id) FROM revlog")
+
+    outcomes: Dict[int, bool] = {}
+    if pending:
+        after_id = min(boosted_at for boosted_at, _ in pending.values())
+        if stats["cursor"] is not None:
+            after_id = max(after_id, stats["cursor"] - tolerance_ms)
+        rows = col.db.all(f"""
+            SELECT id, cid, ease
+            FROM revlog
+            WHERE cid IN {ids_to_sql(int(card_id) for card_id in pending)}
+                AND id > ?
+                AND ease > 0
+            ORDER BY id
+        """, after_id)
+        for revlog_id, card_id, ease in rows:
+            if card_id in outcomes:
+                continue
+            if revlog_id > pending[str(card_id)][0]:
+                outcomes[card_id] = ease > 1
+
+    if outcomes:
+        tags_by_card = dict(col.db.all(f"""
+            SELECT c.id, n.tags
+            FROM cards c
+            JOIN notes n ON c.nid = n.id
+            WHERE c.id IN {ids_to_sql(outcomes)}
+        """))
+        for card_id, passed in outcomes.items():
+            kind = pending.pop(str(card_id))[1]
+            fields = [f"{kind}_reviews"] + ([f"{kind}_passed"] if passed else [])
+            groups = extract_group_tags(tags_by_card.get(card_id, "").split())
+            for field in fields:
+                stats["totals"][field] += 1
+                _add(stats["cards"], str(card_id), field)
+                for group in groups:
+                    _add(stats["groups"], group, field)
+
+    # Stop waiting for cards that are not being reviewed
+    expiry = int((now - PENDING_EXPIRY_DAYS * 86400) * 1000)
+    for card_id, (boosted_at, _) in list(pending.items()):
+        if boosted_at < expiry:
+            del pending[card_id]
+            stats["totals"]["expired"] += 1
+
+    if latest is not None:
+        stats["cursor"] = latest
+    return len(outcomes)
+
+
+def _rate(passed: int, reviews: int) -> str:
+    return f"{passed / reviews:.0%}" if reviews else "-"
+
+
+def format_stats(stats: Dict[str, Any], max_groups: int = 10) -> str:
+    """
+    Format the statistics for display.
+
+    Args:
+        stats: The statistics
+        max_groups: Number of groups listed, most reviewed first
+
+    Returns:
+        Multi-line summary
+    """
+    stats = load_stats(stats)
+    totals = stats["totals"]
+    if not totals["boosts"]:
+        return "No boosts recorded yet."
+
+    lines = [
+        f"Cards boosted: {totals['boosts']} "
+        f"({len(stats['pending'])} cards waiting for their next review)",
+        f"Boosted vocabulary passed next review: "
+        f"{_rate(totals['vocab_passed'], totals['vocab_reviews'])} of {totals['vocab_reviews']}",
+        f"Failed sentences passed next review: "
+        f"{_rate(totals['sentence_passed'], totals['sentence_reviews'])} of {totals['sentence_reviews']}",
+    ]
+
+    groups = sorted(
+        stats["groups"].items(),
+        key=lambda item: item[1]["vocab_reviews"] + item[1]["sentence_reviews"],
+        reverse=True
+    )[:max_groups]
+    if groups:
+        lines.append("")
+        lines.append("Most reviewed groups (vocabulary / sentences passed):")
+        for group, counts in groups:
+            lines.append(
+                f"  group:s{group}: {_rate(counts['vocab_passed'], counts['vocab_reviews'])} of "
+                f"{counts['vocab_reviews']} / {_rate(counts['sentence_passed'], counts['sentence_reviews'])} of "
+                f"{counts['sentence_reviews']}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,163 @@
+"""
+Module for the per-card struggle scores.
+
+Every sentence review is evidence about the vocabulary cards the sentence
+depends on: a failed review adds 1 to their scores and a passed review
+subtracts `struggle_pass_weight`. Scores decay exponentially, halving
+every `struggle_half_life_days` days, so old evidence fades out.
+
+Each card keeps its score and the time of its last update
+({card ID: (score, time in seconds)}). The decay is applied when a score
+is next read or updated, so every review costs one dictionary update per
+dependency and the history is never rescanned. With a `struggle_threshold`
+set, only cards whose score has reached it are boosted, and a boost
+takes the threshold off the card's score, so it takes new failures to
+boost the card again. Scores that have decayed below MIN_SCORE are
+dropped, which keeps the scores bounded.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Decayed scores below this are dropped
+MIN_SCORE = 0.05
+
+
+def current_score(entry: Optional[Tuple[float, int]], now: float, half_life_days: float) -> float:
+    """
+    Get a card's score decayed to a point in time.
+
+    Args:
+        entry: The card's (score, update time), or None if it has no score
+        now: Time in seconds
+        half_life_days: Days in which a score halves
+
+    Returns:
+        The decayed score
+    """
+    if entry is None:
+        return 0.0
+    score, updated = entry
+    elapsed_days = max(now - updated, 0) / 86400
+    return score * 0.5 ** (elapsed_days / half_life_days)
+
+
+def update_scores(
+        scores: Dict[int, Tuple[float, int]],
+        reviews: Iterable[Tuple[int, int, int]],
+        deps_by_sentence: Dict[int, Set[int]],
+        half_life_days: float,
+        pass_weight: float
+) -> int:
+    """
+    Add the evidence of sentence reviews to the scores of their dependencies.
+
+    Args:
+        scores: The struggle scores, updated in place
+        reviews: (review log ID, sentence card ID, ease) tuples in review log ID order
+        deps_by_sentence: Dependency card IDs of each sentence card
+        half_life_days: Days in which a score halves
+        pass_weight: Amount a passed review subtracts
+
+    Returns:
+        Number of score updates
+    """
+    updates = 0
+    for revlog_id, card_id, ease in reviews:
+        deps = deps_by_sentence.get(card_id)
+        if not deps:
+            continue
+        reviewed_at = revlog_id // 1000
+        delta = 1.0 if ease == 1 else -pass_weight
+        for dep in deps:
+            entry = scores.get(dep)
+            score = max(current_score(entry, reviewed_at, half_life_days) + delta, 0.0)
+            if score < MIN_SCORE:
+                scores.pop(dep, None)
+            else:
+                # Late-synced reviews never move the update time back
+                scores[dep] = (score, max(reviewed_at, entry[1]) if entry else reviewed_at)
+            updates += 1
+    return updates
+
+
+def prune_scores(scores: Dict[int, Tuple[float, int]], half_life_days: float, now: Optional[float] = None) -> int:
+    """
+    Drop the scores that have decayed below MIN_SCORE.
+
+    Args:
+        scores: The struggle scores, updated in place
+        half_life_days: Days in which a score halves
+        now: Current time in seconds (defaults to the clock)
+
+    Returns:
+        Number of scores dropped
+    """
+    now = time.time() if now is None else now
+    dropped = [card_id for card_id, entry in scores.items() if current_score(entry, now, half_life_days) < MIN_SCORE]
+    for card_id in dropped:
+        del scores[card_id]
+    return len(dropped)
+
+
+def filter_struggling(
+        scores: Dict[int, Tuple[float, int]],
+        card_ids: Iterable[int],
+        threshold: float,
+        half_life_days: float,
+        now: Optional[float] = None
+) -> List[int]:
+    """
+    Keep the cards whose score has reached the threshold.
+
+    Args:
+        scores: The struggle scores
+        card_ids: IDs of candidate cards
+        threshold: Lowest score of a card to boost
+        half_life_days: Days in which a score halves
+        now: Current time in seconds (defaults to the clock)
+
+    Returns:
+        IDs of the struggling cards
+    """
+    now = time.time() if now is None else now
+    return [
+        card_id for card_id in card_ids
+        if current_score(scores.get(card_id), now, half_life_days) >= threshold
+    ]
+
+
+def settle_scores(
+        scores: Dict[int, Tuple[float, int]],
+        card_ids: Iterable[int],
+        threshold: float,
+        half_life_days: float,
+        now: Optional[float] = None
+) -> int:
+    """
+    Take the threshold off the scores of boosted cards.
+
+    Args:
+        scores: The struggle scores, updated in place
+        card_ids: IDs of the boosted cards
+        threshold: Lowest score of a card to boost
+        half_life_days: Days in which a score halves
+        now: Current time in seconds (defaults to the clock)
+
+    Returns:
+        Number of scores changed
+    """
+    now = time.time() if now is None else now
+    settled = 0
+    for card_id in card_ids:
+        entry = scores.get(card_id)
+        if entry is None:
+            continue
+        score = current_score(entry, now, half_life_days) - threshold
+        if score < MIN_SCORE:
+            del scores[card_id]
+        else:
+            scores[card_id] = (score, max(int(now), entry[1]))
+        settled += 1
+    return settled
@@ -0,0 +1,5 @@
+"""
+Qt-dependent parts of the add-on: collection operations run from the
+GUI and the real-time booster. The `core` package never imports `aqt`,
+so it can also be used by the command-line runner.
+"""
@@ -0,0 +1,57 @@
+"""
+Module for running the rescheduling as a GUI collection operation.
+"""
+
+from typing import Callable, List, Optional
+from aqt import mw
+from aqt.operations import CollectionOp
+from aqt.utils import tooltip
+
+from ..core.reschedule import reschedule_cards
+
+
+def reschedule_op(
+        card_ids: List[int],
+        success: Optional[Callable[[], None]] = None,
+        failure: Optional[Callable[[Exception], None]] = None,
+        report=None,
+        spread_days: int = 1,
+        daily_cap: int = 0
+) -> None:
+    """
+    Reschedule already filtered cards for tomorrow (or spread over the
+    next days) in a collection operation.
+    
+    Args:
+        card_ids: IDs of the cards to reschedule (see get_cards_to_reschedule)
+        success: Called on the main thread once the cards are rescheduled
+        failure: Called on the main thread if the operation failed
+        report: Optional RunReport timing the operation as the "reschedule" stage
+        spread_days: Number of days the cards are spread over (see reschedule_cards)
+        daily_cap: Cards per day to fill up to before using later days
+    """
+    op = CollectionOp(
+        parent=mw,
+        op=lambda col: reschedule_cards(col, card_ids, report, spread_days, daily_cap)
+    )
+    if success:
+        op.success(lambda _changes: success())
+    if failure:
+        op.failure(failure)
+    op.run_in_background()
+
+
+def show_rescheduling_results(count: int, spread_days: int = 1) -> None:
+    """
+    Display a tooltip with the results of the rescheduling operation.
+    
+    Args:
+        count: Number of cards rescheduled
+        spread_days: Number of days the cards were spread over
+    """
+    if count == 0:
+        tooltip("No vocabulary dependencies needed rescheduling")
+    elif spread_days > 1 and count > 1:
+        tooltip(f"Boosted {count} vocabulary cards, spread over the next {spread_days} days")
+    else:
+        tooltip(f"Boosted {count} vocabulary cards for tomorrow's review")
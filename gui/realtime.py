@@ -0,0 +1,183 @@
+"""
+Module for boosting dependencies during a review session, as sentence
+cards are failed.
+
+Failed sentence answers are queued from the reviewer's answer hook and
+resolved in small debounced batches, so only the new failures are
+touched and boosts happen seconds after a failure. Batches are run by
+the run coordinator, so they never overlap with a full boost run.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+from aqt import mw
+from aqt.operations import QueryOp
+from aqt.qt import QTimer
+from aqt.utils import tooltip
+
+from ..core.instrumentation import RunReport
+from ..core.pipeline import resolve_boost_targets, score_dependencies, uses_struggle_scores
+from ..core.review_log import is_sentence_note
+from ..core.state import get_store
+from ..utils import ids_to_sql
+from .operations import reschedule_op, show_rescheduling_results
+
+
+class RealtimeBooster:
+    """
+    Queue of failed sentence answers, flushed after a quiet period.
+
+    Args:
+        get_config: Returns the current add-on configuration
+        submit_task: Runs a batch through the run coordinator, or calls
+            the second function if it is dropped (see RunCoordinator.submit_task)
+        on_processed: Called with the review log IDs of a processed batch,
+            so full boost runs can skip them
+        on_boosted: Called with the failed sentence cards and the
+            rescheduled cards of a batch that boosted cards
+    """
+
+    def __init__(
+            self,
+            get_config: Callable[[], Dict[str, Any]],
+            submit_task: Callable[[Callable[[Callable[[], None]], None], Callable[[], None]], None],
+            on_processed: Callable[[List[int]], None],
+            on_boosted: Optional[Callable[[List[int], List[int]], None]] = None
+    ):
+        self.get_config = get_config
+        self.submit_task = submit_task
+        self.on_processed = on_processed
+        self.on_boosted = on_boosted
+        # Failed sentence card id -> earliest time (ms) it was answered
+        self.pending: Dict[int, int] = {}
+        # A batch is waiting for the coordinator or running
+        self.submitted = False
+        self.timer = None
+
+    def on_answer(self, reviewer, card, ease: int) -> None:
+        """Queue a failed sentence answer (reviewer_did_answer_card hook)"""
+        if ease != 1:
+            return
+
+        config = self.get_config()
+        if not config.get("realtime_boost_enabled", False):
+            return
+
+        if not is_sentence_note(card.note().tags):
+            return
+
+        # The answer's review log ID is a timestamp taken after the card was
+        # shown, which bounds the review log lookup for this batch
+        shown_at = getattr(card, "timer_started", None) or time.time()
+        answered_from = int(shown_at * 1000)
+        self.pending[card.id] = min(self.pending.get(card.id, answered_from), answered_from)
+
+        self._schedule_flush(config)
+
+    def _schedule_flush(self, config: Dict[str, Any]) -> None:
+        """(Re)start the debounce timer"""
+        if self.timer is None:
+            self.timer = QTimer(mw)
+            self.timer.setSingleShot(True)
+            self.timer.timeout.connect(self.flush)
+        self.timer.start(int(config.get("realtime_debounce_seconds", 5) * 1000))
+
+    def flush(self) -> None:
+        """Submit a batch resolving and boosting the dependencies of all queued failures"""
+        if not self.pending or not mw or not mw.col:
+            return
+
+        # One batch at a time; failures queued meanwhile go in the next one
+        if self.submitted:
+            self._schedule_flush(self.get_config())
+            return
+
+        self.submitted = True
+        self.submit_task(self._run_batch, self._batch_dropped)
+
+    def _batch_dropped(self) -> None:
+        """Keep the queued failures for the next flush when the coordinator drops the batch"""
+        self.submitted = False
+
+    def _run_batch(self, finished: Callable[[], None]) -> None:
+        """
+        Boost the queued failures (started by the run coordinator, so no
+        full boost run is in progress).
+
+        Args:
+            finished: Called once the batch has ended, however it ended
+        """
+        if not self.pending or not mw.col:
+            self.submitted = False
+            finished()
+            return
+
+        config = self.get_config()
+        batch = self.pending
+        self.pending = {}
+        store = get_store()
+        ledger = store.get_boost_ledger()
+        scores = store.get_struggle_scores() if uses_struggle_scores(config) else None
+        # Failures a full run has processed since they were queued are skipped
+        cursor_state = store.get_revlog_cursor()
+        processed = set(cursor_state["recent"]) if cursor_state else set()
+        report = RunReport("realtime")
+
+        def analyse(col) -> Dict[str, Any]:
+            rows = [row for row in col.db.all(f"""
+                SELECT id, cid, ease
+                FROM revlog
+                WHERE cid IN {ids_to_sql(batch)} AND ease = 1 AND id >= ?
+                ORDER BY id
+            """, min(batch.values())) if row[0] not in processed]
+            failed_cards = sorted({card_id for _, card_id, _ in rows})
+            if scores is not None:
+                score_dependencies(col, config, rows, scores, report)
+            card_ids = []
+            if failed_cards:
+                card_ids = resolve_boost_targets(col, config, failed_cards, report, ledger=ledger, scores=scores)
+            return {
+                "card_ids": card_ids,
+                "failed_cards": failed_cards,
+                "revlog_ids": [row[0] for row in rows],
+            }
+
+        def end() -> None:
+            self.submitted = False
+            finished()
+
+        def on_done(result: Dict[str, Any]) -> None:
+            try:
+                if scores is not None:
+                    get_store().set_struggle_scores(scores)
+                self.on_processed(result["revlog_ids"])
+                if result["card_ids"]:
+                    if self.on_boosted:
+                        self.on_boosted(result["failed_cards"], result["card_ids"])
+                    show_rescheduling_results(len(result["card_ids"]), config.get("boost_spread_days", 1))
+            finally:
+                end()
+
+        def on_analysed(result: Dict[str, Any]) -> None:
+            if result["card_ids"]:
+                reschedule_op(
+                    result["card_ids"],
+                    success=lambda: on_done(result),
+                    failure=on_failed,
+                    spread_days=config.get("boost_spread_days", 1),
+                    daily_cap=config.get("boost_daily_cap", 0)
+                )
+            else:
+                on_done(result)
+
+        def on_failed(error: Exception) -> None:
+            # Leave the failures to the next full boost run, and keep the
+            # error with the run reports
+            try:
+                report.finish("failed", str(error))
+                get_store().add_run_report(report.to_dict(), config.get("run_report_history", 20))
+            finally:
+                end()
+            tooltip(f"Error boosting dependencies during review: {str(error)}")
+
+        QueryOp(parent=mw, op=analyse, success=on_analysed).failure(on_failed).run_in_background()
@@ -0,0 +1,65 @@
+"""
+Offline what-if replay for tuning the boost settings.
+
+Replays a collection's review history and reports, for every
+combination of `maturity_threshold` and `days_to_check`, how many cards
+boost runs would have rescheduled and how often those boosts came before
+a real lapse:
+
+    python /path/to/addon/replay.py ~/.local/share/Anki2/User\ 1/collection.anki2 \\
+        --thresholds 7 14 21 30 --days 1 3 7 14
+
+The collection is opened read-only and never modified. Close Anki first
+(or replay a backup copy), as Anki keeps its collection locked.
+"""
+
+import argparse
+import json
+import sys
+from typing import List
+
+from cli import load_addon_module
+
+
+DEFAULT_THRESHOLDS = [7, 14, 21, 30, 60]
+DEFAULT_DAYS = [1, 3, 7, 14, 30]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay the review history under different boost settings")
+    parser.add_argument("collection", help="Path of the .anki2 collection file")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=DEFAULT_THRESHOLDS,
+                        help="maturity_threshold values to evaluate")
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_DAYS,
+                        help="days_to_check values to evaluate")
+    parser.add_argument("--run-every-days", type=float, default=1.0,
+                        help="Days between simulated boost runs")
+    parser.add_argument("--horizon-days", type=int, default=30,
+                        help="Days after a boost in which a lapse counts as a hit")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    replay = load_addon_module("core.replay")
+    try:
+        conn = replay.open_read_only(args.collection)
+        try:
+            results = replay.replay_history(
+                conn, args.thresholds, args.days, args.run_every_days, args.horizon_days,
+                on_progress=lambda rows: print(f"{rows} review log rows replayed", end="\r", file=sys.stderr)
+            )
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"{args.collection}: error: {e}", file=sys.stderr)
+        return 1
+
+    print(file=sys.stderr)
+    print(replay.format_replay(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
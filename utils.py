@@ -2,33 +2,54 @@
 Utility functions for the Dependency Booster add-on.
 """
 
+import sys
 import time
-from typing import List
+from typing import Iterable, List, Optional, Set, Tuple
 
 
-def limit_processed_logs(
-        log_ids: List[int],
-        max_count: int = 1000
-) -> List[int]:
+def advance_revlog_cursor(
+        cursor: Optional[int],
+        recent_ids: Set[int],
+        new_ids: Iterable[int],
+        tolerance_ms: int,
+        scanned_until: Optional[int] = None
+) -> Tuple[Optional[int], List[int]]:
     """
-    Limit the number of processed log IDs to prevent excessive memory usage.
-    Keeps the most recent logs.
+    Move the review log high-water mark past a batch of processed reviews.
+    
+    Review log IDs are millisecond timestamps of when the review happened,
+    so reviews synced late from another device can arrive with IDs below
+    the cursor. The IDs processed within the tolerance window below the
+    cursor are therefore kept, so the next run can rescan that window and
+    only skip the reviews it has already seen. All of them are kept, as
+    a dropped ID would be processed again; the window bounds their number.
     
     Args:
-        log_ids: List of log IDs
-        max_count: Maximum number of logs to keep
+        cursor: Highest processed review log ID, or None if nothing was processed
+        recent_ids: Processed IDs inside the current tolerance window
+        new_ids: IDs processed in this run
+        tolerance_ms: Width of the out-of-order tolerance window in milliseconds
+        scanned_until: Highest review log ID covered by this run, if it is
+            higher than the processed IDs (e.g. when only failures were kept)
         
     Returns:
-        Trimmed list of log IDs
+        Tuple of (new cursor, processed IDs inside the new tolerance window)
     """
-    if len(log_ids) <= max_count:
-        return log_ids
+    processed = set(recent_ids)
+    processed.update(new_ids)
+    
+    candidates = [c for c in (cursor, scanned_until) if c is not None]
+    if processed:
+        candidates.append(max(processed))
+    if not candidates:
+        return cursor, []
+    
+    new_cursor = max(candidates)
     
-    # Sort by recency (assuming higher IDs are more recent)
-    sorted_ids = sorted(log_ids, reverse=True)
+    window_start = new_cursor - tolerance_ms
+    window_ids = [log_id for log_id in processed if log_id > window_start]
     
-    # Keep the most recent logs
-    return sorted_ids[:max_count]
+    return new_cursor, window_ids
 
 
 def get_current_timestamp() -> int:
@@ -38,4 +59,32 @@ def get_current_timestamp() -> int:
     Returns:
         Current time as Unix timestamp (seconds since epoch)
     """
-    return int(time.time()) 
\ No newline at end of file
+    return int(time.time())
+
+
+def ids_to_sql(ids: Iterable[int]) -> str:
+    """
+    Format a collection of integer IDs as an SQL list for an IN clause.
+    
+    Args:
+        ids: Integer IDs (card, note or review log IDs)
+        
+    Returns:
+        SQL list string, e.g. "(1,2,3)"
+    """
+    return "(" + ",".join(str(int(i)) for i in ids) + ")"
+
+
+def can_start_worker_processes() -> bool:
+    """
+    Check if process pools can be used, which is only the case in
+    headless runs (e.g. the command-line runner).
+    
+    Inside Anki, worker processes re-import the add-on package and with
+    it Anki's GUI, and in frozen Anki builds they start another copy of
+    Anki; neither is caught by falling back on errors.
+    
+    Returns:
+        True if worker processes can be started
+    """
+    return "aqt" not in sys.modules and not getattr(sys, "frozen", False)